@@ -0,0 +1,63 @@
+"""Пиковая память при разборе ответа /api/v1/supplier/sales: ``json.loads``
+всего тела против потокового ``json_stream.iter_json_array`` с обработкой
+пачками.
+
+Запуск: python -m benchmarks.bench_ingest
+"""
+
+import asyncio
+import json
+import time
+import tracemalloc
+
+from benchmarks.generator import generate_sales, to_payload
+from json_stream import iter_batches, iter_json_array
+from metrics import aggregate
+
+ROWS = 80_000
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 5000
+
+
+async def chunks_of(body):
+    for start in range(0, len(body), CHUNK_SIZE):
+        yield body[start : start + CHUNK_SIZE]
+
+
+def parse_whole(body):
+    return aggregate(json.loads(body))
+
+
+async def parse_streaming(body):
+    totals = None
+    async for batch in iter_batches(iter_json_array(chunks_of(body)), BATCH_SIZE):
+        totals = aggregate(batch, totals)
+    return totals
+
+
+def measure(func):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    body = to_payload(generate_sales(ROWS))
+    print(f"Тело ответа: {ROWS} строк, {len(body) / 2**20:.1f} МБ")
+
+    whole, whole_time, whole_peak = measure(lambda: parse_whole(body))
+    streamed, stream_time, stream_peak = measure(
+        lambda: asyncio.run(parse_streaming(body))
+    )
+    assert whole.key_metrics() == streamed.key_metrics()
+
+    print(f"json.loads:  {whole_time:6.2f} с, пик {whole_peak / 2**20:7.1f} МБ")
+    print(f"потоково:    {stream_time:6.2f} с, пик {stream_peak / 2**20:7.1f} МБ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Сравнение расчёта ключевых показателей: прежний многопроходный вариант
+против однопроходного ``metrics.aggregate``.
+
+Запуск: python -m benchmarks.bench_metrics
+"""
+
+import timeit
+
+from benchmarks.generator import generate_sales
+from metrics import METRIC_FIELDS, aggregate
+
+SIZES = (1_000, 10_000, 100_000)
+
+
+def reference_metrics(data):
+    # Прежняя реализация: проверка ключей и семь отдельных проходов sum(...)
+    for item in data:
+        missing_keys = [key for key in list(METRIC_FIELDS) if key not in item]
+        if missing_keys:
+            return None
+
+    total_sales = sum(item["totalPrice"] for item in data)
+    return {
+        "total_sales": total_sales,
+        "total_discount": sum(
+            item["totalPrice"] * (item["discountPercent"] / 100) for item in data
+        ),
+        "spp": sum(item["spp"] for item in data),
+        "payment_sale_amount": sum(item["paymentSaleAmount"] for item in data),
+        "for_pay": sum(item["forPay"] for item in data),
+        "finished_price": sum(item["finishedPrice"] for item in data),
+        "price_with_disc": sum(item["priceWithDisc"] for item in data),
+        "avg_sale_price": total_sales / len(data) if data else 0,
+    }
+
+
+def best_of(func, rows, repeat=5):
+    return min(timeit.repeat(lambda: func(rows), number=1, repeat=repeat))
+
+
+def main():
+    print(f"{'строк':>8} {'прежний, мс':>12} {'aggregate, мс':>14} {'ускорение':>10}")
+    for size in SIZES:
+        rows = generate_sales(size)
+        assert reference_metrics(rows) == aggregate(rows).key_metrics()
+
+        before = best_of(reference_metrics, rows)
+        after = best_of(lambda data: aggregate(data).key_metrics(), rows)
+        print(
+            f"{size:>8} {before * 1000:>12.2f} {after * 1000:>14.2f} "
+            f"{before / after:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
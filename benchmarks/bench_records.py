@@ -0,0 +1,69 @@
+"""Память под 100 тыс. продаж: словари из ответа API, словари с полями
+хранилища (прежний результат ``SalesStore.window``) и ``SaleRecord``.
+
+Запуск: python -m benchmarks.bench_records
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.generator import generate_sales, to_payload
+from metrics import group_by
+from sales_store import SALE_FIELDS, SalesStore
+
+ROWS = 100_000
+
+
+def measure(build):
+    tracemalloc.start()
+    started = time.perf_counter()
+    value = build()
+    elapsed = time.perf_counter() - started
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, size, elapsed
+
+
+def main():
+    rows = generate_sales(ROWS)
+    payload = to_payload(rows)
+    store = SalesStore(os.path.join(tempfile.mkdtemp(prefix="wb-records-"), "s.db"))
+    store.upsert("bench", rows)
+    date_from, date_to = rows[0]["date"][:10], max(row["date"] for row in rows)[:10]
+    del rows
+
+    def store_dicts():
+        # Как прежний SalesStore.window: словарь на каждую строку выборки
+        with sqlite3.connect(store.path) as conn:
+            selected = conn.execute(
+                f"SELECT {', '.join(SALE_FIELDS)} FROM sales ORDER BY date"
+            ).fetchall()
+        return [dict(zip(SALE_FIELDS, row)) for row in selected]
+
+    variants = (
+        ("словари ответа API", lambda: json.loads(payload)),
+        ("словари полей хранилища", store_dicts),
+        ("SaleRecord", lambda: store.window("bench", date_from, date_to)),
+    )
+    print(f"{'представление':<26} {'строк':>8} {'МБ':>8} {'байт/строку':>12}")
+    for name, build in variants:
+        value, size, _ = measure(build)
+        print(
+            f"{name:<26} {len(value):>8} {size / 2**20:>8.1f} "
+            f"{size / len(value):>12.0f}"
+        )
+        del value
+
+    records = store.window("bench", date_from, date_to)
+    started = time.perf_counter()
+    group_by(records, "article")
+    print(f"\ngroup_by по SaleRecord: {(time.perf_counter() - started) * 1000:.1f} мс")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
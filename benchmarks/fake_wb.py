@@ -0,0 +1,140 @@
+"""Локальный стенд API Wildberries: /api/v1/supplier/sales и /ping.
+
+Поведение повторяет то, на что опирается бот: выборка по lastChangeDate
+(flag=0) или по дню продажи (flag=1), ограничение в 80 тыс. строк на ответ,
+лимит запросов на токен с ответом 429 и заголовками X-Ratelimit-*.
+
+Запуск отдельно: python -m benchmarks.fake_wb --rows 100000 --latency 0.2
+Затем бот запускается с WB_STATISTICS_API_URL / WB_COMMON_API_URL,
+указывающими на стенд.
+"""
+
+import argparse
+import asyncio
+import bisect
+import contextlib
+import json
+import random
+import time
+
+from aiohttp import web
+
+from benchmarks.generator import generate_sales
+
+PAGE_LIMIT = 80_000
+INVALID_TOKEN = "invalid"
+
+
+class FakeWildberries:
+    def __init__(
+        self, rows, latency=0.0, rate_limit=None, window=60.0, error_rate=0.0
+    ):
+        self.rows = sorted(rows, key=lambda row: row["lastChangeDate"])
+        self._changed = [row["lastChangeDate"] for row in self.rows]
+        self.latency = latency
+        self.rate_limit = rate_limit  # запросов на токен за window секунд
+        self.window = window
+        self.error_rate = error_rate  # доля запросов продаж, отвечающих 500
+        self._random = random.Random(0)
+        self._hits = {}
+        self.requests = 0
+        self.throttled = 0
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/api/v1/supplier/sales", self.sales)
+        app.router.add_get("/ping", self.ping)
+        return app
+
+    def _token(self, request):
+        return request.headers.get("Authorization", "").removeprefix("Bearer ")
+
+    def _check_limit(self, token):
+        if self.rate_limit is None:
+            return None
+        now = time.monotonic()
+        hits = [hit for hit in self._hits.get(token, []) if now - hit < self.window]
+        self._hits[token] = hits
+        if len(hits) >= self.rate_limit:
+            self.throttled += 1
+            retry = self.window - (now - hits[0])
+            return web.Response(
+                status=429,
+                headers={
+                    "X-Ratelimit-Retry": f"{retry:.3f}",
+                    "X-Ratelimit-Limit": str(self.rate_limit),
+                    "X-Ratelimit-Remaining": "0",
+                    "X-Ratelimit-Reset": f"{retry:.3f}",
+                },
+            )
+        hits.append(now)
+        return None
+
+    async def ping(self, request):
+        token = self._token(request)
+        if token == INVALID_TOKEN:
+            return web.Response(status=401)
+        return web.json_response({"TS": time.time(), "Status": "OK"})
+
+    async def sales(self, request):
+        self.requests += 1
+        token = self._token(request)
+        if token == INVALID_TOKEN:
+            return web.Response(status=401)
+        throttled = self._check_limit(token)
+        if throttled is not None:
+            return throttled
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self._random.random() < self.error_rate:
+            return web.Response(status=500)
+
+        date_from = request.query.get("dateFrom", "")
+        if request.query.get("flag") == "1":
+            day = date_from[:10]
+            rows = [row for row in self.rows if row["date"][:10] == day]
+        else:
+            start = bisect.bisect_left(self._changed, date_from)
+            rows = self.rows[start : start + PAGE_LIMIT]
+
+        body = json.dumps(rows, ensure_ascii=False)
+        return web.Response(text=body, content_type="application/json")
+
+
+@contextlib.asynccontextmanager
+async def serve(fake, host="127.0.0.1", port=0):
+    """Поднимает стенд и отдаёт его базовый URL"""
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = runner.addresses[0][1]
+    try:
+        yield f"http://{host}:{port}"
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=None)
+    parser.add_argument("--window", type=float, default=60.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    fake = FakeWildberries(
+        generate_sales(args.rows),
+        args.latency,
+        args.rate_limit,
+        args.window,
+        args.error_rate,
+    )
+    web.run_app(fake.app(), host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Генератор правдоподобных строк продаж в формате /api/v1/supplier/sales."""
+
+import datetime
+import json
+import random
+
+WAREHOUSES = ("Коледино", "Подольск", "Электросталь", "Казань", "Краснодар")
+REGIONS = (
+    ("Центральный федеральный округ", "Московская"),
+    ("Центральный федеральный округ", "Тверская"),
+    ("Приволжский федеральный округ", "Республика Татарстан"),
+    ("Южный федеральный округ", "Краснодарский край"),
+    ("Северо-Западный федеральный округ", "Ленинградская"),
+)
+SUBJECTS = (("Одежда", "Футболки"), ("Одежда", "Худи"), ("Обувь", "Кроссовки"))
+
+
+def make_sale(rnd, index, day, articles=500):
+    sold_at = datetime.datetime.combine(day, datetime.time()) + datetime.timedelta(
+        seconds=rnd.randrange(24 * 60 * 60)
+    )
+    changed_at = sold_at + datetime.timedelta(minutes=rnd.randrange(1, 180))
+    okrug, region = rnd.choice(REGIONS)
+    category, subject = rnd.choice(SUBJECTS)
+    article = rnd.randrange(articles)
+
+    price = round(rnd.uniform(300, 6000), 2)
+    discount = rnd.randint(0, 70)
+    price_with_disc = round(price * (100 - discount) / 100, 2)
+    spp = rnd.randint(0, 30)
+    finished = round(price_with_disc * (100 - spp) / 100, 2)
+    is_return = rnd.random() < 0.03
+    sign = -1 if is_return else 1
+
+    return {
+        "date": sold_at.isoformat(),
+        "lastChangeDate": changed_at.isoformat(),
+        "warehouseName": rnd.choice(WAREHOUSES),
+        "countryName": "Россия",
+        "oblastOkrugName": okrug,
+        "regionName": region,
+        "supplierArticle": f"ART-{article:04d}",
+        "nmId": 10_000_000 + article,
+        "barcode": f"20{article:011d}",
+        "category": category,
+        "subject": subject,
+        "brand": "Бренд",
+        "techSize": rnd.choice(("S", "M", "L", "XL")),
+        "incomeID": rnd.randrange(10**6),
+        "isSupply": False,
+        "isRealization": True,
+        "totalPrice": price,
+        "discountPercent": discount,
+        "spp": spp,
+        "paymentSaleAmount": rnd.choice((0, 0, 0, 50, 100)),
+        "forPay": sign * round(finished * 0.8, 2),
+        "finishedPrice": sign * finished,
+        "priceWithDisc": price_with_disc,
+        "saleID": f"{'R' if is_return else 'S'}{index:09d}",
+        "orderType": "Клиентский",
+        "sticker": "",
+        "gNumber": f"{rnd.getrandbits(63)}",
+        "srid": f"{rnd.getrandbits(64):016x}.{index}",
+    }
+
+
+def generate_sales(count, date_from=None, date_to=None, seed=0):
+    """``count`` продаж, равномерно распределённых по дням периода"""
+    date_to = date_to or datetime.date.today()
+    date_from = date_from or date_to - datetime.timedelta(days=6)
+    days = (date_to - date_from).days + 1
+    rnd = random.Random(seed)
+    rows = [
+        make_sale(rnd, index, date_from + datetime.timedelta(days=rnd.randrange(days)))
+        for index in range(count)
+    ]
+    rows.sort(key=lambda row: row["lastChangeDate"])
+    return rows
+
+
+def to_payload(rows):
+    return json.dumps(rows, ensure_ascii=False).encode()
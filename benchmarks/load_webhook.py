@@ -0,0 +1,184 @@
+"""Нагрузочный тест режима webhook.
+
+Поднимает локальную заглушку Bot API, запускает бота в режиме webhook с
+заданным числом процессов и отправляет в эндпоинт тысячи синтетических
+апдейтов (/start и /shops от разных пользователей). Выводит, сколько
+апдейтов в секунду принимает эндпоинт и сколько ответов в секунду бот
+отправляет в Bot API.
+
+Запуск: python -m benchmarks.load_webhook --updates 5000 --workers 4
+"""
+
+import argparse
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.scenarios import free_port, percentile
+
+BOT_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "main.py")
+TOKEN = "123456:LOADTESTLOADTESTLOADTESTLOADTEST"
+SECRET = "load-test-secret"
+COMMANDS = ("/start", "/shops")
+
+
+class FakeBotAPI:
+    """Заглушка Bot API: отвечает на любые методы и считает sendMessage"""
+
+    def __init__(self):
+        self.webhook_set = asyncio.Event()
+        self.sent = 0
+        self.last_sent_at = None
+        self.all_sent = asyncio.Event()
+        self.expected = None
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        form = await request.post()
+        if method == "getMe":
+            result = {"id": 123456, "is_bot": True, "first_name": "Load test"}
+        elif method == "sendMessage":
+            self.sent += 1
+            self.last_sent_at = time.perf_counter()
+            if self.expected is not None and self.sent >= self.expected:
+                self.all_sent.set()
+            result = {
+                "message_id": self.sent,
+                "date": int(time.time()),
+                "chat": {"id": int(form["chat_id"]), "type": "private"},
+                "text": form.get("text", ""),
+            }
+        else:
+            if method == "setWebhook":
+                self.webhook_set.set()
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+
+def make_update(update_id):
+    user_id = 1_000_000 + update_id
+    text = COMMANDS[update_id % len(COMMANDS)]
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "User"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}],
+        },
+    }
+
+
+async def push_updates(url, count, concurrency):
+    latencies = []
+    failed = 0
+    queue = iter(range(1, count + 1))
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+
+    async def sender(session):
+        nonlocal failed
+        for update_id in queue:
+            started = time.perf_counter()
+            async with session.post(
+                url, json=make_update(update_id), headers=headers
+            ) as response:
+                await response.read()
+                if response.status != 200:
+                    failed += 1
+            latencies.append(time.perf_counter() - started)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        await asyncio.gather(*(sender(session) for _ in range(concurrency)))
+        # Запрос без секрета должен быть отклонён
+        async with session.post(url, json=make_update(0)) as response:
+            rejected = response.status
+    return latencies, failed, rejected
+
+
+async def run(args):
+    api = FakeBotAPI()
+    api.expected = args.updates
+    api_runner = web.AppRunner(api.app())
+    await api_runner.setup()
+    api_port = free_port()
+    await web.TCPSite(api_runner, "127.0.0.1", api_port).start()
+
+    webhook_port = free_port()
+    workdir = tempfile.mkdtemp(prefix="wb-webhook-")
+    env = dict(
+        os.environ,
+        TELEGRAM_BOT_TOKEN=TOKEN,
+        TELEGRAM_API_URL=f"http://127.0.0.1:{api_port}",
+        BOT_MODE="webhook",
+        WEBHOOK_URL=f"http://127.0.0.1:{webhook_port}",
+        WEBHOOK_SECRET=SECRET,
+        WEBHOOK_HOST="127.0.0.1",
+        WEBHOOK_PORT=str(webhook_port),
+        WEBHOOK_WORKERS=str(args.workers),
+        PREFETCH_INTERVAL="0",
+        METRICS_ENABLED="false",
+    )
+    log = open(os.path.join(workdir, "bot.log"), "w")
+    process = subprocess.Popen(
+        [sys.executable, BOT_FILE], cwd=workdir, env=env, stdout=log, stderr=log
+    )
+    try:
+        await asyncio.wait_for(api.webhook_set.wait(), 60)
+        # Остальным процессам нужно время, чтобы начать слушать порт
+        await asyncio.sleep(1 + 0.5 * args.workers)
+
+        url = f"http://127.0.0.1:{webhook_port}/webhook"
+        started = time.perf_counter()
+        latencies, failed, rejected = await push_updates(
+            url, args.updates, args.concurrency
+        )
+        accepted_in = time.perf_counter() - started
+        try:
+            await asyncio.wait_for(api.all_sent.wait(), 120)
+        except asyncio.TimeoutError:
+            print("Не все ответы дошли до Bot API за 120 с")
+        processed_in = (api.last_sent_at or started) - started
+    finally:
+        process.send_signal(signal.SIGTERM)
+        await asyncio.to_thread(process.wait, 30)
+        log.close()
+        await api_runner.cleanup()
+
+    print(f"Процессов: {args.workers}, апдейтов: {args.updates}")
+    print(
+        f"Приём:     {args.updates / accepted_in:8.0f} апд/с, "
+        f"p50 {percentile(latencies, 50) * 1000:.1f} мс, "
+        f"p99 {percentile(latencies, 99) * 1000:.1f} мс, "
+        f"среднее {statistics.fmean(latencies) * 1000:.1f} мс, ошибок {failed}"
+    )
+    print(f"Обработка: {api.sent / processed_in:8.0f} ответов/с ({api.sent} шт.)")
+    print(f"Запрос без секрета: статус {rejected}")
+    print(f"Лог бота: {log.name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
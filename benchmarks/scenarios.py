@@ -0,0 +1,186 @@
+"""Сценарии производительности: расчёт показателей, форматирование отчёта и
+полный путь запроса отчёта через локальный стенд Wildberries.
+
+Для каждого сценария выводятся пропускная способность (строк в секунду, для
+форматирования — отчётов в секунду), p50/p99 задержки и пиковая память (tracemalloc, отдельным прогоном, чтобы не искажать время).
+
+Запуск: python -m benchmarks.scenarios [--sizes 1000 10000] [--latency 0.05]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fake_wb import FakeWildberries, serve
+from benchmarks.generator import generate_sales
+
+SIZES = (1_000, 10_000, 100_000)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def configure(base_url, store_dir):
+    # Настройки читаются при импорте модулей бота, поэтому задаются заранее
+    os.environ.update(
+        WB_STATISTICS_API_URL=base_url,
+        WB_COMMON_API_URL=base_url,
+        SALES_STORE_FILE=os.path.join(store_dir, "sales.db"),
+        PREFETCH_INTERVAL="0",
+        WB_STATISTICS_RATE_PER_MINUTE="1000000",
+        WB_STATISTICS_BURST="1000",
+    )
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(q / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+class Result:
+    def __init__(self, name, samples, peak, items=1):
+        self.name = name
+        self.samples = samples
+        self.peak = peak
+        self.items = items
+
+    def row(self):
+        mean = statistics.fmean(self.samples)
+        return (
+            f"{self.name:<34} {self.items / mean:>12,.0f} "
+            f"{percentile(self.samples, 50) * 1000:>9.2f} "
+            f"{percentile(self.samples, 99) * 1000:>9.2f} "
+            f"{self.peak / 2**20:>9.1f}"
+        )
+
+
+HEADER = (
+    f"{'сценарий':<34} {'ед./с':>12} {'p50, мс':>9} {'p99, мс':>9} "
+    f"{'пик, МБ':>9}"
+)
+
+
+def bench(name, func, rounds, items=1):
+    func()  # прогрев
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return Result(name, samples, peak, items)
+
+
+async def abench(name, make_call, rounds, items=1):
+    # make_call() возвращает новую корутину для каждого прогона
+    await make_call()
+    samples = []
+    for _ in range(rounds):
+        call = make_call()
+        started = time.perf_counter()
+        await call
+        samples.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    await make_call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return Result(name, samples, peak, items)
+
+
+def rounds_for(size):
+    return max(5, min(200, 200_000 // size))
+
+
+def cpu_scenarios(sizes):
+    from reports import format_report
+    from wildberries_api import calculate_key_metrics
+
+    for size in sizes:
+        rows = generate_sales(size)
+        rounds = rounds_for(size)
+        yield bench(
+            f"calculate_key_metrics[{size}]",
+            lambda: calculate_key_metrics(rows),
+            rounds,
+            size,
+        )
+        key_metrics = calculate_key_metrics(rows)
+        yield bench(
+            f"format_report[{size}]", lambda: format_report(key_metrics), 1000
+        )
+
+
+async def round_trip_scenarios(fake, sizes):
+    import wildberries_api
+    from reports import build_shop_report
+    from wb_client import close_session
+
+    shop_number = 0
+
+    def cold():
+        # Новый ключ — пустые кэш и хранилище, полная загрузка со стенда
+        nonlocal shop_number
+        shop_number += 1
+        return build_shop_report(f"bench-{shop_number}", "last_7_days")
+
+    try:
+        for size in sizes:
+            fake.rows = generate_sales(size)
+            fake._changed = [row["lastChangeDate"] for row in fake.rows]
+            rounds = max(3, rounds_for(size) // 10)
+            yield await abench(f"build_shop_report cold[{size}]", cold, rounds, size)
+            yield await abench(
+                f"build_shop_report warm[{size}]",
+                lambda: build_shop_report("bench-warm", "last_7_days"),
+                rounds_for(size),
+                size,
+            )
+            await wildberries_api.invalidate_shop("bench-warm")
+    finally:
+        await close_session()
+
+
+async def run(args):
+    store_dir = tempfile.mkdtemp(prefix="wb-bench-")
+    # Логи бота на каждый отчёт искажают замеры
+    logging.disable(logging.WARNING)
+    port = free_port()
+    configure(f"http://127.0.0.1:{port}", store_dir)
+
+    print(HEADER)
+    for result in cpu_scenarios(args.sizes):
+        print(result.row(), flush=True)
+
+    fake = FakeWildberries([], latency=args.latency)
+    async with serve(fake, port=port):
+        async for result in round_trip_scenarios(fake, args.sizes):
+            print(result.row(), flush=True)
+    print(f"\nЗапросов к стенду: {fake.requests}, ответов 429: {fake.throttled}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="задержка ответа стенда, с"
+    )
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,107 @@
 import asyncio
+import datetime
 import logging
+import sys
 
 from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.filters import Command
 from aiogram.types import (
+    FSInputFile,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
     Message,
     CallbackQuery,
 )
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from decouple import config
-
-from wildberries_api import validate_api_key, get_sales_report, calculate_key_metrics
-from utils import load_config, save_config
-
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,  # Change to DEBUG
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler()],
+from decouple import Csv, config
+
+from wildberries_api import (
+    parse_date,
+    validate_api_key,
+    get_sales_report,
+    get_shops_totals,
+    invalidate_shop,
+    last_synced,
+    PREFETCH_INTERVAL,
 )
+from compute import ComputePool
+from digest import DIGEST_FREQUENCIES, DigestScheduler, Subscriptions
+from errors import InvalidDateError, WildberriesError
+from export import EXPORT_FORMATS, export_sales
+from fsm_storage import create_storage
+from instrumentation import (
+    METRICS_PORT,
+    format_stats,
+    instrument,
+    registry,
+    start_metrics_server,
+)
+from logging_setup import setup_logging
+from prefetch import ReportPrefetcher
+from report_jobs import ReportJobs
+from reports import (
+    build_comparison_report,
+    build_shop_report,
+    escape_markdown,
+    format_all_shops_report,
+)
+from send_queue import SendQueue
+from utils import shops
+from wb_client import close_session
+from webhook import BOT_MODE, WEBHOOK_WORKERS, run_workers, serve_webhook
 
 
 # Bot token
 API_TOKEN = config("TELEGRAM_BOT_TOKEN")
+# Свой сервер Bot API (например, локальный telegram-bot-api); по умолчанию облачный
+TELEGRAM_API_URL = config("TELEGRAM_API_URL", default="")
 
 # Initialize bot and dispatcher
-bot = Bot(token=API_TOKEN)
-storage = MemoryStorage()
+session = (
+    AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+    if TELEGRAM_API_URL
+    else None
+)
+bot = Bot(token=API_TOKEN, session=session)
+storage = create_storage()
 dp = Dispatcher(storage=storage)
 router = Router()
+prefetcher = ReportPrefetcher(shops, PREFETCH_INTERVAL)
+
+# Дайджесты: время рассылки, день недели для еженедельных, темп отправки
+DIGEST_TIME = datetime.time.fromisoformat(config("DIGEST_TIME", default="09:00"))
+DIGEST_WEEKDAY = config("DIGEST_WEEKDAY", default=0, cast=int)
+TELEGRAM_SEND_RATE = config("TELEGRAM_SEND_RATE", default=25, cast=float)
+
+send_queue = SendQueue(bot, rate=TELEGRAM_SEND_RATE)
+subscriptions = Subscriptions()
+digests = DigestScheduler(subscriptions, shops, send_queue, DIGEST_TIME, DIGEST_WEEKDAY)
+
+# Telegram ID пользователей, которым доступна команда /stats
+ADMIN_IDS = config("ADMIN_IDS", default="", cast=Csv(int))
+
+registry.register_stats("send_queue", send_queue.stats)
+registry.register_stats("prefetch", prefetcher.stats)
+
+# Большие отчёты считаются в пуле, чтобы не задерживать остальные чаты
+compute_pool = ComputePool()
+registry.register_stats("compute", compute_pool.stats)
+# Отчёты строятся в фоне, а пользователь видит сообщение о ходе работы
+report_jobs = ReportJobs(bot)
+registry.register_stats("report_jobs", report_jobs.stats)
+
+
+# Значение callback_data для сводного отчёта по всем магазинам
+ALL_SHOPS = "allshops"
+# Кнопка сравнения отчёта с предыдущим периодом той же длины
+COMPARE = "compare"
+# Префикс кнопок выгрузки продаж в файл (export_csv, export_xlsx)
+EXPORT = "export_"
+# Сколько групп показывать в разбивке отчёта
+TOP_LIMIT = 10
 
 
 # FSM states
@@ -59,6 +127,8 @@ async def send_welcome(message: Message):
         /delshop для удаления магазина, 
         /shops для вывода списка магазинов, 
         /report для получения отчёта о продажах, 
+        /subscribe для подписки на ежедневный или еженедельный дайджест,
+        /unsubscribe для отписки от дайджестов,
         /help - получить справку.
         """
     )
@@ -74,34 +144,36 @@ async def add_shop(message: Message, state: FSMContext):
 @router.message(ShopForm.waiting_for_api_key)
 async def get_api_key(msg: Message, state: FSMContext):
     api_key = msg.text
-    logging.info(f"Получен API ключ: {api_key}")
+    # Сам ключ не логируем
+    logging.info("Получен API ключ для проверки")
+
+    try:
+        is_valid = await validate_api_key(api_key)
+    except WildberriesError as e:
+        await msg.answer(f"{e}. Попробуйте снова.")
+        return
 
-    if validate_api_key(api_key):
+    if is_valid:
         logging.info("API ключ валиден.")
         await msg.answer("API ключ валиден. Теперь введите имя магазина:")
         await state.update_data(api_key=api_key)
         await state.set_state(ShopForm.waiting_for_shop_name)
     else:
-        logging.warning(f"Неверный API ключ: {api_key}")
+        logging.warning("Неверный API ключ")
         await msg.answer("Неверный API ключ. Попробуйте снова.")
 
 
 @router.message(ShopForm.waiting_for_shop_name)
 async def get_shop_name(msg: Message, state: FSMContext):
     shop_name = msg.text
-    logging.info(f"Получено имя магазина: {shop_name}")
+    logging.info("Получено имя магазина: %s", shop_name)
 
     # Получаем данные, сохраненные в FSM
     user_data = await state.get_data()
     api_key = user_data.get("api_key")
 
-    config = load_config()
-    if not isinstance(config, dict):
-        config = {}
-
     # Сохраняем API ключ с именем магазина
-    config[shop_name] = api_key
-    save_config(config)
+    await shops.add(shop_name, api_key)
 
     await msg.answer(f"API ключ и имя магазина '{shop_name}' успешно сохранены.")
     await state.set_state(None)  # Correct way to finish the FSM state
@@ -113,11 +185,11 @@ async def get_shop_name(msg: Message, state: FSMContext):
 # ! -------------------SHOPS--------------------
 @router.message(Command("shops"))
 async def list_shops(message: Message):
-    config = load_config()
-    if not config:
+    shop_names = shops.names()
+    if not shop_names:
         await message.answer("Нет сохраненных магазинов.")
     else:
-        shop_list = "\n".join(config.keys())
+        shop_list = "\n".join(shop_names)
         await message.answer(f"Сохраненные магазины:\n{shop_list}")
 
 
@@ -127,21 +199,21 @@ async def list_shops(message: Message):
 # ! -------------------DELSHOP--------------------
 @router.message(Command("delshop"))
 async def delete_shop(message: Message):
-    config = load_config()
-    if not config:
+    shop_names = shops.names()
+    if not shop_names:
         await message.answer("Нет сохраненных магазинов для удаления.")
         return
 
     try:
         buttons = [
             InlineKeyboardButton(text=str(name), callback_data=f"delshop_{name}")
-            for name in config.keys()
+            for name in shop_names
         ]
 
         keyboard = InlineKeyboardMarkup(inline_keyboard=[buttons])
         await message.answer("Выберите магазин для удаления:", reply_markup=keyboard)
     except Exception as e:
-        logging.error(f"Ошибка при создании кнопок для удаления магазина: {e}")
+        logging.error("Ошибка при создании кнопок для удаления магазина: %s", e)
         await message.answer(f"Ошибка при создании кнопок: {e}")
 
 
@@ -150,9 +222,8 @@ async def delete_shop(message: Message):
 )
 async def handle_shop_deletion(callback_query: CallbackQuery):
     shop_name = callback_query.data.split("_", 1)[1]  # Извлекаем имя магазина
-    config = load_config()
 
-    if shop_name in config:
+    if shop_name in shops:
         # Отправляем сообщение с подтверждением
         confirm_buttons = [
             InlineKeyboardButton(
@@ -177,11 +248,10 @@ async def handle_shop_deletion(callback_query: CallbackQuery):
 )
 async def confirm_shop_deletion(callback_query: CallbackQuery):
     shop_name = callback_query.data.split("_", 2)[2]  # Извлекаем имя магазина
-    config = load_config()
+    api_key = await shops.remove(shop_name)
 
-    if shop_name in config:
-        del config[shop_name]
-        save_config(config)
+    if api_key is not None:
+        await invalidate_shop(api_key)
         await callback_query.message.edit_text(f"Магазин {shop_name} удален.")
     else:
         await callback_query.message.edit_text("Магазин не найден.")
@@ -198,22 +268,106 @@ async def cancel_shop_deletion(callback_query: CallbackQuery):
 # ! -------------------DELSHOP--------------------
 
 
+# ! -------------------DIGEST--------------------
+@router.message(Command("subscribe"))
+async def subscribe(message: Message):
+    shop_names = shops.names()
+    if not shop_names:
+        await message.answer("Сначала добавьте магазины с помощью /addshop.")
+        return
+
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text=name, callback_data=f"sub_{name}")]
+            for name in shop_names
+        ]
+    )
+    await message.answer("Выберите магазин для дайджеста:", reply_markup=keyboard)
+
+
+@router.callback_query(lambda callback_query: callback_query.data.startswith("sub_"))
+async def handle_subscribe_shop(callback_query: CallbackQuery, state: FSMContext):
+    shop_name = callback_query.data.split("_", 1)[1]  # Извлекаем имя магазина
+    if shop_name not in shops:
+        await callback_query.message.edit_text("Магазин не найден.")
+        return
+
+    await state.update_data(digest_shop=shop_name)
+    keyboard = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(text="Ежедневно", callback_data="subfreq_daily"),
+                InlineKeyboardButton(
+                    text="Еженедельно", callback_data="subfreq_weekly"
+                ),
+            ]
+        ]
+    )
+    await callback_query.message.edit_text(
+        f"Как часто присылать дайджест по магазину {shop_name}?",
+        reply_markup=keyboard,
+    )
+
+
+@router.callback_query(
+    lambda callback_query: callback_query.data.startswith("subfreq_")
+)
+async def handle_subscribe_frequency(callback_query: CallbackQuery, state: FSMContext):
+    frequency = callback_query.data.split("_", 1)[1]
+    user_data = await state.get_data()
+    shop_name = user_data.get("digest_shop")
+
+    if frequency not in DIGEST_FREQUENCIES or shop_name not in shops:
+        await callback_query.message.edit_text("Магазин не найден.")
+        return
+
+    await subscriptions.subscribe(callback_query.message.chat.id, shop_name, frequency)
+    when = "каждый день" if frequency == "daily" else "раз в неделю"
+    await callback_query.message.edit_text(
+        f"Дайджест по магазину {shop_name} будет приходить {when} "
+        f"в {DIGEST_TIME:%H:%M}."
+    )
+
+
+@router.message(Command("unsubscribe"))
+async def unsubscribe(message: Message):
+    removed = await subscriptions.unsubscribe(message.chat.id)
+    if removed:
+        await message.answer("Подписки на дайджесты отменены.")
+    else:
+        await message.answer("У вас нет подписок на дайджесты.")
+
+
+# ! -------------------DIGEST--------------------
+
+
+#! ----------------- STATS -----------------
+@router.message(Command("stats"))
+async def show_stats(message: Message):
+    if message.from_user.id not in ADMIN_IDS:
+        await message.answer("Команда доступна только администраторам.")
+        return
+    await message.answer(format_stats(), parse_mode="Markdown")
+
+
+#! ----------------- STATS -----------------
+
+
 #! -------------------------------------- REPOTR --------------------------------------
 @router.message(Command("report"))
 async def get_report(message: Message, state: FSMContext):
-    config = load_config()
-    if not config:
+    shop_names = shops.names()
+    if not shop_names:
         await message.answer("Сначала добавьте магазины с помощью /addshop.")
         return
 
-    if not config.keys():
-        await message.answer("Нет доступных магазинов для отчёта.")
-        return
-
     keyboard = InlineKeyboardMarkup(inline_keyboard=[])
-    for shop in config.keys():
+    for shop in shop_names:
         button = InlineKeyboardButton(text=shop, callback_data=f"shop_{shop}")
         keyboard.inline_keyboard.append([button])
+    if len(shop_names) > 1:
+        button = InlineKeyboardButton(text="Все магазины", callback_data=ALL_SHOPS)
+        keyboard.inline_keyboard.append([button])
 
     await message.answer("Выберите магазин для отчёта:", reply_markup=keyboard)
     await state.set_state(ReportForm.waiting_for_shop_name)
@@ -221,31 +375,44 @@ async def get_report(message: Message, state: FSMContext):
 
 @router.callback_query(lambda callback_query: callback_query.data.startswith("shop_"))
 async def handle_shop_selection(callback_query: CallbackQuery, state: FSMContext):
-    logging.info(f"callback_query.data: {callback_query.data}")
+    logging.info("callback_query.data: %s", callback_query.data)
     shop_name = callback_query.data.split("_", 1)[1]  # Извлекаем имя магазина
-    logging.info(f"Извлеченное имя магазина: {shop_name}")
+    logging.info("Извлеченное имя магазина: %s", shop_name)
 
-    config = load_config()
-
-    if shop_name not in config:
+    if shop_name not in shops:
         await bot.answer_callback_query(
             callback_query.id, "Магазин не найден в конфигурации."
         )
-        logging.error(f"Магазин {shop_name} не найден в конфигурации.")
+        logging.error("Магазин %s не найден в конфигурации.", shop_name)
         return
 
     # Проверка наличия API ключа
-    shop_api_key = config.get(shop_name)
+    shop_api_key = shops.get(shop_name)
     if not shop_api_key:
         await bot.answer_callback_query(
             callback_query.id, "API ключ для магазина не найден."
         )
-        logging.error(f"API ключ для магазина {shop_name} не найден.")
+        logging.error("API ключ для магазина %s не найден.", shop_name)
         return
 
     # Сохраняем имя магазина в контексте FSM
-    await state.update_data(shop_name=shop_name)
+    await state.update_data(shop_name=shop_name, all_shops=False)
+    await send_period_keyboard(callback_query)
+    await state.set_state(ReportForm.waiting_for_report_period)
 
+
+@router.callback_query(lambda callback_query: callback_query.data == ALL_SHOPS)
+async def handle_all_shops_selection(callback_query: CallbackQuery, state: FSMContext):
+    if not shops.names():
+        await bot.answer_callback_query(callback_query.id, "Нет сохраненных магазинов.")
+        return
+
+    await state.update_data(shop_name=None, all_shops=True)
+    await send_period_keyboard(callback_query)
+    await state.set_state(ReportForm.waiting_for_report_period)
+
+
+async def send_period_keyboard(callback_query: CallbackQuery):
     # Отправляем клавиатуру для выбора периода отчета
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
@@ -268,68 +435,151 @@ async def handle_shop_selection(callback_query: CallbackQuery, state: FSMContext
     await bot.send_message(
         callback_query.from_user.id, "Выберите период отчета:", reply_markup=keyboard
     )
-    await state.set_state(ReportForm.waiting_for_report_period)
 
 
-@router.callback_query()
-async def handle_report_period(callback_query: CallbackQuery, state: FSMContext):
-    period = callback_query.data
+@router.callback_query(lambda callback_query: callback_query.data.startswith("top_"))
+async def handle_top_report(callback_query: CallbackQuery, state: FSMContext):
+    dimension = callback_query.data.split("_", 1)[1]
     user_data = await state.get_data()
     shop_name = user_data.get("shop_name")
-    shop_api_key = load_config()
+    shop_api_key = shops.get(shop_name)
 
-    if not shop_api_key or shop_name not in shop_api_key:
+    if not shop_api_key or "period" not in user_data:
         await bot.answer_callback_query(
-            callback_query.id, "API ключ для магазина не найден."
+            callback_query.id, "Сначала получите отчёт с помощью /report."
         )
-        logging.error(f"API ключ для магазина {shop_name} не найден.")
         return
 
-    if period == "custom_period":
-        await bot.send_message(
-            callback_query.from_user.id, "Введите дату начала в формате YYYY-MM-DD:"
+    await bot.answer_callback_query(callback_query.id)
+    user_id = callback_query.from_user.id
+    period = user_data["period"]
+    date_start, date_end = user_data.get("date_start"), user_data.get("date_end")
+
+    async def build(progress):
+        report_data = await get_sales_report(
+            shop_api_key, period, date_start, date_end, progress
         )
-        await state.set_state(ReportForm.waiting_for_start_date)
-        return
+        if not isinstance(report_data, list):
+            return None
+        top = await compute_pool.top_groups(report_data, dimension, TOP_LIMIT)
+        return format_top_report(dimension, top), None
 
-    try:
-        report_data = get_sales_report(shop_api_key[shop_name], period)
-        # Если данные не в списке, возможно, их нужно преобразовать
-        if isinstance(report_data, dict) and "reports" in report_data:
-            report_data = report_data["reports"]
+    key = ("top", shop_name, dimension, period, date_start, date_end)
+    await report_jobs.submit(user_id, user_id, key, build)
 
-        # Рассчитываем ключевые показатели
-        key_metrics = calculate_key_metrics(report_data)
 
-        # Форматируем отчет
-        report = format_report(key_metrics)
+@router.callback_query(lambda callback_query: callback_query.data == COMPARE)
+async def handle_compare(callback_query: CallbackQuery, state: FSMContext):
+    user_data = await state.get_data()
+    shop_name = user_data.get("shop_name")
+    shop_api_key = shops.get(shop_name)
 
-        await bot.send_message(
-            callback_query.from_user.id, report, parse_mode="Markdown"
+    if not shop_api_key or "period" not in user_data:
+        await bot.answer_callback_query(
+            callback_query.id, "Сначала получите отчёт с помощью /report."
         )
-        await state.set_state(None)  # Завершаем состояние FSM
+        return
 
-    except AttributeError as e:
-        # Специальная обработка ошибки AttributeError (NoneType)
-        logging.error(f"Ошибка при получении отчета для магазина {shop_name}: {e}")
+    await bot.answer_callback_query(callback_query.id)
+    user_id = callback_query.from_user.id
+    period = user_data["period"]
+    date_start, date_end = user_data.get("date_start"), user_data.get("date_end")
+
+    async def build(progress):
+        report = await build_comparison_report(
+            shop_api_key, period, date_start, date_end, progress
+        )
+        if report is None:
+            return None
+        return report, None
+
+    key = (COMPARE, shop_name, period, date_start, date_end)
+    await report_jobs.submit(user_id, user_id, key, build)
+
+
+@router.callback_query(
+    lambda callback_query: callback_query.data.startswith(EXPORT)
+)
+async def handle_export(callback_query: CallbackQuery, state: FSMContext):
+    fmt = callback_query.data[len(EXPORT) :]
+    user_data = await state.get_data()
+    shop_name = user_data.get("shop_name")
+    shop_api_key = shops.get(shop_name)
+
+    if not shop_api_key or "period" not in user_data:
         await bot.answer_callback_query(
-            callback_query.id, "К сожалению, за выбранный период данных нет."
+            callback_query.id, "Сначала получите отчёт с помощью /report."
         )
-        await bot.send_message(
-            callback_query.from_user.id, "К сожалению, за выбранный период данных нет."
+        return
+    if fmt not in EXPORT_FORMATS:
+        await bot.answer_callback_query(
+            callback_query.id, "Этот формат выгрузки недоступен."
         )
+        return
 
-    except Exception as e:
-        logging.error(f"Ошибка при получении отчета для магазина {shop_name}: {e}")
+    await bot.answer_callback_query(callback_query.id)
+    user_id = callback_query.from_user.id
+    period = user_data["period"]
+    date_start, date_end = user_data.get("date_start"), user_data.get("date_end")
+
+    async def build(progress):
+        async with export_sales(
+            shop_api_key, fmt, period, date_start, date_end, progress
+        ) as export:
+            if export is None:
+                return None
+            path, filename, count = export
+            await bot.send_document(user_id, FSInputFile(path, filename=filename))
+        return f"📎 Выгрузка готова: {count} продаж", None
+
+    key = ("export", shop_name, fmt, period, date_start, date_end)
+    await report_jobs.submit(user_id, user_id, key, build)
+
+
+@router.callback_query()
+async def handle_report_period(callback_query: CallbackQuery, state: FSMContext):
+    period = callback_query.data
+    user_data = await state.get_data()
+    shop_name = user_data.get("shop_name")
+    shop_api_key = shops.get(shop_name)
+    all_shops = user_data.get("all_shops")
+
+    if not shop_api_key and not all_shops:
         await bot.answer_callback_query(
-            callback_query.id, "Ошибка при получении отчета."
+            callback_query.id, "API ключ для магазина не найден."
         )
-        await bot.send_message(callback_query.from_user.id, f"Ошибка: {e}")
+        logging.error("API ключ для магазина %s не найден.", shop_name)
+        return
+
+    if period == "custom_period":
+        await bot.send_message(
+            callback_query.from_user.id, "Введите дату начала в формате YYYY-MM-DD:"
+        )
+        await state.set_state(ReportForm.waiting_for_start_date)
+        return
+
+    # Отчёт строится в фоне: callback закрывается сразу
+    await bot.answer_callback_query(callback_query.id)
+    user_id = callback_query.from_user.id
+    if all_shops:
+        await submit_all_shops_report(user_id, user_id, period)
+        await state.set_state(None)
+        return
+
+    # Период запоминаем для кнопок разбивки по группам
+    await state.update_data(period=period)
+    await state.set_state(None)  # Завершаем состояние FSM
+    await submit_shop_report(user_id, user_id, shop_name, period)
 
 
 @router.message(ReportForm.waiting_for_start_date)
 async def handle_start_date(message: Message, state: FSMContext):
-    date_start = message.text
+    try:
+        date_start = parse_date(message.text)
+    except InvalidDateError as e:
+        # Остаёмся в том же состоянии: пользователь вводит дату заново
+        await message.answer(str(e))
+        return
     await state.update_data(date_start=date_start)
     # Запрашиваем дату окончания
     await message.answer("Введите дату окончания в формате YYYY-MM-DD:")
@@ -338,70 +588,175 @@ async def handle_start_date(message: Message, state: FSMContext):
 
 @router.message(ReportForm.waiting_for_end_date)
 async def handle_end_date(message: Message, state: FSMContext):
-    date_end = message.text
+    try:
+        date_end = parse_date(message.text)
+    except InvalidDateError as e:
+        await message.answer(str(e))
+        return
     user_data = await state.get_data()
 
     date_start = user_data.get("date_start")
     shop_name = user_data.get("shop_name")
-    shop_api_key = load_config().get(shop_name)
 
     # Проверка дат
     if not (date_start and date_end):
         await message.answer("Необходимо указать обе даты.")
         return
+    if date_end < date_start:
+        await message.answer(
+            "Дата окончания раньше даты начала. "
+            "Введите дату окончания в формате YYYY-MM-DD:"
+        )
+        return
 
-    try:
-        report_data = get_sales_report(shop_api_key, "custom", date_start, date_end)
+    if user_data.get("all_shops"):
+        await submit_all_shops_report(
+            message.from_user.id, message.chat.id, "custom", date_start, date_end
+        )
+        await state.set_state(None)
+        return
 
-        # Если данные не в списке, возможно, их нужно преобразовать
-        if isinstance(report_data, dict) and "reports" in report_data:
-            report_data = report_data["reports"]
+    # Период запоминаем для кнопок разбивки по группам
+    await state.update_data(period="custom", date_end=date_end)
+    await state.set_state(None)  # Завершаем состояние FSM
+    await submit_shop_report(
+        message.from_user.id, message.chat.id, shop_name, "custom", date_start, date_end
+    )
 
-        # Рассчитываем ключевые показатели
-        key_metrics = calculate_key_metrics(report_data)
 
-        # Форматируем отчет
-        report = format_report(key_metrics)
+async def submit_shop_report(
+    user_id, chat_id, shop_name, period, date_start=None, date_end=None
+):
+    """Ставит отчёт по магазину в очередь; прежний отчёт пользователя отменяется"""
+    shop_api_key = shops.get(shop_name)
 
-        await bot.send_message(message.chat.id, report, parse_mode="Markdown")
-        await state.set_state(None)  # Завершаем состояние FSM
+    async def build(progress):
+        # Итоги считаются по дневным сводкам, без обхода строк продаж
+        report = await build_shop_report(
+            shop_api_key, period, date_start, date_end, progress
+        )
+        if report is None:
+            return None
+        return report, top_keyboard()
 
-    except AttributeError as e:
-        logging.error(f"Ошибка при получении отчета для магазина {shop_name}: {e}")
-        await message.answer("К сожалению, за выбранный период данных нет.")
+    key = (shop_name, period, date_start, date_end)
+    await report_jobs.submit(user_id, chat_id, key, build)
 
-    except Exception as e:
-        logging.error(f"Ошибка при получении отчета для магазина {shop_name}: {e}")
-        await message.answer(f"Ошибка при получении отчета: {e}")
-
-
-# Utility function to format the report
-def format_report(key_metrics):
-    def format_number(value):
-        return round(value, 2) if isinstance(value, (int, float)) else value
-
-    report = (
-        "*📊 Отчёт о продажах:*\n\n"
-        f"• *Общая сумма продаж:* {format_number(key_metrics.get('total_sales', 'N/A'))}\n"
-        f"• *Процент скидки:* {format_number(key_metrics.get('total_discount', 'N/A'))}\n\n"
-        f"• *SPP:* {format_number(key_metrics.get('spp', 'N/A'))}\n"
-        f"• *Сумма оплаты:* {format_number(key_metrics.get('payment_sale_amount', 'N/A'))}\n"
-        f"• *Сумма для оплаты:* {format_number(key_metrics.get('for_pay', 'N/A'))}\n\n"
-        f"• *Финальная цена:* {format_number(key_metrics.get('finished_price', 'N/A'))}\n"
-        f"• *Цена со скидкой:* {format_number(key_metrics.get('price_with_disc', 'N/A'))}\n"
+
+async def submit_all_shops_report(
+    user_id, chat_id, period, date_start=None, date_end=None
+):
+    """Ставит сводный отчёт по всем магазинам в очередь"""
+    shop_keys = dict(shops.items())
+
+    async def build(progress):
+        per_shop, overall = await get_shops_totals(
+            shop_keys, period, date_start, date_end, progress
+        )
+        # Возраст сводного отчёта — по самому давно обновлённому магазину
+        synced = [await last_synced(api_key) for api_key in shop_keys.values()]
+        synced = [updated_at for updated_at in synced if updated_at is not None]
+        report = format_all_shops_report(per_shop, overall, min(synced, default=None))
+        return report, None
+
+    key = (ALL_SHOPS, period, date_start, date_end)
+    await report_jobs.submit(user_id, chat_id, key, build)
+
+
+# Разбивка отчёта по группам: измерение -> (текст кнопки, заголовок)
+TOP_DIMENSIONS = {
+    "article": ("Топ артикулов", "Топ-10 артикулов по сумме продаж"),
+    "warehouse": ("Топ складов", "Топ-10 складов по сумме продаж"),
+    "region": ("Топ регионов", "Топ-10 регионов по сумме продаж"),
+}
+
+
+def top_keyboard():
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(text=text, callback_data=f"top_{dimension}")
+                for dimension, (text, _) in TOP_DIMENSIONS.items()
+            ],
+            [
+                InlineKeyboardButton(
+                    text="Сравнить с прошлым периодом", callback_data=COMPARE
+                )
+            ],
+            [
+                InlineKeyboardButton(
+                    text=f"Выгрузить {fmt.upper()}", callback_data=f"{EXPORT}{fmt}"
+                )
+                for fmt in EXPORT_FORMATS
+            ],
+        ]
     )
-    return report
+
+
+def format_top_report(dimension, top):
+    title = TOP_DIMENSIONS[dimension][1]
+    if not top:
+        return f"📊 {title}:\n\nНет данных."
+
+    lines = [
+        f"{place}. {escape_markdown(str(name or 'Не указано'))} — "
+        f"{round(totals.total_price, 2)} "
+        f"({totals.count} шт., к оплате {round(totals.for_pay, 2)})"
+        for place, (name, totals) in enumerate(top, start=1)
+    ]
+    return f"📊 {title}:\n\n" + "\n".join(lines)
 
 
 #! -------------------------------------- REPOTR --------------------------------------
 
 
-async def main():
-    """Запуск бота"""
+async def run_bot(worker=0):
+    """Запуск бота: фоновые задачи и приём апдейтов выбранным способом.
+
+    В режиме webhook с несколькими процессами фоновое обновление отчётов и
+    рассылка дайджестов работают только в процессе 0, чтобы не дублироваться.
+    """
     dp.include_router(router)
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    instrument(router, bot)
+    metrics_server = await start_metrics_server(
+        port=METRICS_PORT + worker if METRICS_PORT else 0
+    )
+    if worker == 0:
+        if PREFETCH_INTERVAL > 0:
+            prefetcher.start()
+        digests.start()
+    send_queue.start()
+    try:
+        if BOT_MODE == "webhook":
+            await serve_webhook(dp, bot, worker)
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            await dp.start_polling(bot)
+    finally:
+        await digests.stop()
+        await report_jobs.stop()
+        await send_queue.stop()
+        await prefetcher.stop()
+        await compute_pool.close()
+        await close_session()
+        if metrics_server is not None:
+            await metrics_server.cleanup()
+
+
+def webhook_worker(worker):
+    setup_logging()
+    asyncio.run(run_bot(worker))
+
+
+def main():
+    """Запуск бота"""
+    setup_logging()
+    if BOT_MODE == "webhook" and WEBHOOK_WORKERS > 1:
+        run_workers(webhook_worker)
+    else:
+        asyncio.run(run_bot())
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # Процессы пула расчётов заново выполняли бы этот модуль целиком
+    sys.exit("Запускайте бота через main.py: python main.py")
@@ -0,0 +1,136 @@
+import array
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+from concurrent.futures.process import BrokenProcessPool
+from operator import attrgetter
+
+from decouple import config
+
+from instrumentation import STAGE_SECONDS
+from metrics import GROUP_DIMENSIONS, METRIC_FIELDS, group_by, group_columns, top_groups
+
+# Где считать большие отчёты: process, thread или inline (прямо в цикле событий)
+COMPUTE_POOL = config("COMPUTE_POOL", default="process")
+COMPUTE_WORKERS = config("COMPUTE_WORKERS", default=2, cast=int)
+# Отчёты меньше этого числа продаж считаются на месте, без передачи в пул
+COMPUTE_INLINE_ROWS = config("COMPUTE_INLINE_ROWS", default=20_000, cast=int)
+
+POOL_KINDS = ("process", "thread", "inline")
+# Сколько продаж упаковывается за один шаг
+PACK_CHUNK = 10_000
+
+_metric_getters = [attrgetter(field) for field in METRIC_FIELDS]
+
+
+def pack_records(records, dimension):
+    """Продажи (SaleRecord) в столбцовом виде для передачи в другой процесс.
+
+    Ключи групп кодируются словарём: различные ключи и номер ключа каждой
+    продажи в array('I'); показатели — по array('d') на поле. Такой набор
+    сериализуется как несколько байтовых буферов, а не как список объектов.
+    Упаковка идёт кусками по PACK_CHUNK продаж, чтобы поток, в котором она
+    выполняется, не держал GIL подолгу.
+    """
+    key_of = GROUP_DIMENSIONS[dimension]
+    index = {}
+    codes = array.array("I")
+    columns = [array.array("d") for _ in _metric_getters]
+    for start in range(0, len(records), PACK_CHUNK):
+        chunk = records[start : start + PACK_CHUNK]
+        row_keys = list(map(key_of, chunk))
+        for key in dict.fromkeys(row_keys):
+            index.setdefault(key, len(index))
+        codes.extend(map(index.__getitem__, row_keys))
+        for column, getter in zip(columns, _metric_getters):
+            column.extend(map(getter, chunk))
+    return list(index), codes, columns
+
+
+def top_packed(payload, n, by):
+    """Первые n групп по упакованным продажам; выполняется в процессе пула"""
+    keys, codes, columns = payload
+    return top_groups(group_columns(keys, codes, columns), n, by)
+
+
+def top_records(records, dimension, n, by):
+    return top_groups(group_by(records, dimension), n, by)
+
+
+class ComputePool:
+    """Пул для тяжёлых расчётов по продажам, чтобы они не останавливали бота.
+
+    Отчёты меньше ``inline_rows`` продаж считаются на месте: передача в пул
+    стоит дороже самого расчёта. Для пула процессов продажи упаковываются
+    (pack_records) в отдельном потоке, а обратно приходит только результат.
+    """
+
+    def __init__(
+        self,
+        kind=COMPUTE_POOL,
+        workers=COMPUTE_WORKERS,
+        inline_rows=COMPUTE_INLINE_ROWS,
+    ):
+        if kind not in POOL_KINDS:
+            raise ValueError(f"Неизвестный пул расчётов: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.inline_rows = inline_rows
+        self._executor = None
+        self.inline = 0
+        self.offloaded = 0
+        self.running = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                # spawn, как и у процессов webhook: дочерний процесс не наследует
+                # потоки и блокировки бота
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    self.workers, thread_name_prefix="compute"
+                )
+        return self._executor
+
+    async def top_groups(self, records, dimension, n=10, by="total_price"):
+        """Первые n групп продаж по измерению ``dimension`` (см. metrics.top_groups)"""
+        with STAGE_SECONDS.time("aggregate"):
+            if self.kind == "inline" or len(records) < self.inline_rows:
+                self.inline += 1
+                return top_records(records, dimension, n, by)
+
+            self.offloaded += 1
+            self.running += 1
+            loop = asyncio.get_running_loop()
+            try:
+                if self.kind == "thread":
+                    return await loop.run_in_executor(
+                        self._get_executor(), top_records, records, dimension, n, by
+                    )
+                payload = await asyncio.to_thread(pack_records, records, dimension)
+                return await loop.run_in_executor(
+                    self._get_executor(), top_packed, payload, n, by
+                )
+            except BrokenProcessPool:
+                # Процесс пула погиб — следующий расчёт запустит новый пул
+                logging.error("Пул расчётов остановился, он будет создан заново")
+                self._executor = None
+                raise
+            finally:
+                self.running -= 1
+
+    def stats(self):
+        return {
+            "inline": self.inline,
+            "offloaded": self.offloaded,
+            "running": self.running,
+        }
+
+    async def close(self):
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
@@ -0,0 +1,189 @@
+import asyncio
+import datetime
+import logging
+import os
+
+from errors import WildberriesError
+from reports import build_shop_report, escape_markdown
+from utils import file_lock, read_json, write_json_atomic
+
+SUBSCRIPTIONS_FILE = "subscriptions.json"
+
+# Частота дайджеста -> (период отчёта, заголовок)
+DIGEST_FREQUENCIES = {
+    "daily": ("yesterday", "Ежедневный дайджест"),
+    "weekly": ("last_7_days", "Еженедельный дайджест"),
+}
+
+
+class Subscriptions:
+    """Подписки чатов на дайджесты: chat_id -> {имя магазина: частота}.
+
+    Файл перечитывается при изменении времени модификации, так что подписки,
+    оформленные в другом процессе бота (режим webhook), видны и здесь, а
+    изменения идут под file_lock и не затирают чужие.
+    """
+
+    def __init__(self, path=SUBSCRIPTIONS_FILE):
+        self.path = path
+        self._data = {}
+        self._mtime = None
+        self._lock = asyncio.Lock()
+        self._refresh()
+
+    def _refresh(self, force=False):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._mtime or force:
+            self._data = read_json(self.path, {}) if mtime is not None else {}
+            self._mtime = mtime
+
+    def for_chat(self, chat_id):
+        self._refresh()
+        return dict(self._data.get(str(chat_id), {}))
+
+    def items(self):
+        """Все подписки в виде (chat_id, магазин, частота)"""
+        self._refresh()
+        return [
+            (int(chat_id), shop_name, frequency)
+            for chat_id, chat_shops in self._data.items()
+            for shop_name, frequency in chat_shops.items()
+        ]
+
+    async def subscribe(self, chat_id, shop_name, frequency):
+        async with self._lock, file_lock(self.path):
+            self._refresh(force=True)
+            data = {chat: dict(chat_shops) for chat, chat_shops in self._data.items()}
+            data.setdefault(str(chat_id), {})[shop_name] = frequency
+            await self._save(data)
+
+    async def unsubscribe(self, chat_id):
+        """Отписывает чат от всех дайджестов; возвращает число удалённых подписок"""
+        async with self._lock, file_lock(self.path):
+            self._refresh(force=True)
+            if str(chat_id) not in self._data:
+                return 0
+            data = dict(self._data)
+            removed = len(data.pop(str(chat_id)))
+            await self._save(data)
+            return removed
+
+    async def _save(self, data):
+        await asyncio.to_thread(write_json_atomic, self.path, data)
+        self._data = data
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+
+def next_run(now, send_time):
+    """Ближайший момент отправки дайджестов не раньше ``now``"""
+    run_at = datetime.datetime.combine(now.date(), send_time)
+    if run_at <= now:
+        run_at += datetime.timedelta(days=1)
+    return run_at
+
+
+class DigestScheduler:
+    """Рассылка дайджестов подписчикам в заданное время.
+
+    Отчёт строится один раз на пару (магазин, период), сколько бы чатов на
+    него ни было подписано, а сообщения уходят через SendQueue, который
+    соблюдает флуд-лимиты Telegram.
+    """
+
+    def __init__(
+        self,
+        subscriptions,
+        registry,
+        send_queue,
+        send_time,
+        weekday=0,
+        concurrency=4,
+    ):
+        self.subscriptions = subscriptions
+        self.registry = registry
+        self.send_queue = send_queue
+        self.send_time = send_time
+        self.weekday = weekday  # день недели для еженедельных дайджестов
+        self.concurrency = concurrency
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            now = datetime.datetime.now()
+            run_at = next_run(now, self.send_time)
+            await asyncio.sleep((run_at - now).total_seconds())
+            try:
+                await self.send_digests(run_at)
+            except Exception as e:
+                logging.error("Ошибка рассылки дайджестов: %s", e)
+
+    def due_frequencies(self, day):
+        frequencies = {"daily"}
+        if day.weekday() == self.weekday:
+            frequencies.add("weekly")
+        return frequencies
+
+    async def send_digests(self, day):
+        due = self.due_frequencies(day)
+
+        # Группируем подписчиков, чтобы строить каждый отчёт один раз
+        groups = {}
+        for chat_id, shop_name, frequency in self.subscriptions.items():
+            if frequency in due:
+                groups.setdefault((shop_name, frequency), []).append(chat_id)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send_group(shop_name, frequency, chat_ids):
+            async with semaphore:
+                text = await self.build_digest(shop_name, frequency)
+            if text is None:
+                return []
+            return [
+                self.send_queue.submit(chat_id, text, parse_mode="Markdown")
+                for chat_id in chat_ids
+            ]
+
+        batches = await asyncio.gather(
+            *(send_group(*key, chat_ids) for key, chat_ids in groups.items())
+        )
+        futures = [future for batch in batches for future in batch]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        failed = sum(isinstance(result, Exception) for result in results)
+        logging.info(
+            "Дайджесты отправлены: %s, ошибок: %s", len(results) - failed, failed
+        )
+        return len(results) - failed
+
+    async def build_digest(self, shop_name, frequency):
+        api_key = self.registry.get(shop_name)
+        if not api_key:
+            logging.warning("Магазин %s из подписки не найден.", shop_name)
+            return None
+
+        period, title = DIGEST_FREQUENCIES[frequency]
+        try:
+            report = await build_shop_report(api_key, period)
+        except WildberriesError as e:
+            logging.error("Не удалось построить дайджест магазина %s: %s", shop_name, e)
+            return None
+
+        if report is None:
+            report = "За период продаж нет.\n"
+        return f"*{title}:* {escape_markdown(shop_name)}\n\n{report}"
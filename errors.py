@@ -0,0 +1,41 @@
+class WildberriesError(Exception):
+    """Базовая ошибка обращения к API Wildberries.
+
+    Текст исключения предназначен для пользователя бота.
+    """
+
+
+class InvalidApiKeyError(WildberriesError):
+    def __init__(self):
+        super().__init__("Неверный API ключ")
+
+
+class RateLimitError(WildberriesError):
+    def __init__(self, retry_after=None):
+        self.retry_after = retry_after
+        message = "Превышен лимит запросов к API Wildberries"
+        if retry_after:
+            message += f", попробуйте через {int(retry_after) + 1} с"
+        super().__init__(message)
+
+
+class UpstreamError(WildberriesError):
+    def __init__(self, status):
+        self.status = status
+        super().__init__(f"Ошибка получения данных: Статус {status}")
+
+
+class UpstreamConnectionError(WildberriesError):
+    def __init__(self, reason):
+        super().__init__(f"Ошибка подключения: {reason}")
+
+
+class InvalidResponseError(WildberriesError):
+    def __init__(self, reason):
+        super().__init__(f"Некорректный ответ API: {reason}")
+
+
+class InvalidDateError(WildberriesError):
+    def __init__(self, value):
+        self.value = value
+        super().__init__(f"Неверная дата «{value}». Укажите дату в формате YYYY-MM-DD")
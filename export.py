@@ -0,0 +1,126 @@
+import asyncio
+import contextlib
+import csv
+import importlib.util
+import os
+import tempfile
+import threading
+
+from decouple import config
+
+from instrumentation import STAGE_SECONDS
+from sales_store import SALE_FIELDS
+from wildberries_api import resolve_period, sales_store, sync_window
+
+# Разделитель CSV; «;» по умолчанию, чтобы Excel с русской локалью открывал
+# файл по столбцам
+EXPORT_CSV_DELIMITER = config("EXPORT_CSV_DELIMITER", default=";")
+# Сколько строк читается из хранилища и записывается в файл за один шаг
+EXPORT_BATCH = 5000
+# Предельный размер файла, который бот может отправить в Telegram
+TELEGRAM_FILE_LIMIT = 50 * 1024 * 1024
+
+# openpyxl — необязательная зависимость, без неё доступна только выгрузка в CSV
+XLSX_AVAILABLE = importlib.util.find_spec("openpyxl") is not None
+EXPORT_FORMATS = ("csv", "xlsx") if XLSX_AVAILABLE else ("csv",)
+
+
+class ExportTooLargeError(Exception):
+    def __init__(self, size):
+        self.size = size
+        super().__init__(
+            f"Файл выгрузки ({size / 2**20:.0f} МБ) больше лимита Telegram "
+            f"({TELEGRAM_FILE_LIMIT // 2**20} МБ). Выберите период короче."
+        )
+
+
+def write_csv(path, batches):
+    # utf-8-sig: с BOM Excel узнаёт кодировку файла
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8-sig") as file:
+        writer = csv.writer(file, delimiter=EXPORT_CSV_DELIMITER)
+        writer.writerow(SALE_FIELDS)
+        for batch in batches:
+            writer.writerows(batch)
+            count += len(batch)
+    return count
+
+
+def write_xlsx(path, batches):
+    from openpyxl import Workbook
+
+    # В режиме write_only строки сразу уходят во временный файл листа
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Продажи")
+    sheet.append(SALE_FIELDS)
+    count = 0
+    for batch in batches:
+        for row in batch:
+            sheet.append(row)
+        count += len(batch)
+    workbook.save(path)
+    return count
+
+
+WRITERS = {"csv": write_csv, "xlsx": write_xlsx}
+
+
+def _until(stop, batches):
+    for batch in batches:
+        if stop.is_set():
+            return
+        yield batch
+
+
+def _write_export(fmt, batches, stop):
+    fd, path = tempfile.mkstemp(prefix="wb-export-", suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        count = WRITERS[fmt](path, _until(stop, batches))
+        if stop.is_set():
+            raise asyncio.CancelledError()
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, count
+
+
+@contextlib.asynccontextmanager
+async def export_sales(
+    api_key, fmt, period, date_start=None, date_end=None, progress=None
+):
+    """Выгружает продажи магазина за период в CSV или XLSX.
+
+    Недостающие продажи сначала догружаются в хранилище (закончившийся и
+    уже загруженный период — без запросов к API), затем строки читаются из
+    хранилища пачками и сразу пишутся в файл в отдельном потоке, так что
+    память не зависит от размера выгрузки. Отдаёт (путь, имя файла, число
+    строк) или None, если продаж нет; файл удаляется при выходе из блока.
+    """
+    window = resolve_period(period, date_start, date_end)
+    if window is None:
+        yield None
+        return
+    date_from, date_to = window
+    await sync_window(api_key, date_from, date_to, progress)
+
+    stop = threading.Event()
+    batches = sales_store.iter_sales(api_key, date_from, date_to, EXPORT_BATCH)
+    try:
+        with STAGE_SECONDS.time("export"):
+            path, count = await asyncio.to_thread(_write_export, fmt, batches, stop)
+    except asyncio.CancelledError:
+        # Поток допишет текущую пачку, остановится и удалит файл сам
+        stop.set()
+        raise
+
+    try:
+        if not count:
+            yield None
+            return
+        size = os.path.getsize(path)
+        if size > TELEGRAM_FILE_LIMIT:
+            raise ExportTooLargeError(size)
+        yield path, f"sales_{date_from[:10]}_{date_to[:10]}.{fmt}", count
+    finally:
+        os.remove(path)
@@ -0,0 +1,143 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+from aiogram.fsm.storage.memory import MemoryStorage
+from decouple import config
+
+# Хранилище состояний диалогов: memory, sqlite или redis
+FSM_STORAGE = config("FSM_STORAGE", default="sqlite")
+FSM_STORAGE_FILE = config("FSM_STORAGE_FILE", default="fsm.db")
+REDIS_URL = config("REDIS_URL", default="redis://localhost:6379/0")
+# Сколько секунд хранить брошенный диалог (0 — бессрочно)
+FSM_TTL = config("FSM_TTL", default=24 * 60 * 60, cast=int)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS fsm_expires_at ON fsm (expires_at);
+"""
+
+# Как часто удалять просроченные диалоги, секунды
+PURGE_INTERVAL = 10 * 60
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в SQLite: переживает перезапуск и общее для процессов хоста.
+
+    Каждая запись состояния или данных продлевает диалог на ``ttl`` секунд;
+    просроченные диалоги не читаются и периодически удаляются.
+    """
+
+    def __init__(self, path=FSM_STORAGE_FILE, ttl=FSM_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._db_lock = threading.Lock()
+        self._purged_at = 0.0
+
+    def _expires_at(self, now):
+        return now + self.ttl if self.ttl else None
+
+    def _read(self, key):
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT state, data FROM fsm "
+                "WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time()),
+            ).fetchone()
+        return row or (None, None)
+
+    def _write(self, key, column, value):
+        now = time.time()
+        other = "data" if column == "state" else "state"
+        with self._db_lock, self._conn:
+            # Вторая половина просроченного диалога не должна «воскреснуть»
+            self._conn.execute(
+                f"INSERT INTO fsm (key, {column}, expires_at) VALUES (?, ?, ?) "
+                f"ON CONFLICT (key) DO UPDATE SET {column} = excluded.{column}, "
+                f"{other} = CASE WHEN fsm.expires_at <= ? THEN NULL "
+                f"ELSE fsm.{other} END, expires_at = excluded.expires_at",
+                (key, value, self._expires_at(now), now),
+            )
+            # Диалог завершён и данных нет — запись больше не нужна
+            self._conn.execute(
+                "DELETE FROM fsm WHERE key = ? AND state IS NULL AND data IS NULL",
+                (key,),
+            )
+            if now - self._purged_at >= PURGE_INTERVAL:
+                self._purged_at = now
+                deleted = self._conn.execute(
+                    "DELETE FROM fsm WHERE expires_at <= ?", (now,)
+                ).rowcount
+                if deleted:
+                    logging.info("Удалено просроченных диалогов: %s", deleted)
+
+    async def set_state(self, key, state=None):
+        if isinstance(state, State):
+            state = state.state
+        key = self.key_builder.build(key)
+        await asyncio.to_thread(self._write, key, "state", state)
+
+    async def get_state(self, key):
+        state, _ = await asyncio.to_thread(self._read, self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key, data):
+        value = json.dumps(data, ensure_ascii=False) if data else None
+        key = self.key_builder.build(key)
+        await asyncio.to_thread(self._write, key, "data", value)
+
+    async def get_data(self, key):
+        _, data = await asyncio.to_thread(self._read, self.key_builder.build(key))
+        return json.loads(data) if data else {}
+
+    async def close(self):
+        with self._db_lock:
+            self._conn.close()
+
+
+def create_storage(kind=FSM_STORAGE):
+    """FSM-хранилище, выбранное в настройках (FSM_STORAGE)"""
+    if kind == "memory":
+        return MemoryStorage()
+    if kind == "sqlite":
+        return SQLiteStorage()
+    if kind == "redis":
+        # redis — необязательная зависимость, нужна только для этого режима
+        try:
+            from redis.asyncio import Redis
+        except ImportError:
+            raise RuntimeError(
+                "Для FSM_STORAGE=redis установите пакет redis: pip install redis"
+            ) from None
+        return redis_storage(Redis.from_url(REDIS_URL))
+    raise ValueError(f"Неизвестное FSM-хранилище: {kind}")
+
+
+def redis_storage(redis, ttl=FSM_TTL):
+    """FSM-хранилище в Redis поверх клиента ``redis``.
+
+    Состояние и данные диалога хранятся с тем же сроком ``ttl`` секунд,
+    что и в SQLiteStorage (0 — бессрочно).
+    """
+    from aiogram.fsm.storage.redis import RedisStorage
+
+    return RedisStorage(
+        redis,
+        key_builder=DefaultKeyBuilder(with_bot_id=True, with_destiny=True),
+        state_ttl=ttl or None,
+        data_ttl=ttl or None,
+    )
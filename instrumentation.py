@@ -0,0 +1,249 @@
+import bisect
+import contextlib
+import logging
+import math
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiohttp import web
+from decouple import config
+
+# Сбор гистограмм задержек; выключенный сбор почти ничего не стоит
+METRICS_ENABLED = config("METRICS_ENABLED", default=False, cast=bool)
+# Адрес эндпоинта /metrics в формате Prometheus (порт 0 — не поднимать)
+METRICS_HOST = config("METRICS_HOST", default="127.0.0.1")
+METRICS_PORT = config("METRICS_PORT", default=9100, cast=int)
+
+# Границы корзин гистограмм, секунды
+DEFAULT_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60
+)
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Histogram:
+    """Гистограмма задержек с метками, совместимая с форматом Prometheus"""
+
+    def __init__(self, registry, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # метки -> [счётчики по корзинам (+Inf последним), сумма, количество]
+        self._series = {}
+
+    def observe(self, value, *labels):
+        if not self.registry.enabled:
+            return
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def time(self, *labels):
+        """Контекстный менеджер, замеряющий время блока"""
+        if not self.registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def series(self):
+        return self._series.items()
+
+    def quantile(self, q, labels):
+        """Оценка квантиля по корзинам (линейная интерполяция внутри корзины)"""
+        counts, _, count = self._series[labels]
+        rank = q * count
+        seen = 0
+        lower = 0.0
+        for upper, bucket_count in zip(self.buckets + (math.inf,), counts):
+            if bucket_count and seen + bucket_count >= rank:
+                if math.isinf(upper):
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+            lower = upper
+        return lower
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total, count) in self._series.items():
+            pairs = [
+                f'{name}="{_escape(value)}"'
+                for name, value in zip(self.labelnames, labels)
+            ]
+            cumulative = 0
+            for upper, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = "+Inf" if math.isinf(upper) else repr(float(upper))
+                bucket_labels = ",".join(pairs + [f'le="{le}"'])
+                yield f"{self.name}_bucket{{{bucket_labels}}} {cumulative}"
+            suffix = "{" + ",".join(pairs) + "}" if pairs else ""
+            yield f"{self.name}_sum{suffix} {total}"
+            yield f"{self.name}_count{suffix} {count}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Registry:
+    """Гистограммы и источники статистики (методы stats() компонентов бота).
+
+    Статистика компонентов читается только при запросе /metrics или /stats,
+    поэтому на горячем пути ничего не стоит.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.histograms = []
+        self.sources = {}
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        histogram = Histogram(self, name, help, labelnames, buckets)
+        self.histograms.append(histogram)
+        return histogram
+
+    def register_stats(self, prefix, stats):
+        """``stats`` — функция без аргументов, возвращающая словарь чисел"""
+        self.sources[prefix] = stats
+
+    def collect_stats(self):
+        collected = {}
+        for prefix, stats in self.sources.items():
+            try:
+                collected[prefix] = stats()
+            except Exception as e:
+                logging.error("Не удалось получить статистику %s: %s", prefix, e)
+        return collected
+
+    def render(self):
+        lines = []
+        for prefix, values in self.collect_stats().items():
+            for key, value in values.items():
+                name = f"{prefix}_{key}"
+                lines.append(f"# TYPE {name} untyped")
+                lines.append(f"{name} {float(value)}")
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HANDLER_SECONDS = registry.histogram(
+    "bot_handler_seconds", "Время обработки апдейта обработчиком", ("handler",)
+)
+TELEGRAM_SECONDS = registry.histogram(
+    "telegram_request_seconds", "Время запроса к Bot API", ("method",)
+)
+UPSTREAM_SECONDS = registry.histogram(
+    "wb_upstream_seconds",
+    "Время до заголовков ответа API Wildberries (одна попытка)",
+    ("endpoint", "status"),
+)
+RATE_LIMIT_WAIT_SECONDS = registry.histogram(
+    "wb_rate_limit_wait_seconds",
+    "Ожидание очереди в лимите запросов API ключа",
+    ("endpoint",),
+)
+STAGE_SECONDS = registry.histogram(
+    "report_stage_seconds", "Время этапов построения отчёта", ("stage",)
+)
+
+
+class HandlerTimer(BaseMiddleware):
+    """Inner-middleware роутера: время каждого обработчика по его имени"""
+
+    async def __call__(self, handler, event, data):
+        with HANDLER_SECONDS.time(data["handler"].callback.__name__):
+            return await handler(event, data)
+
+
+class TelegramTimer(BaseRequestMiddleware):
+    """Middleware сессии бота: время каждого вызова Bot API"""
+
+    async def __call__(self, make_request, bot, method):
+        with TELEGRAM_SECONDS.time(type(method).__name__):
+            return await make_request(bot, method)
+
+
+def instrument(router, bot):
+    """Подключает замеры обработчиков и запросов к Telegram, если сбор включён"""
+    if not registry.enabled:
+        return
+    timer = HandlerTimer()
+    router.message.middleware(timer)
+    router.callback_query.middleware(timer)
+    bot.session.middleware(TelegramTimer())
+
+
+async def handle_metrics(request):
+    return web.Response(
+        text=registry.render(), content_type="text/plain", charset="utf-8"
+    )
+
+
+async def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Поднимает эндпоинт /metrics, если сбор включён; возвращает AppRunner"""
+    if not registry.enabled or not port:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info("Метрики доступны на http://%s:%s/metrics", host, port)
+    return runner
+
+
+def format_seconds(value):
+    return f"{value * 1000:.0f} мс" if value < 1 else f"{value:.1f} с"
+
+
+def format_stats():
+    """Краткая сводка метрик для команды /stats"""
+    lines = ["*Статистика бота*"]
+
+    if not registry.enabled:
+        lines.append("_Замеры задержек выключены_")
+    for histogram in registry.histograms:
+        series = sorted(histogram.series(), key=lambda item: -item[1][2])
+        if not series:
+            continue
+        lines.append(f"\n*{histogram.help}:*")
+        for labels, (_, _, count) in series[:10]:
+            name = "/".join(map(str, labels)) or "всего"
+            lines.append(
+                f"• {name.replace('_', ' ')}: {count} шт., "
+                f"p50 {format_seconds(histogram.quantile(0.5, labels))}, "
+                f"p99 {format_seconds(histogram.quantile(0.99, labels))}"
+            )
+
+    for prefix, values in registry.collect_stats().items():
+        summary = ", ".join(
+            f"{key.replace('_', ' ')} {round(value, 3)}"
+            for key, value in values.items()
+        )
+        lines.append(f"\n*{prefix.replace('_', ' ')}:* {summary}")
+    return "\n".join(lines)
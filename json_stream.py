@@ -0,0 +1,104 @@
+import codecs
+import json
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+# Что разбор ожидает дальше
+_START = "start"  # «[» или «null»
+_FIRST = "first"  # первый элемент или «]» пустого массива
+_ITEM = "item"  # элемент после запятой
+_SEPARATOR = "separator"  # «,» или «]»
+_DONE = "done"  # только пробельные символы
+
+
+async def iter_json_array(chunks):
+    """Разбирает JSON-массив объектов по мере поступления байтов.
+
+    ``chunks`` — асинхронный итератор фрагментов тела ответа. Элементы
+    массива отдаются по одному, так что весь ответ целиком в памяти не
+    держится. Пустое тело и ``null`` считаются пустым массивом. Фрагменты
+    могут резаться где угодно; разделители между элементами и данные после
+    массива проверяются, некорректный JSON — ValueError.
+    """
+    decode = codecs.getincrementaldecoder("utf-8")().decode
+    buffer = ""
+    pos = 0
+    state = _START
+
+    async for chunk in chunks:
+        buffer = buffer[pos:] + decode(chunk)
+        pos = 0
+
+        while True:
+            pos = _skip_whitespace(buffer, pos)
+            if pos >= len(buffer):
+                break
+            char = buffer[pos]
+
+            if state == _START:
+                if buffer.startswith("null", pos):
+                    state = _DONE
+                    pos += 4
+                    continue
+                if "null".startswith(buffer[pos:]):
+                    # «null» пришёл не целиком — ждём следующий фрагмент
+                    break
+                if char != "[":
+                    raise ValueError(f"Ожидался JSON-массив, получено: {char!r}")
+                state = _FIRST
+                pos += 1
+            elif state == _SEPARATOR:
+                if char == ",":
+                    state = _ITEM
+                elif char == "]":
+                    state = _DONE
+                else:
+                    raise ValueError(
+                        f"Ожидалась «,» или «]» после элемента, получено: {char!r}"
+                    )
+                pos += 1
+            elif state == _DONE:
+                raise ValueError(f"Лишние данные после JSON-массива: {char!r}")
+            elif char == "]":
+                if state == _ITEM:
+                    raise ValueError("Лишняя запятая перед «]»")
+                state = _DONE
+                pos += 1
+            else:
+                try:
+                    item, end = _decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # Элемент пришёл не целиком — ждём следующий фрагмент
+                    break
+                if end >= len(buffer) and not isinstance(item, (dict, list)):
+                    # Число или литерал в конце фрагмента может продолжиться
+                    break
+                pos = end
+                state = _SEPARATOR
+                yield item
+
+    buffer = buffer[pos:] + decode(b"", final=True)
+    if state in (_FIRST, _ITEM, _SEPARATOR):
+        raise ValueError("Ответ оборвался посреди JSON-массива")
+    if buffer.strip(_WHITESPACE):
+        raise ValueError("Некорректный JSON в ответе")
+
+
+async def iter_batches(items, size):
+    """Группирует элементы асинхронного итератора в списки по ``size``"""
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _skip_whitespace(buffer, pos):
+    length = len(buffer)
+    while pos < length and buffer[pos] in _WHITESPACE:
+        pos += 1
+    return pos
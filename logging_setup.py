@@ -0,0 +1,167 @@
+import atexit
+import collections
+import copy
+import logging
+import logging.handlers
+import queue
+import re
+import reprlib
+
+from decouple import config
+
+from instrumentation import registry
+
+LOG_LEVEL = config("LOG_LEVEL", default="INFO").upper()
+LOG_FORMAT = config(
+    "LOG_FORMAT", default="%(asctime)s - %(levelname)s - %(message)s"
+)
+# Предельная длина сообщения, символов (0 — без ограничения)
+LOG_MAX_LENGTH = config("LOG_MAX_LENGTH", default=2000, cast=int)
+# Из однотипных DEBUG-сообщений в лог попадает каждое N-е (1 — все)
+LOG_DEBUG_SAMPLE_EVERY = config("LOG_DEBUG_SAMPLE_EVERY", default=1, cast=int)
+# Сколько записей может ждать вывода; лишние отбрасываются, а не тормозят бота
+LOG_QUEUE_SIZE = config("LOG_QUEUE_SIZE", default=10_000, cast=int)
+
+REDACTED = "***"
+# Секреты, которые не должны попадать в лог даже случайно
+SECRET_PATTERNS = (
+    # API ключи Wildberries (JWT), в том числе обрезанные
+    re.compile(r"eyJ[\w-]{8,}(?:\.[\w-]*){0,2}"),
+    # Токен Telegram-бота, например в адресе запроса к Bot API
+    re.compile(r"(?<!\d)\d{5,}:[\w-]{30,}"),
+    # Заголовок авторизации, в том числе со схемой Bearer; значение в кавычках
+    # — до закрывающей кавычки
+    re.compile(
+        r"(?i)(authorization['\"]?\s*[:=]\s*(['\"])?(?:bearer\s+)?)"
+        r"(?(2)[^'\"]+|[^\s'\",}]+)"
+    ),
+)
+
+# Форматирование значений для brief(): размер результата не зависит от размера
+# объекта
+_brief_repr = reprlib.Repr()
+_brief_repr.maxlevel = 3
+_brief_repr.maxlist = _brief_repr.maxtuple = _brief_repr.maxdict = 10
+_brief_repr.maxstring = _brief_repr.maxother = 300
+
+
+class brief:
+    """Короткое представление большого значения для аргумента лога.
+
+    ``logging.info("Ответ: %s", brief(payload))`` — строка строится, только
+    если запись проходит по уровню, и не длиннее нескольких сотен символов.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        if isinstance(self.value, str):
+            return _brief_repr.repr(self.value)[1:-1]
+        return _brief_repr.repr(self.value)
+
+
+def redact(text):
+    for pattern in SECRET_PATTERNS:
+        text = pattern.sub(
+            lambda match: (match.group(1) if match.re.groups else "") + REDACTED,
+            text,
+        )
+    return text
+
+
+class DebugSampler(logging.Filter):
+    """Пропускает каждое ``every``-е DEBUG-сообщение каждого вида.
+
+    Вид определяется логгером и шаблоном сообщения (до подстановки
+    аргументов), так что первое сообщение каждого вида всегда выводится.
+    """
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = every
+        self._seen = collections.Counter()
+
+    def filter(self, record):
+        if self.every <= 1 or record.levelno > logging.DEBUG:
+            return True
+        if len(self._seen) > 10_000:
+            self._seen.clear()
+        key = (record.name, record.msg)
+        seen = self._seen[key]
+        self._seen[key] = seen + 1
+        return seen % self.every == 0
+
+
+class RedactingFormatter(logging.Formatter):
+    """Вырезает секреты из готовой строки, включая трассировку исключения"""
+
+    def format(self, record):
+        return redact(super().format(record))
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """Обработчик корневого логгера: кладёт запись в очередь и сразу возвращается.
+
+    В вызывающем потоке только подставляются аргументы и обрезается длина;
+    форматирование, редактирование секретов и вывод выполняет поток
+    QueueListener. Если очередь переполнена, запись отбрасывается.
+    """
+
+    def __init__(self, log_queue, max_length=LOG_MAX_LENGTH):
+        super().__init__(log_queue)
+        self.max_length = max_length
+        self.dropped = 0
+
+    def prepare(self, record):
+        message = record.getMessage()
+        if self.max_length and len(message) > self.max_length:
+            cut = len(message) - self.max_length
+            message = f"{message[: self.max_length]}… [обрезано {cut} символов]"
+        record = copy.copy(record)
+        record.msg = message
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stats(self):
+        return {"queued": self.queue.qsize(), "dropped": self.dropped}
+
+
+_listener = None
+
+
+def setup_logging(level=LOG_LEVEL):
+    """Настраивает логирование всего бота; повторный вызов ничего не делает.
+
+    Все логгеры пишут через AsyncQueueHandler, а в stderr выводит отдельный
+    поток, так что запись в лог не блокирует цикл событий.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    handler = AsyncQueueHandler(log_queue)
+    handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE_EVERY))
+    output = logging.StreamHandler()
+    output.setFormatter(RedactingFormatter(LOG_FORMAT))
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    # Перед выходом процесса дописываем всё, что осталось в очереди
+    atexit.register(_listener.stop)
+    registry.register_stats("logging", handler.stats)
@@ -0,0 +1,11 @@
+# Точка входа: python main.py
+#
+# Процессы пула расчётов (compute.ComputePool) и процессы webhook
+# запускаются через spawn и при старте заново выполняют главный модуль.
+# Поэтому бот импортируется только здесь, под __main__: иначе каждый такой
+# процесс создавал бы свой Bot, открывал хранилища и загружал подписки.
+
+if __name__ == "__main__":
+    from bot import main
+
+    main()
@@ -0,0 +1,206 @@
+import bisect
+import heapq
+from operator import attrgetter
+
+# Числовые поля продажи, из которых считаются ключевые показатели
+METRIC_FIELDS = (
+    "totalPrice",
+    "discountPercent",
+    "spp",
+    "paymentSaleAmount",
+    "forPay",
+    "finishedPrice",
+    "priceWithDisc",
+)
+
+
+class Totals:
+    """Накопленные суммы по продажам, из которых выводятся ключевые показатели.
+
+    Все суммы аддитивны, поэтому итоги частей (страниц ответа, дней,
+    магазинов) можно складывать через ``merge``.
+    """
+
+    __slots__ = (
+        "count",
+        "total_price",
+        "discount",
+        "spp",
+        "payment_sale_amount",
+        "for_pay",
+        "finished_price",
+        "price_with_disc",
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.total_price = 0
+        self.discount = 0
+        self.spp = 0
+        self.payment_sale_amount = 0
+        self.for_pay = 0
+        self.finished_price = 0
+        self.price_with_disc = 0
+
+    def add(self, record):
+        """Добавляет одну продажу (sales_store.SaleRecord)"""
+        price = record.totalPrice
+        self.count += 1
+        self.total_price += price
+        self.discount += price * (record.discountPercent / 100)
+        self.spp += record.spp
+        self.payment_sale_amount += record.paymentSaleAmount
+        self.for_pay += record.forPay
+        self.finished_price += record.finishedPrice
+        self.price_with_disc += record.priceWithDisc
+
+    @classmethod
+    def from_values(cls, values):
+        """Итоги из значений в порядке ``__slots__``"""
+        totals = cls()
+        for name, value in zip(cls.__slots__, values):
+            setattr(totals, name, value)
+        return totals
+
+    def merge(self, other):
+        for name in self.__slots__:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        return self
+
+    def key_metrics(self):
+        return {
+            "total_sales": self.total_price,
+            "total_discount": self.discount,
+            "spp": self.spp,
+            "payment_sale_amount": self.payment_sale_amount,
+            "for_pay": self.for_pay,
+            "finished_price": self.finished_price,
+            "price_with_disc": self.price_with_disc,
+            "avg_sale_price": self.total_price / self.count if self.count else 0,
+        }
+
+
+def aggregate(rows, totals=None):
+    """Считает все суммы за один проход по строкам.
+
+    Суммы держатся в локальных переменных, так что на строку приходится по
+    одному обращению к каждому полю. Если передан ``totals``, строки
+    добавляются к уже накопленным итогам (для потоковой обработки).
+
+    KeyError — если в строке нет обязательного поля.
+    """
+    if totals is None:
+        totals = Totals()
+
+    count = totals.count
+    total_price = totals.total_price
+    discount = totals.discount
+    spp = totals.spp
+    payment_sale_amount = totals.payment_sale_amount
+    for_pay = totals.for_pay
+    finished_price = totals.finished_price
+    price_with_disc = totals.price_with_disc
+
+    for item in rows:
+        price = item["totalPrice"]
+        total_price += price
+        discount += price * (item["discountPercent"] / 100)
+        spp += item["spp"]
+        payment_sale_amount += item["paymentSaleAmount"]
+        for_pay += item["forPay"]
+        finished_price += item["finishedPrice"]
+        price_with_disc += item["priceWithDisc"]
+        count += 1
+
+    totals.count = count
+    totals.total_price = total_price
+    totals.discount = discount
+    totals.spp = spp
+    totals.payment_sale_amount = payment_sale_amount
+    totals.for_pay = for_pay
+    totals.finished_price = finished_price
+    totals.price_with_disc = price_with_disc
+    return totals
+
+
+class DailyRollups:
+    """Префиксные суммы дневных итогов магазина.
+
+    ``days`` — отсортированные даты (YYYY-MM-DD), ``rows`` — итоги этих дней
+    в порядке полей Totals. Итог любого диапазона дат — разность двух
+    префиксных сумм, без обхода отдельных продаж.
+    """
+
+    __slots__ = ("days", "prefix")
+
+    def __init__(self, days, rows):
+        self.days = list(days)
+        running = [0] * len(Totals.__slots__)
+        self.prefix = [tuple(running)]
+        for row in rows:
+            running = [acc + (value or 0) for acc, value in zip(running, row)]
+            self.prefix.append(tuple(running))
+
+    def totals(self, date_from, date_to):
+        start = bisect.bisect_left(self.days, date_from[:10])
+        end = bisect.bisect_right(self.days, date_to[:10])
+        if end <= start:
+            return Totals()
+        upper, lower = self.prefix[end], self.prefix[start]
+        return Totals.from_values(a - b for a, b in zip(upper, lower))
+
+
+def article_key(record):
+    # Артикул продавца, а если его нет — артикул WB
+    return record.supplierArticle or record.nmId
+
+
+# Измерения для разбивки отчёта: имя -> функция получения ключа группы
+GROUP_DIMENSIONS = {
+    "article": article_key,
+    "warehouse": attrgetter("warehouseName"),
+    "region": attrgetter("regionName"),
+}
+
+
+def group_by(records, dimension):
+    """Разбивает продажи (SaleRecord) по измерению за один проход"""
+    key_of = GROUP_DIMENSIONS[dimension]
+    groups = {}
+    for record in records:
+        key = key_of(record)
+        totals = groups.get(key)
+        if totals is None:
+            totals = groups[key] = Totals()
+        totals.add(record)
+    return groups
+
+
+def group_columns(keys, codes, columns):
+    """То же, что group_by, для продаж в виде столбцов.
+
+    ``codes[i]`` — номер ключа группы i-й продажи в ``keys``, ``columns`` —
+    значения METRIC_FIELDS, по столбцу на поле.
+    """
+    sums = [[0] * len(Totals.__slots__) for _ in keys]
+    for code, values in zip(codes, zip(*columns)):
+        price, discount_percent, spp, payment, for_pay, finished, with_disc = values
+        row = sums[code]
+        row[0] += 1
+        row[1] += price
+        row[2] += price * (discount_percent / 100)
+        row[3] += spp
+        row[4] += payment
+        row[5] += for_pay
+        row[6] += finished
+        row[7] += with_disc
+    return {key: Totals.from_values(row) for key, row in zip(keys, sums)}
+
+
+def top_groups(groups, n=10, by="total_price"):
+    """Первые n групп по сумме ``by``; куча размера n, без полной сортировки"""
+
+    def value(pair):
+        return getattr(pair[1], by)
+
+    return heapq.nlargest(n, groups.items(), key=value)
@@ -0,0 +1,76 @@
+import asyncio
+import logging
+
+from errors import WildberriesError
+from wildberries_api import refresh_reports, statistics_limiter
+
+# Периоды, которые предлагаются кнопками и поэтому прогреваются заранее
+STANDARD_PERIODS = ("today", "yesterday", "last_7_days")
+
+
+class ReportPrefetcher:
+    """Фоновое обновление стандартных периодов для всех магазинов.
+
+    Раз в ``interval`` секунд каждый магазин синхронизируется одним запросом
+    к statistics-api, после чего пересчитываются его дневные сводки, по
+    которым строятся отчёты. Лимит запросов ключа в первую очередь отдаётся
+    пользователям: если токена в корзине сейчас нет, магазин пропускается до
+    следующего круга.
+    """
+
+    def __init__(self, registry, interval, periods=STANDARD_PERIODS):
+        self.registry = registry
+        self.interval = interval
+        self.periods = periods
+        self._task = None
+        self.rounds = 0
+        self.refreshed = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh_all()
+            except Exception as e:
+                logging.error("Ошибка фонового обновления отчетов: %s", e)
+            await asyncio.sleep(self.interval)
+
+    async def refresh_all(self):
+        self.rounds += 1
+        for shop_name, api_key in self.registry.items():
+            await self.refresh_shop(shop_name, api_key)
+
+    async def refresh_shop(self, shop_name, api_key):
+        if await statistics_limiter.bucket(api_key).delay() > 0:
+            self.skipped += 1
+            return
+
+        try:
+            # Если пользователь недавно уже синхронизировал магазин — не дублируем
+            await refresh_reports(api_key, self.periods, max_age=self.interval / 2)
+            self.refreshed += 1
+        except WildberriesError as e:
+            self.failed += 1
+            logging.warning("Не удалось обновить отчеты магазина %s: %s", shop_name, e)
+
+    def stats(self):
+        return {
+            "rounds": self.rounds,
+            "refreshed": self.refreshed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+        }
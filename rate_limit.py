@@ -0,0 +1,251 @@
+import asyncio
+import hashlib
+import random
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limit (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    blocked_until REAL NOT NULL
+)
+"""
+
+
+def parse_seconds(value):
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_from_headers(headers):
+    """Сколько секунд ждать по заголовкам Retry-After / X-Ratelimit-Retry"""
+    for name in ("X-Ratelimit-Retry", "Retry-After"):
+        seconds = parse_seconds(headers.get(name))
+        if seconds is not None:
+            return seconds
+    return None
+
+
+class TokenBucket:
+    """Корзина токенов одного API ключа.
+
+    Ожидающие обслуживаются строго по очереди (asyncio.Lock отдаёт
+    блокировку в порядке FIFO), так что запросы разных пользователей одного
+    магазина не обгоняют друг друга.
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate  # токенов в секунду
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        refilled = self.tokens + (now - self.updated) * self.rate
+        self.tokens = min(self.capacity, refilled)
+        self.updated = now
+
+    def _delay(self, now):
+        self._refill(now)
+        blocked = self.blocked_until - now
+        if blocked > 0:
+            return blocked
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def _take(self, now):
+        delay = self._delay(now)
+        if delay <= 0:
+            self.tokens -= 1
+        return delay
+
+    def _block(self, now, seconds):
+        self._refill(now)
+        self.tokens = 0
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+    async def delay(self):
+        """Через сколько секунд освободится токен (без учёта очереди)"""
+        return self._delay(self.clock())
+
+    async def take(self):
+        """Берёт токен, если он есть; иначе — через сколько секунд он появится"""
+        return self._take(self.clock())
+
+    async def acquire(self):
+        """Ждёт токен и возвращает время ожидания в секундах"""
+        started = self.clock()
+        async with self._lock:
+            while True:
+                delay = await self.take()
+                if delay <= 0:
+                    return self.clock() - started
+                await asyncio.sleep(delay)
+
+    async def block(self, seconds):
+        """Запрещает запросы на ``seconds`` секунд (после 429 или исчерпания)"""
+        self._block(self.clock(), seconds)
+
+    async def update_from_headers(self, headers):
+        # X-Ratelimit-Remaining: 0 — лимит исчерпан до X-Ratelimit-Reset
+        remaining = parse_seconds(headers.get("X-Ratelimit-Remaining"))
+        if remaining is not None and remaining < 1:
+            reset = parse_seconds(headers.get("X-Ratelimit-Reset"))
+            if reset:
+                await self.block(reset)
+
+
+class BucketStore:
+    """Состояние корзин токенов в SQLite, общее для всех процессов бота.
+
+    Методы обращаются к базе синхронно и могут ждать чужую транзакцию,
+    поэтому из цикла событий их вызывают через asyncio.to_thread.
+    """
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _load(self, bucket, now):
+        row = self._conn.execute(
+            "SELECT tokens, updated, blocked_until FROM rate_limit WHERE key = ?",
+            (bucket.key,),
+        ).fetchone()
+        if row is None:
+            row = (bucket.capacity, now, 0.0)
+        bucket.tokens, bucket.updated, bucket.blocked_until = row
+
+    def read(self, bucket, compute):
+        """Загружает состояние корзины и возвращает ``compute(now)``, ничего
+        не записывая"""
+        with self._lock:
+            now = bucket.clock()
+            self._load(bucket, now)
+        return compute(now)
+
+    def update(self, bucket, change, *args):
+        """Загружает состояние корзины, вызывает ``change(now, *args)`` и
+        сохраняет результат — всё в одной транзакции"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = bucket.clock()
+                self._load(bucket, now)
+                result = change(now, *args)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_limit "
+                    "(key, tokens, updated, blocked_until) VALUES (?, ?, ?, ?)",
+                    (bucket.key, bucket.tokens, bucket.updated, bucket.blocked_until),
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return result
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM rate_limit WHERE key = ?", (key,))
+
+
+class SharedTokenBucket(TokenBucket):
+    """Корзина токенов, общая для всех процессов бота (режим webhook).
+
+    Состояние читается и записывается в BucketStore при каждой операции,
+    так что N процессов расходуют один лимит API ключа, а не N. Внутри
+    процесса ожидающие по-прежнему обслуживаются по очереди.
+    """
+
+    def __init__(self, store, key, rate, capacity):
+        # Время общее для процессов, поэтому часы — time.time
+        super().__init__(rate, capacity, clock=time.time)
+        self.store = store
+        self.key = key
+
+    async def delay(self):
+        return await asyncio.to_thread(self.store.read, self, self._delay)
+
+    async def take(self):
+        return await asyncio.to_thread(self.store.update, self, self._take)
+
+    async def block(self, seconds):
+        await asyncio.to_thread(self.store.update, self, self._block, seconds)
+
+
+class RateLimiter:
+    """Корзины токенов по API ключам для одной группы методов API.
+
+    С ``store`` (BucketStore) корзины общие для всех процессов; ``name``
+    отделяет группу методов в общем хранилище.
+    """
+
+    def __init__(self, rate, capacity, jitter=1.0, store=None, name=""):
+        self.rate = rate
+        self.capacity = capacity
+        self.jitter = jitter
+        self.store = store
+        self.name = name
+        self._buckets = {}
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.throttled = 0
+
+    def _store_key(self, api_key):
+        # Сам API ключ в хранилище не пишем
+        return f"{self.name}:{hashlib.sha256(api_key.encode()).hexdigest()[:16]}"
+
+    def bucket(self, api_key):
+        bucket = self._buckets.get(api_key)
+        if bucket is None:
+            if self.store is None:
+                bucket = TokenBucket(self.rate, self.capacity)
+            else:
+                bucket = SharedTokenBucket(
+                    self.store, self._store_key(api_key), self.rate, self.capacity
+                )
+            self._buckets[api_key] = bucket
+        return bucket
+
+    async def acquire(self, api_key):
+        waited = await self.bucket(api_key).acquire()
+        # Ожидание меньше миллисекунды — это просто переключение задач
+        if waited > 0.001:
+            self.waits += 1
+            self.wait_seconds += waited
+        return waited
+
+    def budget(self, seconds):
+        """Сколько запросов на один ключ укладывается в ``seconds`` секунд"""
+        return int(self.capacity + self.rate * seconds)
+
+    async def throttle(self, api_key, retry_after):
+        """Ответ 429: блокируем ключ на retry_after плюс случайный джиттер"""
+        self.throttled += 1
+        delay = retry_after if retry_after is not None else 1 / self.rate
+        await self.bucket(api_key).block(delay + random.uniform(0, self.jitter))
+
+    async def forget(self, api_key):
+        self._buckets.pop(api_key, None)
+        if self.store is not None:
+            await asyncio.to_thread(self.store.delete, self._store_key(api_key))
+
+    def stats(self):
+        return {
+            "buckets": len(self._buckets),
+            "waits": self.waits,
+            "wait_seconds": self.wait_seconds,
+            "throttled": self.throttled,
+        }
@@ -0,0 +1,106 @@
+import sys
+import time
+from collections import OrderedDict
+
+
+# Размер длинного списка оценивается по стольким равномерно взятым элементам
+SIZE_SAMPLE = 32
+
+
+def estimate_size(value):
+    """Приблизительный размер отчёта в памяти (в байтах).
+
+    Строки отчёта однотипны, поэтому у длинного списка измеряются только
+    SIZE_SAMPLE элементов: оценка не зависит от числа строк по времени.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += sys.getsizeof(key) + sys.getsizeof(item)
+    elif isinstance(value, (list, tuple)):
+        if len(value) <= SIZE_SAMPLE:
+            size += sum(estimate_size(item) for item in value)
+        else:
+            step = len(value) / SIZE_SAMPLE
+            sample = sum(
+                estimate_size(value[int(index * step)]) for index in range(SIZE_SAMPLE)
+            )
+            size += sample * len(value) // SIZE_SAMPLE
+    elif hasattr(type(value), "__slots__"):
+        for name in type(value).__slots__:
+            size += sys.getsizeof(getattr(value, name))
+    return size
+
+
+class ReportCache:
+    """LRU-кэш отчётов с ограничением по памяти и временем жизни записей.
+
+    Ключ записи — кортеж, первым элементом которого идёт API ключ магазина,
+    чтобы при удалении магазина можно было сбросить все его отчёты.
+    """
+
+    def __init__(self, max_bytes, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, _, value = entry
+        if expires_at <= self.clock():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value, ttl):
+        size = estimate_size(value)
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            # Отчёт больше всего кэша — не вытесняем ради него остальные
+            return
+
+        self._entries[key] = (self.clock() + ttl, size, value)
+        self.size += size
+        while self.size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate_api_key(self, api_key):
+        for key in [key for key in self._entries if key[0] == api_key]:
+            self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.size -= size
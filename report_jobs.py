@@ -0,0 +1,187 @@
+import asyncio
+import functools
+import logging
+
+from aiogram.exceptions import TelegramBadRequest
+from decouple import config
+
+from errors import WildberriesError
+from wildberries_api import SyncProgress
+
+# Сколько отчётов строится одновременно; остальные ждут своей очереди
+REPORT_JOB_WORKERS = config("REPORT_JOB_WORKERS", default=4, cast=int)
+# Предельное время построения одного отчёта, секунды
+REPORT_JOB_TIMEOUT = config("REPORT_JOB_TIMEOUT", default=120, cast=float)
+# Как часто обновлять сообщение о ходе построения, секунды
+REPORT_PROGRESS_INTERVAL = config("REPORT_PROGRESS_INTERVAL", default=2, cast=float)
+
+NO_DATA_TEXT = "К сожалению, за выбранный период данных нет."
+
+
+class ReportJobs:
+    """Очередь построения отчётов с сообщением о ходе работы.
+
+    Одновременно строится не больше ``workers`` отчётов. У пользователя
+    может быть только одна задача: повтор того же запроса присоединяется к
+    идущей, а новый запрос отменяет прежнюю вместе с её загрузкой. Пока
+    отчёт строится, бот обновляет сообщение о прогрессе, а затем заменяет
+    его готовым отчётом. Задача дольше ``timeout`` секунд прерывается.
+    """
+
+    def __init__(
+        self,
+        bot,
+        workers=REPORT_JOB_WORKERS,
+        timeout=REPORT_JOB_TIMEOUT,
+        progress_interval=REPORT_PROGRESS_INTERVAL,
+    ):
+        self.bot = bot
+        self.timeout = timeout
+        self.progress_interval = progress_interval
+        self._slots = asyncio.Semaphore(workers)
+        # пользователь -> (ключ запроса, задача)
+        self._jobs = {}
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.timed_out = 0
+        self.failed = 0
+        self.deduplicated = 0
+
+    async def submit(self, user_id, chat_id, key, build):
+        """Ставит отчёт пользователя в очередь и возвращает задачу.
+
+        ``build(progress)`` — корутина, получающая SyncProgress и
+        возвращающая (текст в Markdown, клавиатура) или None, если данных
+        нет. По ``key`` узнаётся повтор того же запроса.
+        """
+        current = self._jobs.get(user_id)
+        if current is not None and not current[1].done():
+            if current[0] == key:
+                self.deduplicated += 1
+                return current[1]
+            current[1].cancel()
+
+        # Задача запоминается до первого await: следующее нажатие того же
+        # пользователя уже увидит её и отменит или присоединится
+        task = asyncio.create_task(self._run(chat_id, build))
+        self._jobs[user_id] = (key, task)
+        task.add_done_callback(functools.partial(self._forget, user_id))
+        return task
+
+    def _forget(self, user_id, task):
+        if task.cancelled():
+            self.cancelled += 1
+        current = self._jobs.get(user_id)
+        if current is not None and current[1] is task:
+            del self._jobs[user_id]
+
+    async def _run(self, chat_id, build):
+        try:
+            message = await self.bot.send_message(chat_id, "⏳ Отчёт в очереди…")
+        except Exception as e:
+            self.failed += 1
+            logging.error("Не удалось отправить сообщение об отчёте: %s", e)
+            return
+
+        progress = SyncProgress()
+        try:
+            self.waiting += 1
+            try:
+                await self._slots.acquire()
+            finally:
+                self.waiting -= 1
+
+            self.running += 1
+            reporter = asyncio.create_task(self._show_progress(message, progress))
+            try:
+                result = await asyncio.wait_for(build(progress), self.timeout)
+            finally:
+                reporter.cancel()
+                self.running -= 1
+                self._slots.release()
+
+        except asyncio.CancelledError:
+            await self._edit(message, "Построение отчёта отменено.")
+            raise
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            logging.error(
+                "Отчёт не построен за %s с: %s", self.timeout, progress.describe()
+            )
+            await self._edit(
+                message,
+                f"Отчёт не успел сформироваться за {self.timeout:.0f} с. "
+                "Попробуйте позже или выберите период короче.",
+            )
+            return
+        except WildberriesError as e:
+            self.failed += 1
+            logging.error("Ошибка API при построении отчёта: %s", e)
+            await self._edit(message, str(e))
+            return
+        except Exception as e:
+            self.failed += 1
+            logging.error("Ошибка при построении отчёта: %s", e)
+            await self._edit(message, f"Ошибка при получении отчета: {e}")
+            return
+
+        self.completed += 1
+        if result is None:
+            await self._edit(message, NO_DATA_TEXT)
+            return
+        text, keyboard = result
+        if not await self._edit(
+            message, text, parse_mode="Markdown", reply_markup=keyboard
+        ):
+            # Отчёт не должен потеряться из-за неудачной правки сообщения
+            try:
+                await self.bot.send_message(
+                    message.chat.id, text, parse_mode="Markdown", reply_markup=keyboard
+                )
+            except Exception as e:
+                logging.error("Не удалось отправить отчёт: %s", e)
+
+    async def _show_progress(self, message, progress):
+        await self._edit(message, "⏳ Формирую отчёт…")
+        shown = None
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            if not (progress.rows or progress.days_total):
+                continue
+            text = progress.describe()
+            if text != shown:
+                shown = text
+                await self._edit(message, f"⏳ Формирую отчёт: {text}")
+
+    async def _edit(self, message, text, **kwargs):
+        """Меняет текст сообщения; False, если это не удалось"""
+        try:
+            await self.bot.edit_message_text(
+                text, chat_id=message.chat.id, message_id=message.message_id, **kwargs
+            )
+            return True
+        except TelegramBadRequest as e:
+            # Текст не изменился или сообщение уже удалено
+            logging.warning("Не удалось обновить сообщение отчёта: %s", e)
+        except Exception as e:
+            logging.error("Ошибка при обновлении сообщения отчёта: %s", e)
+        return False
+
+    def stats(self):
+        return {
+            "waiting": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "timed_out": self.timed_out,
+            "failed": self.failed,
+            "deduplicated": self.deduplicated,
+        }
+
+    async def stop(self):
+        tasks = [task for _, task in self._jobs.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
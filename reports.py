@@ -0,0 +1,117 @@
+import datetime
+
+from instrumentation import STAGE_SECONDS
+from wildberries_api import get_sales_comparison, get_sales_totals, last_synced
+
+
+# Utility function to format the report
+def format_report(key_metrics, updated_at=None, previous=None):
+    """Текст отчёта; с ``previous`` (показатели прошлого периода) у каждой
+    цифры выводится изменение"""
+
+    def format_number(value):
+        return round(value, 2) if isinstance(value, (int, float)) else value
+
+    def value(key):
+        text = str(format_number(key_metrics.get(key, "N/A")))
+        if previous is not None:
+            text += format_change(key_metrics.get(key), previous.get(key))
+        return text
+
+    with STAGE_SECONDS.time("format"):
+        report = (
+            "*📊 Отчёт о продажах:*\n\n"
+            f"• *Общая сумма продаж:* {value('total_sales')}\n"
+            f"• *Процент скидки:* {value('total_discount')}\n\n"
+            f"• *SPP:* {value('spp')}\n"
+            f"• *Сумма оплаты:* {value('payment_sale_amount')}\n"
+            f"• *Сумма для оплаты:* {value('for_pay')}\n\n"
+            f"• *Финальная цена:* {value('finished_price')}\n"
+            f"• *Цена со скидкой:* {value('price_with_disc')}\n"
+        )
+        if previous is not None:
+            report += f"• *Средняя цена продажи:* {value('avg_sale_price')}\n"
+    if updated_at is not None:
+        report += "\n" + format_freshness(updated_at)
+    return report
+
+
+def format_change(current, previous):
+    # Изменение относительно прошлого периода: абсолютное и в процентах
+    if not isinstance(current, (int, float)) or not isinstance(previous, (int, float)):
+        return ""
+    delta = current - previous
+    if not previous:
+        return f" ({delta:+.2f})"
+    return f" ({delta:+.2f}, {delta / abs(previous) * 100:+.1f}%)"
+
+
+def format_freshness(updated_at):
+    # Отчёт может строиться из заранее загруженных данных — показываем их возраст
+    minutes = int((datetime.datetime.now() - updated_at).total_seconds() // 60)
+    age = "только что" if minutes < 1 else f"{minutes} мин назад"
+    return f"_Данные обновлены в {updated_at:%H:%M} ({age})_\n"
+
+
+def escape_markdown(text):
+    # Экранирование для parse_mode="Markdown" (legacy)
+    for char in ("_", "*", "`", "["):
+        text = text.replace(char, "\\" + char)
+    return text
+
+
+def format_all_shops_report(per_shop, overall, updated_at=None):
+    lines = []
+    for name, totals in per_shop.items():
+        if isinstance(totals, Exception):
+            value = f"ошибка: {escape_markdown(str(totals))}"
+        else:
+            value = (
+                f"{round(totals.total_price, 2)} "
+                f"({totals.count} шт., к оплате {round(totals.for_pay, 2)})"
+            )
+        lines.append(f"• {escape_markdown(name)}: {value}")
+
+    report = format_report(overall.key_metrics())
+    report = (
+        report.replace("Отчёт о продажах", "Отчёт по всем магазинам", 1)
+        + "\n*По магазинам:*\n"
+        + "\n".join(lines)
+        + "\n"
+    )
+    if updated_at is not None:
+        report += "\n" + format_freshness(updated_at)
+    return report
+
+
+async def build_shop_report(
+    api_key, period, date_start=None, date_end=None, progress=None
+):
+    """Готовый текст отчёта по магазину (Markdown) или None, если данных нет"""
+    totals = await get_sales_totals(api_key, period, date_start, date_end, progress)
+    if totals is None:
+        return None
+    return format_report(totals.key_metrics(), await last_synced(api_key))
+
+
+async def build_comparison_report(
+    api_key, period, date_start=None, date_end=None, progress=None
+):
+    """Отчёт за период с изменениями относительно такого же периода перед ним"""
+    comparison = await get_sales_comparison(
+        api_key, period, date_start, date_end, progress
+    )
+    if comparison is None:
+        return None
+    (date_from, date_to), current, previous = comparison
+    if not current.count and not previous.count:
+        return None
+
+    report = format_report(
+        current.key_metrics(), await last_synced(api_key), previous.key_metrics()
+    )
+    return report.replace(
+        "Отчёт о продажах:*",
+        f"Сравнение с прошлым периодом:*\n_{date_from} — {date_to}_",
+        1,
+    )
@@ -0,0 +1,329 @@
+import asyncio
+import contextlib
+import hashlib
+import sqlite3
+import threading
+import time
+
+from utils import file_lock
+
+# Поля продажи, которые хранятся локально
+SALE_FIELDS = (
+    "srid",
+    "saleID",
+    "date",
+    "lastChangeDate",
+    "nmId",
+    "supplierArticle",
+    "warehouseName",
+    "regionName",
+    "totalPrice",
+    "discountPercent",
+    "spp",
+    "paymentSaleAmount",
+    "forPay",
+    "finishedPrice",
+    "priceWithDisc",
+)
+
+# Поля, которые нужны боту после загрузки (saleID и lastChangeDate служат
+# только синхронизации); порядок совпадает с аргументами SaleRecord
+RECORD_FIELDS = (
+    "srid",
+    "date",
+    "nmId",
+    "supplierArticle",
+    "warehouseName",
+    "regionName",
+    "totalPrice",
+    "discountPercent",
+    "spp",
+    "paymentSaleAmount",
+    "forPay",
+    "finishedPrice",
+    "priceWithDisc",
+)
+
+_COLUMNS = ", ".join(SALE_FIELDS)
+_PLACEHOLDERS = ", ".join("?" for _ in SALE_FIELDS)
+
+# Дневные итоги магазина; порядок полей совпадает с metrics.Totals
+DAILY_FIELDS = (
+    "count",
+    "total_price",
+    "discount",
+    "spp",
+    "payment_sale_amount",
+    "for_pay",
+    "finished_price",
+    "price_with_disc",
+)
+
+_DAILY_SELECT = """
+SELECT shop, substr(date, 1, 10), count(*), total(totalPrice),
+    total(totalPrice * (discountPercent / 100.0)), sum(spp),
+    sum(paymentSaleAmount), total(forPay), total(finishedPrice),
+    total(priceWithDisc)
+FROM sales
+"""
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS sales (
+    shop TEXT NOT NULL,
+    {", ".join(SALE_FIELDS)},
+    PRIMARY KEY (shop, srid)
+);
+CREATE INDEX IF NOT EXISTS sales_shop_date ON sales (shop, date);
+CREATE TABLE IF NOT EXISTS daily (
+    shop TEXT NOT NULL,
+    day TEXT NOT NULL,
+    {", ".join(DAILY_FIELDS)},
+    PRIMARY KEY (shop, day)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    shop TEXT PRIMARY KEY,
+    synced_from TEXT NOT NULL,
+    cursor TEXT,
+    synced_at REAL NOT NULL
+);
+"""
+
+
+def shop_id(api_key):
+    """Идентификатор магазина в хранилище, чтобы не хранить сам API ключ"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def sale_key(row):
+    # Строки дедуплицируются по srid, для старых записей — по saleID
+    return row.get("srid") or row.get("saleID")
+
+
+class SyncState:
+    __slots__ = ("synced_from", "cursor", "synced_at")
+
+    def __init__(self, synced_from, cursor, synced_at):
+        self.synced_from = synced_from  # самая ранняя дата, загруженная целиком
+        self.cursor = cursor  # максимальный lastChangeDate среди строк
+        self.synced_at = synced_at  # время последней синхронизации (unix)
+
+    def covers(self, date_from):
+        return self.synced_from <= date_from
+
+
+class SaleRecord:
+    """Продажа в компактном виде: только нужные боту поля, без словаря"""
+
+    __slots__ = RECORD_FIELDS
+
+    def __init__(
+        self,
+        srid,
+        date,
+        nmId,
+        supplierArticle,
+        warehouseName,
+        regionName,
+        totalPrice,
+        discountPercent,
+        spp,
+        paymentSaleAmount,
+        forPay,
+        finishedPrice,
+        priceWithDisc,
+    ):
+        self.srid = srid
+        self.date = date
+        self.nmId = nmId
+        self.supplierArticle = supplierArticle
+        self.warehouseName = warehouseName
+        self.regionName = regionName
+        self.totalPrice = totalPrice
+        self.discountPercent = discountPercent
+        self.spp = spp
+        self.paymentSaleAmount = paymentSaleAmount
+        self.forPay = forPay
+        self.finishedPrice = finishedPrice
+        self.priceWithDisc = priceWithDisc
+
+    def __repr__(self):
+        return f"SaleRecord(srid={self.srid!r}, date={self.date!r})"
+
+
+class SalesStore:
+    """Локальное SQLite-хранилище продаж с точкой синхронизации по магазину.
+
+    Все методы с префиксом ``a`` выполняют запросы в отдельном потоке, чтобы не
+    блокировать цикл событий.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._db_lock = threading.Lock()
+        # магазин -> [asyncio.Lock, сколько задач держат или ждут его]
+        self._sync_locks = {}
+        self._build_daily()
+
+    def _build_daily(self):
+        # Хранилище, созданное до появления дневных итогов, досчитываем разом
+        with self._conn:
+            if self._conn.execute("SELECT 1 FROM daily LIMIT 1").fetchone():
+                return
+            self._conn.execute(
+                f"INSERT INTO daily {_DAILY_SELECT} "
+                "GROUP BY shop, substr(date, 1, 10)"
+            )
+
+    @contextlib.asynccontextmanager
+    async def sync_lock(self, api_key):
+        """Не даёт двум синхронизациям одного магазина идти одновременно —
+        ни в этом процессе, ни в других процессах бота с тем же хранилищем"""
+        shop = shop_id(api_key)
+        entry = self._sync_locks.get(shop)
+        if entry is None:
+            entry = self._sync_locks[shop] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0], file_lock(f"{self.path}.sync-{shop}"):
+                yield
+        finally:
+            # Блокировку забываем, только когда она никому не нужна: иначе
+            # следующая синхронизация создала бы вторую и пошла параллельно
+            entry[1] -= 1
+            if not entry[1]:
+                del self._sync_locks[shop]
+
+    def get_state(self, api_key):
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT synced_from, cursor, synced_at FROM sync_state WHERE shop = ?",
+                (shop_id(api_key),),
+            ).fetchone()
+        return SyncState(*row) if row else None
+
+    def upsert(self, api_key, rows):
+        """Сохраняет строки (новые и изменённые) и возвращает max lastChangeDate"""
+        shop = shop_id(api_key)
+        cursor = None
+        values = []
+        for row in rows:
+            key = sale_key(row)
+            if not key:
+                continue
+            changed = row.get("lastChangeDate")
+            if changed and (cursor is None or changed > cursor):
+                cursor = changed
+            values.append((shop, key) + tuple(row.get(f) for f in SALE_FIELDS[1:]))
+
+        # Дата продажи у srid не меняется, поэтому пересчитать нужно только
+        # дни пришедших строк
+        days = {(shop, value[3][:10]) for value in values if value[3]}
+        with self._db_lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO sales (shop, {_COLUMNS}) "
+                f"VALUES (?, {_PLACEHOLDERS})",
+                values,
+            )
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO daily {_DAILY_SELECT} "
+                "WHERE shop = ?1 AND date >= ?2 AND date < ?2 || 'T99'",
+                days,
+            )
+        return cursor
+
+    def set_state(self, api_key, synced_from, cursor):
+        with self._db_lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (shop, synced_from, cursor, synced_at) "
+                "VALUES (?, ?, ?, ?)",
+                (shop_id(api_key), synced_from, cursor, time.time()),
+            )
+
+    def window(self, api_key, date_from, date_to):
+        """Продажи магазина (SaleRecord) с датой в диапазоне [date_from, date_to]"""
+        with self._db_lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(RECORD_FIELDS)} FROM sales "
+                "WHERE shop = ? AND date >= ? AND substr(date, 1, 10) <= ? "
+                "ORDER BY date",
+                (shop_id(api_key), date_from, date_to),
+            ).fetchall()
+
+        # Артикулы, склады и регионы повторяются — храним по одной копии строки
+        share = {}.setdefault
+        return [
+            SaleRecord(
+                srid,
+                date,
+                nm_id,
+                share(article, article),
+                share(warehouse, warehouse),
+                share(region, region),
+                *metrics,
+            )
+            for srid, date, nm_id, article, warehouse, region, *metrics in rows
+        ]
+
+    def iter_sales(self, api_key, date_from, date_to, batch_size=5000):
+        """Все сохранённые поля продаж за период: пачки кортежей по SALE_FIELDS.
+
+        Чтение идёт через отдельное соединение (WAL позволяет читать
+        параллельно с записью), так что долгая выгрузка не держит общую
+        блокировку хранилища, а в памяти находится одна пачка.
+        """
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute(
+                f"SELECT {_COLUMNS} FROM sales "
+                "WHERE shop = ? AND date >= ? AND substr(date, 1, 10) <= ? "
+                "ORDER BY date",
+                (shop_id(api_key), date_from, date_to),
+            )
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    return
+                yield batch
+        finally:
+            conn.close()
+
+    def daily(self, api_key):
+        """Дневные итоги магазина: [(день, count, total_price, ...)] по дням"""
+        with self._db_lock:
+            return self._conn.execute(
+                f"SELECT day, {', '.join(DAILY_FIELDS)} FROM daily "
+                "WHERE shop = ? ORDER BY day",
+                (shop_id(api_key),),
+            ).fetchall()
+
+    def purge(self, api_key):
+        shop = shop_id(api_key)
+        with self._db_lock, self._conn:
+            self._conn.execute("DELETE FROM sales WHERE shop = ?", (shop,))
+            self._conn.execute("DELETE FROM daily WHERE shop = ?", (shop,))
+            self._conn.execute("DELETE FROM sync_state WHERE shop = ?", (shop,))
+
+    def close(self):
+        with self._db_lock:
+            self._conn.close()
+
+    async def aget_state(self, api_key):
+        return await asyncio.to_thread(self.get_state, api_key)
+
+    async def aupsert(self, api_key, rows):
+        return await asyncio.to_thread(self.upsert, api_key, rows)
+
+    async def aset_state(self, api_key, synced_from, cursor):
+        await asyncio.to_thread(self.set_state, api_key, synced_from, cursor)
+
+    async def awindow(self, api_key, date_from, date_to):
+        return await asyncio.to_thread(self.window, api_key, date_from, date_to)
+
+    async def adaily(self, api_key):
+        return await asyncio.to_thread(self.daily, api_key)
+
+    async def apurge(self, api_key):
+        await asyncio.to_thread(self.purge, api_key)
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+from rate_limit import TokenBucket
+
+
+class SendQueue:
+    """Очередь исходящих сообщений с учётом флуд-лимитов Telegram.
+
+    Общий темп ограничен ``rate`` сообщениями в секунду на бота, а в один
+    чат — не чаще ``per_chat_rate`` сообщений в секунду. На TelegramRetryAfter
+    отправка приостанавливается для всех чатов на указанное время, после чего
+    сообщение отправляется повторно.
+    """
+
+    def __init__(self, bot, rate=25, per_chat_rate=1, workers=8, max_attempts=5):
+        self.bot = bot
+        self.per_chat_rate = per_chat_rate
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self._bucket = TokenBucket(rate, rate)
+        self._chat_buckets = {}
+        self._queue = asyncio.Queue()
+        self._tasks = []
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._worker()) for _ in range(self.workers)
+            ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, chat_id, text, **kwargs):
+        """Ставит сообщение в очередь; возвращает future с результатом отправки"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((chat_id, text, kwargs, future))
+        return future
+
+    async def join(self):
+        """Ждёт, пока очередь опустеет"""
+        await self._queue.join()
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.per_chat_rate, 1)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def _worker(self):
+        while True:
+            chat_id, text, kwargs, future = await self._queue.get()
+            try:
+                result = await self._deliver(chat_id, text, kwargs)
+                if not future.done():
+                    future.set_result(result)
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                logging.error("Не удалось отправить сообщение в чат %s: %s", chat_id, e)
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, chat_id, text, kwargs):
+        attempt = 1
+        while True:
+            await self._chat_bucket(chat_id).acquire()
+            await self._bucket.acquire()
+            try:
+                return await self.bot.send_message(chat_id, text, **kwargs)
+            except TelegramRetryAfter as e:
+                # Флуд-лимит действует на бота целиком — притормаживаем всех
+                await self._bucket.block(e.retry_after)
+                logging.warning("Флуд-лимит Telegram, пауза %s с", e.retry_after)
+            except (TelegramNetworkError, TelegramServerError) as e:
+                logging.warning("Ошибка отправки в чат %s: %s", chat_id, e)
+            except TelegramAPIError:
+                # Бот заблокирован, чат не найден и т.п. — повтор не поможет
+                raise
+
+            if attempt >= self.max_attempts:
+                raise RuntimeError(f"Сообщение не отправлено за {attempt} попыток")
+            attempt += 1
+            self.retries += 1
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retries": self.retries,
+        }
@@ -0,0 +1,37 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+# Модули бота открывают хранилища при импорте — в тестах это временные файлы
+_tmp = tempfile.mkdtemp(prefix="wb-tests-")
+os.environ.setdefault("SALES_STORE_FILE", os.path.join(_tmp, "sales.db"))
+os.environ.setdefault("RATE_LIMIT_STORE_FILE", os.path.join(_tmp, "rate_limit.db"))
+
+
+@pytest.fixture
+def wb_stand(monkeypatch):
+    """Запуск сценария против локального стенда API Wildberries.
+
+    ``wb_stand(fake, scenario)`` поднимает стенд FakeWildberries в новом
+    цикле событий, направляет на него запросы бота, выполняет
+    ``await scenario(url)`` и возвращает его результат.
+    """
+    import wb_client
+    import wildberries_api
+    from benchmarks.fake_wb import serve
+
+    def run(fake, scenario):
+        async def main():
+            async with serve(fake) as url:
+                monkeypatch.setattr(wildberries_api, "STATISTICS_API_URL", url)
+                monkeypatch.setattr(wildberries_api, "COMMON_API_URL", url)
+                try:
+                    return await scenario(url)
+                finally:
+                    await wb_client.close_session()
+
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,108 @@
+import asyncio
+import pickle
+import random
+import time
+
+import pytest
+
+from compute import ComputePool, pack_records, top_packed, top_records
+from sales_store import SaleRecord
+
+ROWS = 1_000_000
+TICK = 0.001
+# Наибольшая задержка «другого чата», пока считается большой отчёт; расчёт
+# прямо в цикле событий задерживает его примерно на 200 мс
+MAX_LAG = 0.05
+
+
+@pytest.fixture(scope="module")
+def records():
+    rnd = random.Random(0)
+    warehouses = [f"Склад {index}" for index in range(20)]
+    regions = [f"Регион {index}" for index in range(80)]
+    unique = [
+        SaleRecord(
+            f"srid-{index}",
+            "2024-01-01T10:00:00",
+            10_000_000 + index % 5000,
+            f"ART-{index % 5000:04d}",
+            rnd.choice(warehouses),
+            rnd.choice(regions),
+            round(rnd.uniform(300, 6000), 2),
+            rnd.randint(0, 70),
+            rnd.randint(0, 30),
+            0,
+            round(rnd.uniform(100, 4000), 2),
+            round(rnd.uniform(200, 5000), 2),
+            round(rnd.uniform(200, 5000), 2),
+        )
+        for index in range(ROWS // 4)
+    ]
+    # Повторы одних и тех же продаж: расчёт тот же, а строить быстрее
+    return unique * 4
+
+
+def summary(top):
+    return [(name, totals.count, round(totals.total_price, 2)) for name, totals in top]
+
+
+async def measure_lag(stopped, lags):
+    # Каждое пробуждение позже положенного — задержка для других апдейтов
+    while not stopped.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - started - TICK)
+
+
+async def top_with_lag(pool, records, dimension):
+    # Прогрев: пул процессов запускается при первом расчёте
+    await pool.top_groups(records[: pool.inline_rows], dimension)
+
+    lags = []
+    stopped = asyncio.Event()
+    ticker = asyncio.create_task(measure_lag(stopped, lags))
+    await asyncio.sleep(0.05)
+    lags.clear()
+    try:
+        top = await pool.top_groups(records, dimension)
+    finally:
+        stopped.set()
+        await ticker
+        await pool.close()
+    return top, lags
+
+
+@pytest.mark.parametrize("kind", ["process", "thread"])
+def test_other_handlers_keep_low_latency(kind, records):
+    pool = ComputePool(kind, workers=2, inline_rows=1000)
+    top, lags = asyncio.run(top_with_lag(pool, records, "article"))
+
+    assert summary(top) == summary(top_records(records, "article", 10, "total_price"))
+    # Прогрев и сам отчёт
+    assert pool.stats()["offloaded"] == 2
+    assert len(lags) > 10
+    assert max(lags) < MAX_LAG, f"{max(lags) * 1000:.1f} мс"
+
+
+def test_small_reports_stay_inline(records):
+    pool = ComputePool("process", inline_rows=1000)
+    top = asyncio.run(pool.top_groups(records[:500], "warehouse"))
+
+    expected = top_records(records[:500], "warehouse", 10, "total_price")
+    assert summary(top) == summary(expected)
+    assert pool.stats() == {"inline": 1, "offloaded": 0, "running": 0}
+    # Пул процессов даже не запускался
+    assert pool._executor is None
+
+
+@pytest.mark.parametrize("dimension", ["article", "warehouse", "region"])
+def test_packed_columns_give_the_same_top(dimension, records):
+    sample = records[:20_000]
+    packed = top_packed(pack_records(sample, dimension), 10, "total_price")
+    assert summary(packed) == summary(top_records(sample, dimension, 10, "total_price"))
+
+
+def test_packed_payload_is_compact(records):
+    sample = records[: ROWS // 4]
+    packed = len(pickle.dumps(pack_records(sample, "article")))
+    assert packed < len(pickle.dumps(sample)) * 0.6
@@ -0,0 +1,112 @@
+import asyncio
+import csv
+import datetime
+import tempfile
+import threading
+import time
+
+import pytest
+
+import export
+import wildberries_api
+from benchmarks.fake_wb import FakeWildberries
+from benchmarks.generator import generate_sales
+from export import ExportTooLargeError, export_sales
+from sales_store import SALE_FIELDS
+
+TODAY = datetime.date.today()
+FIRST = TODAY - datetime.timedelta(days=6)
+WINDOW = ("custom", FIRST.isoformat(), TODAY.isoformat())
+
+
+@pytest.fixture(autouse=True)
+def export_dir(tmp_path, monkeypatch):
+    """Временные файлы выгрузки создаются в отдельном каталоге теста"""
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    return tmp_path
+
+
+def test_csv_has_header_and_rows(wb_stand):
+    rows = generate_sales(300, FIRST, TODAY)
+    fake = FakeWildberries(rows)
+
+    async def scenario(url):
+        async with export_sales("export-shop", "csv", *WINDOW) as result:
+            path, filename, count = result
+            with open(path, encoding="utf-8-sig", newline="") as file:
+                lines = list(csv.reader(file, delimiter=";"))
+        return filename, count, lines
+
+    filename, count, lines = wb_stand(fake, scenario)
+
+    assert filename == f"sales_{FIRST}_{TODAY}.csv"
+    assert count == 300
+    assert lines[0] == list(SALE_FIELDS)
+    assert len(lines) == 301
+    assert {line[0] for line in lines[1:]} == {row["srid"] for row in rows}
+
+
+def test_empty_window_gives_none(wb_stand, export_dir):
+    async def scenario(url):
+        async with export_sales("empty-export-shop", "csv", *WINDOW) as result:
+            return result
+
+    assert wb_stand(FakeWildberries([]), scenario) is None
+    assert not list(export_dir.iterdir())
+
+
+def test_file_over_telegram_limit(wb_stand, export_dir, monkeypatch):
+    monkeypatch.setattr(export, "TELEGRAM_FILE_LIMIT", 1000)
+    fake = FakeWildberries(generate_sales(100, FIRST, TODAY))
+
+    async def scenario(url):
+        async with export_sales("big-export-shop", "csv", *WINDOW):
+            pass
+
+    with pytest.raises(ExportTooLargeError) as error:
+        wb_stand(fake, scenario)
+    assert error.value.size > 1000
+    assert not list(export_dir.iterdir())
+
+
+def test_cancel_stops_writer_and_removes_file(export_dir, monkeypatch):
+    consumed = []
+    done = threading.Event()
+
+    async def no_sync(*args):
+        pass
+
+    def endless_batches(*args):
+        # Хранилище с бесконечной выгрузкой: каждая пачка читается медленно
+        try:
+            row = tuple("x" for _ in SALE_FIELDS)
+            while True:
+                time.sleep(0.01)
+                consumed.append(1)
+                yield [row]
+        finally:
+            done.set()
+
+    monkeypatch.setattr(export, "sync_window", no_sync)
+    monkeypatch.setattr(wildberries_api.sales_store, "iter_sales", endless_batches)
+
+    async def run():
+        async def write():
+            async with export_sales("cancel-export-shop", "csv", *WINDOW):
+                pass
+
+        task = asyncio.ensure_future(write())
+        await asyncio.sleep(0.2)
+        assert list(export_dir.iterdir())
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+
+    # Поток дописал текущую пачку, закрыл чтение и удалил файл
+    assert done.wait(1)
+    stopped_at = len(consumed)
+    time.sleep(0.1)
+    assert len(consumed) == stopped_at
+    assert not list(export_dir.iterdir())
@@ -0,0 +1,145 @@
+import asyncio
+import types
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+import fsm_storage
+from fsm_storage import SQLiteStorage, create_storage, redis_storage
+
+KEY = StorageKey(bot_id=1, chat_id=10, user_id=10)
+OTHER = StorageKey(bot_id=1, chat_id=20, user_id=20)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Часы хранилища, которые тест переводит вручную"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(fsm_storage, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def rows(storage):
+    return storage._conn.execute("SELECT COUNT(*) FROM fsm").fetchone()[0]
+
+
+def test_dialog_survives_restart(tmp_path):
+    path = str(tmp_path / "fsm.db")
+
+    async def write():
+        storage = SQLiteStorage(path)
+        await storage.set_state(KEY, "AddShop:waiting_for_api_key")
+        await storage.set_data(KEY, {"shop_name": "Магазин"})
+        await storage.close()
+
+    async def read():
+        storage = SQLiteStorage(path)
+        try:
+            return await storage.get_state(KEY), await storage.get_data(KEY)
+        finally:
+            await storage.close()
+
+    run(write())
+
+    assert run(read()) == ("AddShop:waiting_for_api_key", {"shop_name": "Магазин"})
+
+
+def test_dialog_expires(tmp_path, clock):
+    storage = SQLiteStorage(str(tmp_path / "fsm.db"), ttl=60)
+
+    async def scenario():
+        await storage.set_state(KEY, "Report:start")
+        await storage.set_data(KEY, {"period": "today"})
+        await storage.set_state(OTHER, "Report:start")
+        clock[0] += 30
+        # Запись продлевает диалог
+        await storage.set_state(OTHER, "Report:end")
+        clock[0] += 31
+        return (
+            await storage.get_state(KEY),
+            await storage.get_data(KEY),
+            await storage.get_state(OTHER),
+        )
+
+    try:
+        assert run(scenario()) == (None, {}, "Report:end")
+    finally:
+        run(storage.close())
+
+
+def test_expired_half_is_not_revived(tmp_path, clock):
+    storage = SQLiteStorage(str(tmp_path / "fsm.db"), ttl=60)
+
+    async def scenario():
+        await storage.set_state(KEY, "Report:start")
+        await storage.set_data(KEY, {"shop_name": "Старый"})
+        clock[0] += 61
+        await storage.set_state(KEY, "AddShop:waiting_for_shop_name")
+        return await storage.get_state(KEY), await storage.get_data(KEY)
+
+    try:
+        assert run(scenario()) == ("AddShop:waiting_for_shop_name", {})
+    finally:
+        run(storage.close())
+
+
+def test_finished_dialog_is_deleted(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "fsm.db"))
+
+    async def scenario():
+        await storage.set_state(KEY, "Report:start")
+        await storage.set_data(KEY, {"period": "today"})
+        await storage.set_state(KEY, None)
+        before = rows(storage)
+        await storage.set_data(KEY, {})
+        return before, rows(storage)
+
+    try:
+        assert run(scenario()) == (1, 0)
+    finally:
+        run(storage.close())
+
+
+def test_unknown_storage():
+    with pytest.raises(ValueError):
+        create_storage("etcd")
+
+
+class FakeRedis:
+    """Клиент Redis: хранит значения и запоминает срок жизни каждой записи"""
+
+    def __init__(self):
+        self.values = {}
+        self.ttl = {}
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+        self.ttl[key] = ex
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+        self.ttl.pop(key, None)
+
+
+@pytest.mark.parametrize("ttl, expected", [(600, 600), (0, None)])
+def test_redis_storage_applies_ttl(ttl, expected):
+    pytest.importorskip("redis")
+    redis = FakeRedis()
+    storage = redis_storage(redis, ttl=ttl)
+
+    async def scenario():
+        await storage.set_state(KEY, "Report:start")
+        await storage.set_data(KEY, {"shop_name": "Магазин"})
+        return await storage.get_state(KEY), await storage.get_data(KEY)
+
+    assert run(scenario()) == ("Report:start", {"shop_name": "Магазин"})
+    assert sorted(redis.ttl.values(), key=str) == [expected, expected]
+    # Ключи различают бота и сценарий, как и в SQLiteStorage
+    assert all(key.startswith("fsm:1:10:10:default:") for key in redis.ttl)
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import os
+import sys
+
+from benchmarks.fake_wb import FakeWildberries, serve
+from benchmarks.generator import generate_sales
+
+ROWS = 80_000
+# Прирост пикового RSS при загрузке; json.loads всего ответа даёт ~280 МБ
+RSS_LIMIT_MB = 64
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Загрузка идёт в отдельном процессе: стенд и сгенерированные строки
+# не попадают в его пиковый RSS
+CHILD = """
+import asyncio, json, resource
+
+import wb_client
+from wildberries_api import fetch_sales
+
+
+async def main():
+    try:
+        return await fetch_sales("memory-shop", "2000-01-01")
+    finally:
+        await wb_client.close_session()
+
+
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+count, _ = asyncio.run(main())
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"count": count, "growth_mb": (after - before) / 1024}))
+"""
+
+
+def test_fetch_sales_peak_rss(tmp_path):
+    fake = FakeWildberries(generate_sales(ROWS))
+
+    async def run():
+        async with serve(fake) as url:
+            env = dict(
+                os.environ,
+                WB_STATISTICS_API_URL=url,
+                SALES_STORE_FILE=str(tmp_path / "sales.db"),
+            )
+            child = await asyncio.create_subprocess_exec(
+                sys.executable,
+                "-c",
+                CHILD,
+                cwd=ROOT,
+                env=env,
+                stdout=asyncio.subprocess.PIPE,
+            )
+            stdout, _ = await child.communicate()
+        assert child.returncode == 0
+        return json.loads(stdout)
+
+    result = asyncio.run(run())
+
+    assert result["count"] == ROWS
+    assert result["growth_mb"] < RSS_LIMIT_MB, result
@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+import pytest
+
+from json_stream import iter_batches, iter_json_array
+
+ROWS = [{"srid": "а1", "totalPrice": 12.5}, {"srid": "б2", "nested": [1, {"x": None}]}]
+
+
+async def chunked(body, size):
+    for start in range(0, len(body), size):
+        yield body[start : start + size]
+
+
+def parse(body, size):
+    async def run():
+        return [item async for item in iter_json_array(chunked(body, size))]
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1 << 20])
+@pytest.mark.parametrize(
+    "body, expected",
+    [
+        (b"", []),
+        (b"null", []),
+        (b" \n null \n", []),
+        (b"[]", []),
+        (b" [ ] ", []),
+        (json.dumps(ROWS, ensure_ascii=False).encode(), ROWS),
+        (json.dumps(ROWS, indent=2).encode(), ROWS),
+        (b"[123, true, null]", [123, True, None]),
+    ],
+)
+def test_valid_bodies(body, expected, size):
+    assert parse(body, size) == expected
+
+
+@pytest.mark.parametrize("size", [1, 3, 1 << 20])
+@pytest.mark.parametrize(
+    "body",
+    [
+        b"[{}{}]",
+        b'[{"a": 1}] garbage',
+        b"[{}] []",
+        b"null null",
+        b"[{},]",
+        b"[,{}]",
+        b"[1 2]",
+        b"[{}",
+        b"[",
+        b"nul",
+        b"{}",
+        b"[{} ; {}]",
+    ],
+)
+def test_invalid_bodies(body, size):
+    with pytest.raises(ValueError):
+        parse(body, size)
+
+
+def test_batches():
+    async def run():
+        items = iter_json_array(chunked(json.dumps(list(range(7))).encode(), 4))
+        return [batch async for batch in iter_batches(items, 3)]
+
+    assert asyncio.run(run()) == [[0, 1, 2], [3, 4, 5], [6]]
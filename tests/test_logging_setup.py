@@ -0,0 +1,111 @@
+import logging
+import queue
+import sys
+
+import pytest
+
+from logging_setup import (
+    REDACTED,
+    AsyncQueueHandler,
+    DebugSampler,
+    RedactingFormatter,
+    brief,
+    redact,
+)
+
+JWT = "eyJhbGciOiJFUzI1NiIsImtpZCI6IjIwMjMxMjI1djEiLCJ0eXAiOiJKV1QifQ.eyJlbnQiOjF9.sig"
+BOT_TOKEN = "123456789:AAHdqTcvCH1vGWJxfSeofSAs0K5PALDsaw"
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        (f"ключ {JWT} не подошёл", f"ключ {REDACTED} не подошёл"),
+        (f"ключ {JWT[:20]}", f"ключ {REDACTED}"),
+        (
+            f"https://api.telegram.org/bot{BOT_TOKEN}/getMe",
+            f"https://api.telegram.org/bot{REDACTED}/getMe",
+        ),
+        ("Authorization: secret123", f"Authorization: {REDACTED}"),
+        (
+            "Authorization: Bearer abcdef123456secret",
+            f"Authorization: Bearer {REDACTED}",
+        ),
+        (
+            "headers={'Authorization': 'Bearer abc def', 'Accept': '*/*'}",
+            f"headers={{'Authorization': 'Bearer {REDACTED}', 'Accept': '*/*'}}",
+        ),
+        ('{"authorization": "abc"}', f'{{"authorization": "{REDACTED}"}}'),
+        ("обычное сообщение", "обычное сообщение"),
+    ],
+)
+def test_redact(text, expected):
+    assert redact(text) == expected
+
+
+def test_formatter_redacts_traceback():
+    try:
+        raise ValueError(f"Authorization: Bearer {JWT}")
+    except ValueError:
+        record = logging.LogRecord(
+            "test", logging.ERROR, __file__, 1, "ошибка", None, sys.exc_info()
+        )
+
+    text = RedactingFormatter("%(message)s").format(record)
+
+    assert "ошибка" in text
+    assert "ValueError" in text
+    assert JWT not in text
+    assert "Bearer" in text
+
+
+def make_record(msg, *args, level=logging.DEBUG, name="test"):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+def test_handler_truncates_long_messages():
+    log_queue = queue.Queue()
+    handler = AsyncQueueHandler(log_queue, max_length=20)
+
+    handler.handle(make_record("%s", "x" * 50, level=logging.INFO))
+    handler.handle(make_record("коротко %s", 1, level=logging.INFO))
+
+    long, short = log_queue.get_nowait(), log_queue.get_nowait()
+    assert long.getMessage() == "x" * 20 + "… [обрезано 30 символов]"
+    assert long.args is None
+    assert short.getMessage() == "коротко 1"
+
+
+def test_handler_drops_records_when_queue_is_full():
+    handler = AsyncQueueHandler(queue.Queue(2), max_length=0)
+
+    for index in range(5):
+        handler.handle(make_record("запись %s", index, level=logging.INFO))
+
+    assert handler.stats() == {"queued": 2, "dropped": 3}
+
+
+def test_debug_sampler():
+    sampler = DebugSampler(3)
+
+    passed = [sampler.filter(make_record("цикл %s", index)) for index in range(7)]
+    other = sampler.filter(make_record("другое сообщение"))
+    other_logger = sampler.filter(make_record("цикл %s", 0, name="other"))
+    info = [
+        sampler.filter(make_record("цикл %s", index, level=logging.INFO))
+        for index in range(3)
+    ]
+
+    # Вид сообщения — логгер и шаблон: первое каждого вида выводится всегда
+    assert passed == [True, False, False, True, False, False, True]
+    assert other and other_logger
+    assert info == [True, True, True]
+    assert all(DebugSampler(1).filter(make_record("x")) for _ in range(3))
+
+
+def test_brief_is_bounded():
+    text = str(brief(list(range(100_000))))
+
+    assert len(text) < 100
+    assert str(brief("x" * 1000)).endswith("x")
+    assert len(str(brief("x" * 1000))) < 400
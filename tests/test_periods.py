@@ -0,0 +1,62 @@
+import datetime
+
+import pytest
+
+import wildberries_api
+from benchmarks.fake_wb import FakeWildberries
+from benchmarks.generator import generate_sales
+from errors import InvalidDateError
+from wildberries_api import parse_date, previous_window, resolve_period
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("2024-01-05", "2024-01-05"),
+        (" 2024-01-05\n", "2024-01-05"),
+        ("20240105", "2024-01-05"),
+        ("2024-W01-5", "2024-01-05"),
+    ],
+)
+def test_parse_date_normalizes(text, expected):
+    assert parse_date(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", None, "05.01.2024", "2024-13-01", "вчера"])
+def test_parse_date_rejects(text):
+    with pytest.raises(InvalidDateError) as error:
+        parse_date(text)
+    assert "YYYY-MM-DD" in str(error.value)
+
+
+def test_custom_period_is_normalized():
+    assert resolve_period("custom", "20240101", "2024-01-31") == (
+        "2024-01-01",
+        "2024-01-31",
+    )
+    with pytest.raises(InvalidDateError):
+        resolve_period("custom", "2024-01-01", "31.01.2024")
+
+
+def test_previous_window():
+    assert previous_window("2024-03-01", "2024-03-07") == ("2024-02-23", "2024-02-29")
+
+
+def test_basic_format_gives_the_same_report(wb_stand):
+    today = datetime.date.today()
+    first = today - datetime.timedelta(days=6)
+    fake = FakeWildberries(generate_sales(2000, first, today))
+
+    async def scenario(url):
+        iso = await wildberries_api.get_sales_totals(
+            "period-shop", "custom", first.isoformat(), today.isoformat()
+        )
+        basic = await wildberries_api.get_sales_totals(
+            "period-shop", "custom", f"{first:%Y%m%d}", f"{today:%Y%m%d}"
+        )
+        return iso, basic
+
+    iso, basic = wb_stand(fake, scenario)
+
+    assert iso.count == 2000
+    assert basic.key_metrics() == iso.key_metrics()
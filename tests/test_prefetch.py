@@ -0,0 +1,46 @@
+import datetime
+
+import wildberries_api
+from benchmarks.fake_wb import FakeWildberries
+from benchmarks.generator import generate_sales
+from prefetch import ReportPrefetcher
+
+
+def test_prefetch_warms_rollups_not_report_cache(wb_stand):
+    fake = FakeWildberries(generate_sales(1000))
+    shops = {"Магазин": "prefetch-shop"}
+
+    async def scenario(url):
+        await ReportPrefetcher(shops, 300).refresh_all()
+        return await wildberries_api.get_sales_totals("prefetch-shop", "last_7_days")
+
+    cached = len(wildberries_api.report_cache)
+    totals = wb_stand(fake, scenario)
+
+    assert totals.count == 1000
+    # Отчёт ответил из прогретых сводок, без второго запроса к API
+    assert fake.requests == 1
+    assert "prefetch-shop" in wildberries_api._rollups
+    assert len(wildberries_api.report_cache) == cached
+
+
+def test_comparison_after_prefetch_needs_no_request(wb_stand):
+    today = datetime.date.today()
+    first = today - datetime.timedelta(days=13)
+    fake = FakeWildberries(generate_sales(1400, first, today))
+
+    async def scenario(url):
+        await ReportPrefetcher({"Магазин": "compare-shop"}, 300).refresh_all()
+        report = await wildberries_api.get_sales_totals("compare-shop", "last_7_days")
+        comparison = await wildberries_api.get_sales_comparison(
+            "compare-shop", "last_7_days"
+        )
+        return report, comparison
+
+    report, (_, current, previous) = wb_stand(fake, scenario)
+
+    # Прошлая неделя загружена фоновым обновлением вместе с текущей
+    assert fake.requests == 1
+    assert current.count == report.count
+    assert previous.count > 0
+    assert current.count + previous.count == 1400
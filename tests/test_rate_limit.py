@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+
+import wb_client
+import wildberries_api
+from benchmarks.fake_wb import INVALID_TOKEN, FakeWildberries
+from benchmarks.generator import generate_sales
+from errors import InvalidApiKeyError, RateLimitError
+from rate_limit import RateLimiter
+
+SALES_PATH = "/api/v1/supplier/sales"
+
+
+def test_requests_of_one_key_are_served_in_order(wb_stand):
+    rate = 20
+    limiter = RateLimiter(rate, 1, jitter=0)
+    fake = FakeWildberries(generate_sales(10))
+    order = []
+
+    async def scenario(url):
+        async def request(index):
+            response = await wb_client.get(
+                f"{url}{SALES_PATH}", "fifo", limiter=limiter
+            )
+            order.append(index)
+            return response.status
+
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(request(index) for index in range(6)))
+        return statuses, time.perf_counter() - started
+
+    statuses, elapsed = wb_stand(fake, scenario)
+
+    assert statuses == [200] * 6
+    assert order == list(range(6))
+    # Первый запрос — из запаса корзины, остальные по одному в 1/rate секунд
+    assert elapsed >= 5 / rate - 0.01
+
+
+def test_429_blocks_key_until_retry_after(wb_stand):
+    window = 1.0
+    # Корзина бота щедрее стенда, так что второй запрос получит 429
+    limiter = RateLimiter(100, 10, jitter=0)
+    fake = FakeWildberries(generate_sales(10), rate_limit=1, window=window)
+
+    async def scenario(url):
+        started = time.perf_counter()
+        first = await wb_client.get(f"{url}{SALES_PATH}", "limited", limiter=limiter)
+        second = await wb_client.get(f"{url}{SALES_PATH}", "limited", limiter=limiter)
+        return first.status, second.status, time.perf_counter() - started
+
+    first, second, elapsed = wb_stand(fake, scenario)
+
+    assert (first, second) == (200, 200)
+    assert fake.throttled == 1
+    assert limiter.throttled == 1
+    # Повтор ушёл только после окна, указанного в X-Ratelimit-Retry
+    assert elapsed >= window - 0.05
+
+
+def test_rate_limit_error_when_wait_is_too_long(monkeypatch, wb_stand):
+    # По умолчанию statistics-api даёт ключу один запрос в минуту
+    monkeypatch.setattr(wb_client, "RATE_LIMIT_MAX_WAIT", 0.3)
+    fake = FakeWildberries(generate_sales(10))
+
+    async def scenario(url):
+        count, _ = await wildberries_api.fetch_sales("max-wait", "2000-01-01")
+        started = time.perf_counter()
+        with pytest.raises(RateLimitError) as error:
+            await wildberries_api.fetch_sales("max-wait", "2000-01-01")
+        return count, error.value, time.perf_counter() - started
+
+    count, error, elapsed = wb_stand(fake, scenario)
+
+    assert count == 10
+    assert fake.requests == 1
+    assert 0.3 <= elapsed < 1
+    assert error.retry_after > 50
+    assert "попробуйте через" in str(error)
+
+
+def test_invalid_key_is_a_typed_error(wb_stand):
+    fake = FakeWildberries([])
+
+    async def scenario(url):
+        await wildberries_api.fetch_sales(INVALID_TOKEN, "2000-01-01")
+
+    with pytest.raises(InvalidApiKeyError):
+        wb_stand(fake, scenario)
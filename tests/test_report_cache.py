@@ -0,0 +1,119 @@
+import random
+import sys
+import time
+
+from report_cache import SIZE_SAMPLE, ReportCache, estimate_size
+from sales_store import SaleRecord
+
+ROWS = 100_000
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_records(count):
+    rnd = random.Random(0)
+    return [
+        SaleRecord(
+            f"srid-{index}",
+            "2024-01-01T10:00:00",
+            10_000_000 + index,
+            f"ART-{index:06d}",
+            f"Склад {rnd.randint(0, 20)}",
+            f"Регион {rnd.randint(0, 80)}",
+            round(rnd.uniform(300, 6000), 2),
+            rnd.randint(0, 70),
+            rnd.randint(0, 30),
+            0,
+            round(rnd.uniform(100, 4000), 2),
+            round(rnd.uniform(200, 5000), 2),
+            round(rnd.uniform(200, 5000), 2),
+        )
+        for index in range(count)
+    ]
+
+
+def exact_size(records):
+    return sys.getsizeof(records) + sum(estimate_size(record) for record in records)
+
+
+def test_size_of_large_report_is_sampled():
+    records = make_records(ROWS)
+
+    started = time.perf_counter()
+    estimate = estimate_size(records)
+    elapsed = time.perf_counter() - started
+
+    # Оценка по выборке близка к точному обходу и не зависит от числа строк
+    assert abs(estimate - exact_size(records)) < exact_size(records) * 0.05
+    assert elapsed < 0.01
+    small = records[:SIZE_SAMPLE]
+    assert estimate_size(small) == exact_size(small)
+
+
+def test_entries_expire():
+    clock = Clock()
+    cache = ReportCache(10_000, clock=clock)
+    cache.put(("key", "a"), [1], ttl=60)
+    cache.put(("key", "b"), [2], ttl=600)
+
+    clock.now = 61
+
+    assert cache.get(("key", "a")) is None
+    assert cache.get(("key", "b")) == [2]
+    assert len(cache) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_is_evicted():
+    value = list(range(10))
+    size = estimate_size(value)
+    cache = ReportCache(size * 3)
+    for name in "abc":
+        cache.put(("key", name), list(value), ttl=60)
+
+    # Чтение делает запись свежей: вытесняется b, а не a
+    assert cache.get(("key", "a")) is not None
+    cache.put(("key", "d"), list(value), ttl=60)
+
+    assert cache.get(("key", "b")) is None
+    assert all(cache.get(("key", name)) for name in "acd")
+    assert cache.size == size * 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_oversized_report_is_not_cached():
+    cache = ReportCache(1000)
+    cache.put(("key", "small"), [1], ttl=60)
+    cache.put(("key", "big"), list(range(1000)), ttl=60)
+
+    assert cache.get(("key", "big")) is None
+    assert cache.get(("key", "small")) == [1]
+
+
+def test_replacing_entry_keeps_size():
+    cache = ReportCache(100_000)
+    cache.put(("key", "a"), list(range(10)), ttl=60)
+    cache.put(("key", "a"), list(range(100)), ttl=60)
+
+    assert len(cache) == 1
+    assert cache.size == estimate_size(list(range(100)))
+
+
+def test_invalidate_api_key():
+    cache = ReportCache(100_000)
+    cache.put(("shop-1", "a"), [1], ttl=60)
+    cache.put(("shop-1", "b"), [2], ttl=60)
+    cache.put(("shop-2", "a"), [3], ttl=60)
+
+    cache.invalidate_api_key("shop-1")
+
+    assert len(cache) == 1
+    assert cache.get(("shop-2", "a")) == [3]
+    assert cache.size == estimate_size([3])
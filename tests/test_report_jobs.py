@@ -0,0 +1,226 @@
+import asyncio
+import datetime
+import types
+
+import pytest
+
+import wildberries_api
+from benchmarks.fake_wb import FakeWildberries
+from benchmarks.generator import generate_sales
+from rate_limit import RateLimiter
+from report_jobs import NO_DATA_TEXT, ReportJobs
+from reports import build_comparison_report
+from wildberries_api import get_sales_report
+
+
+class FakeBot:
+    """Bot API: запоминает отправленные и исправленные сообщения"""
+
+    def __init__(self):
+        self.sent = []  # (chat_id, text)
+        self.edits = []  # (message_id, text, kwargs)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        # Настоящий вызов Bot API уступает цикл событий
+        await asyncio.sleep(0.01)
+        self.sent.append((chat_id, text))
+        return types.SimpleNamespace(
+            chat=types.SimpleNamespace(id=chat_id), message_id=len(self.sent)
+        )
+
+    async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        self.edits.append((message_id, text, kwargs))
+
+    def final(self, message_id):
+        return [edit for edit in self.edits if edit[0] == message_id][-1]
+
+
+async def with_jobs(scenario, **kwargs):
+    bot = FakeBot()
+    jobs = ReportJobs(bot, **kwargs)
+    try:
+        await scenario(jobs)
+    finally:
+        await jobs.stop()
+    return bot, jobs
+
+
+def run_jobs(scenario, **kwargs):
+    return asyncio.run(with_jobs(scenario, **kwargs))
+
+
+def test_reports_report_progress(wb_stand):
+    fake = FakeWildberries(generate_sales(1000))
+    progress = {}
+
+    async def compare(job_progress):
+        progress["compare"] = job_progress
+        report = await build_comparison_report(
+            "jobs-compare", "last_7_days", progress=job_progress
+        )
+        return report, None
+
+    async def top(job_progress):
+        progress["top"] = job_progress
+        rows = await get_sales_report("jobs-top", "last_7_days", progress=job_progress)
+        return f"{len(rows)} строк", None
+
+    async def scenario(jobs):
+        await (await jobs.submit(1, 1, ("compare",), compare))
+        await (await jobs.submit(2, 2, ("top",), top))
+
+    bot, jobs = wb_stand(fake, lambda url: with_jobs(scenario))
+
+    # Загрузка сообщает о ходе работы в сообщение задачи
+    assert progress["compare"].rows == 1000
+    assert progress["top"].rows == 1000
+    _, text, kwargs = bot.final(1)
+    assert "Сравнение с прошлым периодом" in text
+    assert kwargs["parse_mode"] == "Markdown"
+    assert bot.final(2)[1] == "1000 строк"
+    assert jobs.stats()["completed"] == 2
+
+
+@pytest.fixture
+def daily_download(monkeypatch):
+    """Стенд, с которого 20 дней продаж загружаются по одному дню"""
+    monkeypatch.setattr(wildberries_api, "SALES_CHUNK_MIN_DAYS", 1)
+    monkeypatch.setattr(wildberries_api, "SALES_CHUNK_CONCURRENCY", 1)
+    monkeypatch.setattr(
+        wildberries_api, "statistics_limiter", RateLimiter(100, 100, jitter=0)
+    )
+    today = datetime.date.today()
+    first = today - datetime.timedelta(days=19)
+    fake = FakeWildberries(generate_sales(2000, first, today), latency=0.1)
+    return fake, first.isoformat(), today.isoformat()
+
+
+def top_job(api_key, date_from, date_to):
+    async def build(progress):
+        rows = await get_sales_report(api_key, "custom", date_from, date_to, progress)
+        return f"{len(rows)} строк", None
+
+    return build
+
+
+def test_cancelled_job_stops_download(wb_stand, daily_download):
+    fake, date_from, date_to = daily_download
+    build = top_job("cancel-shop", date_from, date_to)
+
+    async def empty(progress):
+        return None
+
+    async def scenario(jobs):
+        first = await jobs.submit(1, 1, ("top", "article"), build)
+        await asyncio.sleep(0.35)
+        started = fake.requests
+        await (await jobs.submit(1, 1, ("compare",), empty))
+        await asyncio.sleep(0.5)
+        return first, started
+
+    async def run(url):
+        jobs = ReportJobs(FakeBot())
+        try:
+            return await scenario(jobs)
+        finally:
+            await jobs.stop()
+
+    first, started = wb_stand(fake, run)
+
+    assert first.cancelled()
+    assert 0 < started < 20
+    # Загрузка по дням остановилась вместе с задачей
+    assert fake.requests == started
+    assert not wildberries_api.report_flight
+
+
+def test_joined_download_shows_progress(wb_stand, daily_download):
+    fake, date_from, date_to = daily_download
+    build = top_job("joined-shop", date_from, date_to)
+    progress = []
+
+    async def follower(job_progress):
+        progress.append(job_progress)
+        return await build(job_progress)
+
+    async def scenario(jobs):
+        first = await jobs.submit(1, 1, ("top", "article"), build)
+        await asyncio.sleep(0.35)
+        second = await jobs.submit(2, 2, ("top", "article"), follower)
+        await asyncio.sleep(0.2)
+        # Первый пользователь ушёл, второй дожидается общей загрузки
+        first.cancel()
+        await second
+
+    bot, jobs = wb_stand(fake, lambda url: with_jobs(scenario))
+
+    assert bot.final(2)[1] == "2000 строк"
+    assert progress[0].days_total == 20
+    assert progress[0].days_done == 20
+    assert fake.requests == 20 + 1
+
+
+def test_new_request_cancels_previous():
+    async def slow(progress):
+        await asyncio.sleep(10)
+
+    async def empty(progress):
+        return None
+
+    async def scenario(jobs):
+        first = await jobs.submit(1, 1, ("top", "article"), slow)
+        await asyncio.sleep(0.05)
+        await (await jobs.submit(1, 1, ("compare",), empty))
+        await asyncio.gather(first, return_exceptions=True)
+        assert first.cancelled()
+
+    bot, jobs = run_jobs(scenario)
+
+    assert bot.final(1)[1] == "Построение отчёта отменено."
+    assert bot.final(2)[1] == NO_DATA_TEXT
+    assert jobs.stats()["cancelled"] == 1
+
+
+def test_concurrent_taps_of_one_user():
+    async def slow(progress):
+        await asyncio.sleep(10)
+
+    async def empty(progress):
+        return None
+
+    async def scenario(jobs):
+        # aiogram обрабатывает апдейты параллельно: оба нажатия приходят сразу
+        first, second = await asyncio.gather(
+            jobs.submit(1, 1, ("top", "article"), slow),
+            jobs.submit(1, 1, ("compare",), empty),
+        )
+        await asyncio.gather(first, second, return_exceptions=True)
+        assert first.cancelled()
+
+        same = await asyncio.gather(
+            jobs.submit(2, 2, ("compare",), empty),
+            jobs.submit(2, 2, ("compare",), empty),
+        )
+        assert same[0] is same[1]
+        await same[0]
+
+    bot, jobs = run_jobs(scenario)
+
+    assert jobs.stats()["cancelled"] == 1
+    assert jobs.stats()["deduplicated"] == 1
+    assert jobs.stats()["completed"] == 2
+    # Отменённая до старта задача не успела отправить сообщение
+    assert [chat_id for chat_id, _ in bot.sent] == [1, 2]
+
+
+def test_deadline():
+    async def slow(progress):
+        await asyncio.sleep(10)
+
+    async def scenario(jobs):
+        await (await jobs.submit(1, 1, ("compare",), slow))
+
+    bot, jobs = run_jobs(scenario, timeout=0.1)
+
+    assert bot.final(1)[1].startswith("Отчёт не успел сформироваться")
+    assert jobs.stats()["timed_out"] == 1
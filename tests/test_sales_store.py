@@ -0,0 +1,58 @@
+import asyncio
+
+import wildberries_api
+from benchmarks.fake_wb import FakeWildberries
+from benchmarks.generator import generate_sales
+from sales_store import SalesStore, shop_id
+
+
+def test_sync_lock_is_kept_while_in_use(tmp_path):
+    store = SalesStore(str(tmp_path / "sales.db"))
+    inside = []
+
+    async def sync(name):
+        await asyncio.sleep(name * 0.03)
+        async with store.sync_lock("key"):
+            inside.append(name)
+            assert len(inside) == 1
+            # Очистка магазина посреди синхронизации не снимает блокировку:
+            # синхронизация, начатая после очистки, ждёт эту
+            store.purge("key")
+            assert shop_id("key") in store._sync_locks
+            await asyncio.sleep(0.1)
+            inside.remove(name)
+
+    async def run():
+        await asyncio.gather(*(sync(name) for name in range(3)))
+
+    try:
+        asyncio.run(run())
+        # Неиспользуемые блокировки не копятся
+        assert not store._sync_locks
+    finally:
+        store.close()
+
+
+def test_invalidate_waits_for_running_sync(wb_stand):
+    fake = FakeWildberries(generate_sales(500), latency=0.3)
+    store = wildberries_api.sales_store
+
+    async def scenario(url):
+        report = asyncio.ensure_future(
+            wildberries_api.get_sales_totals("deleted-shop", "last_7_days")
+        )
+        await asyncio.sleep(0.1)
+        # /delshop подтверждён, пока синхронизация магазина ещё идёт
+        await wildberries_api.invalidate_shop("deleted-shop")
+        await report
+        return (
+            await store.aget_state("deleted-shop"),
+            await store.awindow("deleted-shop", "2000-01-01", "2100-01-01"),
+        )
+
+    state, rows = wb_stand(fake, scenario)
+
+    assert fake.requests == 1
+    # Продажи удалённого магазина не остались в хранилище
+    assert state is None
+    assert rows == []
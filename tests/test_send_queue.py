@@ -0,0 +1,181 @@
+import asyncio
+import datetime
+import time
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+import digest
+from digest import DigestScheduler, Subscriptions
+from send_queue import SendQueue
+
+
+class FakeBot:
+    """Bot API: запоминает отправки и выбрасывает заданные ошибки"""
+
+    def __init__(self):
+        self.sent = []  # (chat_id, text, время отправки)
+        self.calls = 0
+        self.errors = {}  # chat_id -> ошибки для очередных вызовов
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls += 1
+        errors = self.errors.get(chat_id)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append((chat_id, text, time.monotonic()))
+        return len(self.sent)
+
+
+def retry_after(chat_id, seconds):
+    method = SendMessage(chat_id=chat_id, text="")
+    return TelegramRetryAfter(method, "Flood control exceeded", seconds)
+
+
+def forbidden(chat_id):
+    method = SendMessage(chat_id=chat_id, text="")
+    return TelegramForbiddenError(method, "bot was blocked by the user")
+
+
+def run_queue(bot, scenario, **kwargs):
+    async def run():
+        queue = SendQueue(bot, **kwargs)
+        queue.start()
+        try:
+            return queue, await scenario(queue)
+        finally:
+            await queue.stop()
+
+    return asyncio.run(run())
+
+
+def test_global_rate():
+    rate = 10
+    bot = FakeBot()
+
+    async def scenario(queue):
+        started = time.monotonic()
+        await asyncio.gather(*(queue.submit(chat, "text") for chat in range(20)))
+        return started
+
+    queue, started = run_queue(bot, scenario, rate=rate, per_chat_rate=100)
+
+    times = sorted(sent_at - started for _, _, sent_at in bot.sent)
+    assert len(times) == 20
+    # Запас корзины — rate сообщений сразу, дальше rate в секунду
+    for index in range(rate, len(times)):
+        assert times[index] >= (index - rate + 1) / rate - 0.02
+    assert queue.stats()["sent"] == 20
+
+
+def test_per_chat_rate():
+    per_chat_rate = 5
+    bot = FakeBot()
+
+    async def scenario(queue):
+        started = time.monotonic()
+        futures = [queue.submit(1, f"text {index}") for index in range(4)]
+        futures.append(queue.submit(2, "other chat"))
+        await asyncio.gather(*futures)
+        return started
+
+    _, started = run_queue(bot, scenario, rate=100, per_chat_rate=per_chat_rate)
+
+    chat_times = [sent_at for chat, _, sent_at in bot.sent if chat == 1]
+    gaps = [later - earlier for earlier, later in zip(chat_times, chat_times[1:])]
+    assert len(gaps) == 3
+    assert min(gaps) >= 1 / per_chat_rate - 0.02
+    # Другой чат не ждёт очереди первого
+    other = next(sent_at for chat, _, sent_at in bot.sent if chat == 2)
+    assert other - started < 0.1
+
+
+def test_retry_after_pauses_all_chats_and_retries():
+    bot = FakeBot()
+    bot.errors[1] = [retry_after(1, 1)]
+
+    async def scenario(queue):
+        first = queue.submit(1, "flooded")
+        while not bot.calls:
+            await asyncio.sleep(0.01)
+        paused_at = time.monotonic()
+        second = queue.submit(2, "after pause")
+        return paused_at, await asyncio.gather(first, second)
+
+    queue, (paused_at, results) = run_queue(bot, scenario, rate=100)
+
+    assert all(results)
+    assert {chat for chat, _, _ in bot.sent} == {1, 2}
+    # Пауза из RetryAfter действует на все чаты, затем сообщение повторяется
+    assert all(sent_at - paused_at >= 0.95 for _, _, sent_at in bot.sent)
+    assert queue.stats()["retries"] == 1
+    assert queue.stats()["failed"] == 0
+
+
+def test_failure_affects_only_its_message():
+    bot = FakeBot()
+    bot.errors[2] = [forbidden(2)]
+
+    async def scenario(queue):
+        futures = [queue.submit(chat, "text") for chat in (1, 2, 3)]
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    queue, results = run_queue(bot, scenario, rate=100)
+
+    assert isinstance(results[1], TelegramForbiddenError)
+    assert not isinstance(results[0], Exception)
+    assert not isinstance(results[2], Exception)
+    assert sorted(chat for chat, _, _ in bot.sent) == [1, 3]
+    # Заблокированный чат не повторяется
+    assert bot.calls == 3
+    assert queue.stats()["sent"] == 2
+    assert queue.stats()["failed"] == 1
+
+
+def test_digests_build_each_report_once(tmp_path, monkeypatch):
+    built = []
+
+    async def build_shop_report(api_key, period):
+        built.append((api_key, period))
+        await asyncio.sleep(0.01)
+        return f"отчёт {api_key} {period}\n"
+
+    monkeypatch.setattr(digest, "build_shop_report", build_shop_report)
+    monday = datetime.datetime(2024, 1, 1, 9, 0)
+    bot = FakeBot()
+
+    async def scenario(queue):
+        subscriptions = Subscriptions(str(tmp_path / "subscriptions.json"))
+        for chat in (1, 2, 3):
+            await subscriptions.subscribe(chat, "Магазин", "daily")
+        for chat in (4, 5):
+            await subscriptions.subscribe(chat, "Магазин", "weekly")
+        await subscriptions.subscribe(1, "Второй", "daily")
+        await subscriptions.subscribe(6, "Удалённый", "daily")
+
+        shops = {"Магазин": "key-1", "Второй": "key-2"}
+        scheduler = DigestScheduler(
+            subscriptions, shops, queue, datetime.time(9), weekday=0
+        )
+        return await scheduler.send_digests(monday)
+
+    _, delivered = run_queue(bot, scenario, rate=100)
+
+    assert sorted(built) == [
+        ("key-1", "last_7_days"),
+        ("key-1", "yesterday"),
+        ("key-2", "yesterday"),
+    ]
+    assert delivered == 6
+    assert sorted(chat for chat, _, _ in bot.sent) == [1, 1, 2, 3, 4, 5]
+    weekly = [text for chat, text, _ in bot.sent if chat == 4]
+    assert weekly[0].startswith("*Еженедельный дайджест:*")
+
+
+@pytest.mark.parametrize("day, weekly", [(0, True), (1, False)])
+def test_weekly_digest_only_on_its_day(day, weekly):
+    scheduler = DigestScheduler(None, {}, None, datetime.time(9), weekday=0)
+    monday = datetime.date(2024, 1, 1)
+    due = scheduler.due_frequencies(monday + datetime.timedelta(days=day))
+    assert ("weekly" in due) is weekly
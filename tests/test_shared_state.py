@@ -0,0 +1,131 @@
+import asyncio
+import json
+import multiprocessing
+import sqlite3
+import time
+
+from rate_limit import BucketStore, RateLimiter
+from sales_store import SalesStore
+from utils import ShopRegistry
+
+# Процессы webhook запускаются через spawn — в тестах так же
+CONTEXT = multiprocessing.get_context("spawn")
+PROCESSES = 4
+
+
+def run_processes(target, *args):
+    processes = [
+        CONTEXT.Process(target=target, args=(index, *args))
+        for index in range(PROCESSES)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+    assert [process.exitcode for process in processes] == [0] * PROCESSES
+
+
+def add_shops(index, path, count):
+    async def run():
+        registry = ShopRegistry(path)
+        for number in range(count):
+            await registry.add(f"shop-{index}-{number}", f"key-{index}-{number}")
+
+    asyncio.run(run())
+
+
+def test_registry_updates_from_processes_are_not_lost(tmp_path):
+    path = str(tmp_path / "config.json")
+    run_processes(add_shops, path, 15)
+
+    with open(path) as file:
+        shops = json.load(file)
+    assert len(shops) == PROCESSES * 15
+
+
+def take_tokens(index, path, seconds, taken):
+    async def run():
+        limiter = RateLimiter(10, 1, store=BucketStore(path), name="test")
+        bucket = limiter.bucket("shared-key")
+        deadline = time.time() + seconds
+        count = 0
+        while time.time() < deadline:
+            if await bucket.take() <= 0:
+                count += 1
+            await asyncio.sleep(0.005)
+        taken.put(count)
+
+    asyncio.run(run())
+
+
+def test_processes_share_one_bucket(tmp_path):
+    seconds = 1.0
+    taken = CONTEXT.Queue()
+    run_processes(take_tokens, str(tmp_path / "rate_limit.db"), seconds, taken)
+
+    total = sum(taken.get() for _ in range(PROCESSES))
+    # Один запас плюс 10 токенов в секунду на все процессы, а не на каждый;
+    # процессы стартуют неодновременно, отсюда запас сверху
+    assert total <= 1 + 10 * seconds + 5
+
+
+def test_bucket_store_does_not_block_event_loop(tmp_path):
+    path = str(tmp_path / "rate_limit.db")
+    limiter = RateLimiter(10, 1, jitter=0, store=BucketStore(path), name="test")
+    # Транзакция другого процесса держит запись в базу лимитов
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    hold = 0.5
+
+    async def run():
+        lag = 0.0
+
+        async def ticker():
+            nonlocal lag
+            while True:
+                started = time.perf_counter()
+                await asyncio.sleep(0.01)
+                lag = max(lag, time.perf_counter() - started - 0.01)
+
+        ticking = asyncio.create_task(ticker())
+        asyncio.get_running_loop().call_later(hold, other.execute, "COMMIT")
+        started = time.perf_counter()
+        # Чтение не ждёт чужую транзакцию, а запись ждёт её в потоке
+        delay = await limiter.bucket("key").delay()
+        read_at = time.perf_counter() - started
+        await limiter.throttle("key", 60)
+        blocked_at = time.perf_counter() - started
+        await limiter.forget("other-key")
+        ticking.cancel()
+        return delay, read_at, blocked_at, lag, await limiter.bucket("key").delay()
+
+    try:
+        delay, read_at, blocked_at, lag, after = asyncio.run(run())
+    finally:
+        other.close()
+
+    assert delay == 0
+    assert read_at < hold / 2
+    assert blocked_at >= hold
+    assert lag < 0.1
+    assert after > 50
+
+
+def hold_sync_lock(index, path, started, hold):
+    async def run():
+        store = SalesStore(path)
+        async with store.sync_lock("sync-key"):
+            started.put((index, time.time()))
+            await asyncio.sleep(hold)
+
+    asyncio.run(run())
+
+
+def test_sync_lock_excludes_other_processes(tmp_path):
+    hold = 0.3
+    started = CONTEXT.Queue()
+    run_processes(hold_sync_lock, str(tmp_path / "sales.db"), started, hold)
+
+    times = sorted(started.get()[1] for _ in range(PROCESSES))
+    gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+    assert min(gaps) >= hold - 0.02
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+import wildberries_api
+from benchmarks.fake_wb import FakeWildberries
+from benchmarks.generator import generate_sales
+from singleflight import SingleFlight
+
+CALLERS = 5
+
+
+def test_concurrent_calls_share_one_task():
+    flight = SingleFlight()
+    calls = []
+
+    async def load(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return value * 2
+
+    async def run():
+        same = await asyncio.gather(*(flight.do("a", load, 1) for _ in range(3)))
+        other = await flight.do("b", load, 2)
+        return same, other
+
+    same, other = asyncio.run(run())
+
+    assert same == [2, 2, 2]
+    assert other == 4
+    assert calls == [1, 2]
+    assert flight.stats() == {"in_flight": 0, "started": 2, "coalesced": 2}
+
+
+def test_error_reaches_every_waiter():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("сбой")
+
+    async def run():
+        return await asyncio.gather(
+            flight.do("a", fail), flight.do("a", fail), return_exceptions=True
+        )
+
+    errors = asyncio.run(run())
+
+    assert [type(error) for error in errors] == [ValueError, ValueError]
+    assert flight.started == 1
+
+
+def test_task_is_cancelled_with_its_last_waiter():
+    flight = SingleFlight()
+    finished = []
+
+    async def load():
+        await asyncio.sleep(0.2)
+        finished.append(True)
+        return "готово"
+
+    async def run():
+        first = asyncio.ensure_future(flight.do("a", load))
+        second = asyncio.ensure_future(flight.do("a", load))
+        await asyncio.sleep(0.05)
+        # Один ушёл — общая задача продолжается для второго
+        first.cancel()
+        await asyncio.sleep(0.05)
+        assert "a" in flight
+        second.cancel()
+        await asyncio.sleep(0)
+        # Ушли все — задача отменена, новый вызов запускает её заново
+        assert "a" not in flight
+        result = await flight.do("a", load)
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return result
+
+    assert asyncio.run(run()) == "готово"
+    assert finished == [True]
+    assert flight.started == 2
+
+
+def test_concurrent_totals_are_coalesced(wb_stand):
+    fake = FakeWildberries(generate_sales(300), latency=0.2)
+    flight = wildberries_api.report_flight
+    coalesced = flight.coalesced
+
+    async def scenario(url):
+        return await asyncio.gather(
+            *(
+                wildberries_api.get_sales_totals("coalesced-shop", "last_7_days")
+                for _ in range(CALLERS)
+            )
+        )
+
+    results = wb_stand(fake, scenario)
+
+    assert [totals.count for totals in results] == [300] * CALLERS
+    assert fake.requests == 1
+    assert flight.coalesced - coalesced == CALLERS - 1
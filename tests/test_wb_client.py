@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+import wb_client
+import wildberries_api
+from benchmarks.fake_wb import FakeWildberries
+from benchmarks.generator import generate_sales
+
+LATENCY = 0.3
+SHOPS = 10
+
+
+async def timed(coro):
+    started = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - started
+
+
+def test_concurrent_reports_take_about_one_request(wb_stand):
+    # Отчёты разных магазинов: у каждого свой ключ и своя корзина лимита
+    fake = FakeWildberries(generate_sales(500), latency=LATENCY)
+
+    async def scenario(url):
+        single, single_time = await timed(
+            wildberries_api.get_sales_totals("shop-0", "last_7_days")
+        )
+        results, concurrent_time = await timed(
+            asyncio.gather(
+                *(
+                    wildberries_api.get_sales_totals(f"shop-{index}", "last_7_days")
+                    for index in range(1, SHOPS + 1)
+                )
+            )
+        )
+        return single, single_time, results, concurrent_time
+
+    single, single_time, results, concurrent_time = wb_stand(fake, scenario)
+
+    assert single.count == 500
+    assert all(totals.count == single.count for totals in results)
+    assert fake.requests == SHOPS + 1
+    # Последовательно это заняло бы SHOPS * LATENCY
+    assert concurrent_time < single_time + LATENCY
+    assert concurrent_time < SHOPS * LATENCY / 3
+
+
+def test_get_retries_server_errors(wb_stand):
+    fake = FakeWildberries([], error_rate=0.5)
+
+    async def scenario(url):
+        return [
+            await wb_client.get(f"{url}/api/v1/supplier/sales", "key")
+            for _ in range(5)
+        ]
+
+    responses = wb_stand(fake, scenario)
+
+    assert [response.status for response in responses] == [200] * 5
+    assert fake.requests > 5
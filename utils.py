@@ -1,31 +1,158 @@
+import asyncio
+import contextlib
 import json
 import logging
+import os
+import tempfile
+import time
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,  # Change to DEBUG
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler()],
-)
+from instrumentation import STAGE_SECONDS
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: межпроцессных блокировок нет, бот работает в одном процессе
+    fcntl = None
 
 # Пути к файлам конфигурации
 CONFIG_FILE = "config.json"
+# Как часто проверять блокировку файла, занятую другим процессом, секунды
+FILE_LOCK_POLL = 0.05
 
 
-def save_config(data):
-    with open(CONFIG_FILE, "w") as file_without_prefix:
-        json.dump(data, file_without_prefix, indent=4)
-
-    logging.info("Конфигурация сохранена в обоих форматах.")
-
-
-def load_config(with_prefix=True):
+def read_json(path, default):
     try:
-        file_path = CONFIG_FILE
-        with open(file_path, "r") as file:
+        with open(path, "r") as file:
             data = json.load(file)
-            logging.info(f"Конфигурация загружена из {file_path}: {data}")
-            return data
     except FileNotFoundError:
-        logging.error(f"Файл {file_path} не найден.")
-        return {}
+        logging.error("Файл %s не найден.", path)
+        return default
+    except json.JSONDecodeError as e:
+        logging.error("Файл %s повреждён: %s", path, e)
+        return default
+    return data if isinstance(data, type(default)) else default
+
+
+def write_json_atomic(path, data):
+    """Записывает JSON во временный файл и атомарно подменяет им исходный"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump(data, file, indent=4, ensure_ascii=False)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@contextlib.asynccontextmanager
+async def file_lock(path):
+    """Межпроцессная блокировка: flock на файле ``path + ".lock"``.
+
+    Пока блокировку держит другой процесс бота, она проверяется каждые
+    FILE_LOCK_POLL секунд: ожидание не занимает поток и прерывается отменой
+    задачи. Блокировка снимается при закрытии файла, в том числе если
+    процесс упал.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", "a") as file:
+        while True:
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(FILE_LOCK_POLL)
+        yield
+
+
+class ShopRegistry:
+    """Магазины (имя -> API ключ), загруженные из config.json в память.
+
+    Файл перечитывается, только если изменилось его время модификации, и
+    проверяется это не чаще раза в ``check_interval`` секунд, так что чтение
+    на горячем пути — это обращение к словарю. Изменение перечитывает файл и
+    записывает его атомарно под file_lock, чтобы параллельные /addshop, в
+    том числе в разных процессах бота, не затирали друг друга.
+    """
+
+    def __init__(self, path=CONFIG_FILE, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._shops = {}
+        self._mtime = None
+        self._checked_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    def _refresh(self, force=False):
+        # force — перечитать файл, даже если время модификации не изменилось:
+        # запись другого процесса могла попасть в тот же тик часов
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime and not force:
+            return
+
+        with STAGE_SECONDS.time("config_reload"):
+            self._shops = read_json(self.path, {}) if mtime is not None else {}
+        self._mtime = mtime
+        logging.info(
+            "Конфигурация загружена из %s: %s магазинов", self.path, len(self._shops)
+        )
+
+    def get(self, name):
+        self._refresh()
+        return self._shops.get(name)
+
+    def names(self):
+        self._refresh()
+        return list(self._shops)
+
+    def items(self):
+        self._refresh()
+        return list(self._shops.items())
+
+    def __contains__(self, name):
+        self._refresh()
+        return name in self._shops
+
+    def __len__(self):
+        self._refresh()
+        return len(self._shops)
+
+    async def add(self, name, api_key):
+        async with self._lock, file_lock(self.path):
+            self._refresh(force=True)
+            shops = dict(self._shops)
+            shops[name] = api_key
+            await self._save(shops)
+
+    async def remove(self, name):
+        """Удаляет магазин и возвращает его API ключ (или None)"""
+        async with self._lock, file_lock(self.path):
+            self._refresh(force=True)
+            if name not in self._shops:
+                return None
+            shops = dict(self._shops)
+            api_key = shops.pop(name)
+            await self._save(shops)
+            return api_key
+
+    async def _save(self, shops):
+        await asyncio.to_thread(write_json_atomic, self.path, shops)
+        self._shops = shops
+        self._mtime = os.stat(self.path).st_mtime_ns
+        logging.info("Конфигурация сохранена.")
+
+
+shops = ShopRegistry()
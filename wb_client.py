@@ -0,0 +1,151 @@
+import asyncio
+import contextlib
+import logging
+import random
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+import aiohttp
+from decouple import config
+
+from errors import RateLimitError
+from instrumentation import RATE_LIMIT_WAIT_SECONDS, UPSTREAM_SECONDS
+from rate_limit import retry_after_from_headers
+
+# Параметры пула соединений и повторов запросов к API Wildberries
+# Ответы читаются потоково, поэтому таймаут ограничивает ожидание очередной
+# порции данных, а не загрузку всего (возможно, очень большого) ответа
+REQUEST_TIMEOUT = config("WB_REQUEST_TIMEOUT", default=30, cast=float)
+CONNECT_TIMEOUT = config("WB_CONNECT_TIMEOUT", default=5, cast=float)
+POOL_SIZE = config("WB_POOL_SIZE", default=100, cast=int)
+KEEPALIVE_TIMEOUT = config("WB_KEEPALIVE_TIMEOUT", default=60, cast=float)
+MAX_RETRIES = config("WB_MAX_RETRIES", default=3, cast=int)
+BACKOFF_BASE = config("WB_BACKOFF_BASE", default=0.5, cast=float)
+BACKOFF_MAX = config("WB_BACKOFF_MAX", default=10, cast=float)
+# Сколько максимум ждать своей очереди в лимите запросов API ключа
+RATE_LIMIT_MAX_WAIT = config("WB_RATE_LIMIT_MAX_WAIT", default=90, cast=float)
+
+# Размер фрагмента при потоковом чтении тела ответа
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Статусы, при которых запрос имеет смысл повторить (429 обрабатывается отдельно)
+RETRY_STATUSES = {500, 502, 503, 504}
+
+WBResponse = namedtuple("WBResponse", ["status", "headers", "body"])
+
+_session = None
+
+
+def get_session():
+    """Общая сессия aiohttp с пулом keep-alive соединений"""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=POOL_SIZE,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(
+                total=None, connect=CONNECT_TIMEOUT, sock_read=REQUEST_TIMEOUT
+            ),
+        )
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def backoff_delay(attempt):
+    # Экспоненциальная задержка с джиттером
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2**attempt))
+    return random.uniform(0, delay)
+
+
+async def get(url, api_key, params=None, limiter=None, retries=MAX_RETRIES):
+    """GET-запрос с авторизацией по API ключу и повторами при сбоях"""
+    async with stream(url, api_key, params, limiter, retries) as response:
+        body = await response.read()
+        return WBResponse(response.status, response.headers, body)
+
+
+async def wait_for_token(limiter, api_key, endpoint):
+    try:
+        waited = await asyncio.wait_for(
+            limiter.acquire(api_key), RATE_LIMIT_MAX_WAIT
+        )
+    except asyncio.TimeoutError:
+        raise RateLimitError(await limiter.bucket(api_key).delay()) from None
+    RATE_LIMIT_WAIT_SECONDS.observe(waited, endpoint)
+
+
+@contextlib.asynccontextmanager
+async def stream(url, api_key, params=None, limiter=None, retries=MAX_RETRIES):
+    """GET-запрос, тело которого читается потоково через ``response.content``.
+
+    Если передан ``limiter``, перед каждой попыткой берётся токен из корзины
+    API ключа, а заголовки X-Ratelimit-* и ответ 429 (Retry-After) сдвигают
+    следующую попытку. Повторы выполняются только до начала чтения тела: при
+    сетевой ошибке, 429 или статусе из RETRY_STATUSES.
+    """
+    headers = {"Authorization": f"Bearer {api_key}"}
+    endpoint = urlsplit(url).path
+
+    attempt = 0
+    while True:
+        delay = backoff_delay(attempt)
+        if limiter is not None:
+            await wait_for_token(limiter, api_key, endpoint)
+        started = time.perf_counter()
+        try:
+            response = await get_session().get(url, headers=headers, params=params)
+            UPSTREAM_SECONDS.observe(
+                time.perf_counter() - started, endpoint, response.status
+            )
+            if limiter is not None:
+                await limiter.bucket(api_key).update_from_headers(response.headers)
+
+            if response.status == 429 and attempt < retries:
+                retry_after = retry_after_from_headers(response.headers)
+                if limiter is not None:
+                    # Паузу выдержит корзина токенов перед следующей попыткой
+                    await limiter.throttle(api_key, retry_after)
+                    delay = 0
+                elif retry_after is not None:
+                    delay += retry_after
+            elif response.status not in RETRY_STATUSES or attempt >= retries:
+                break
+
+            response.release()
+            logging.warning(
+                "Статус %s от %s, повтор %s/%s",
+                response.status,
+                url,
+                attempt + 1,
+                retries,
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - started, endpoint, "error")
+            if attempt >= retries:
+                raise
+            logging.warning(
+                "Ошибка запроса к %s: %r, повтор %s/%s", url, e, attempt + 1, retries
+            )
+
+        await asyncio.sleep(delay)
+        attempt += 1
+
+    try:
+        yield response
+    finally:
+        response.release()
+
+
+def iter_body(response):
+    return response.content.iter_chunked(STREAM_CHUNK_SIZE)
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import multiprocessing
+import signal
+import sys
+
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from decouple import config
+
+# Способ получения апдейтов: polling или webhook
+BOT_MODE = config("BOT_MODE", default="polling")
+# Публичный адрес, на который Telegram будет присылать апдейты
+WEBHOOK_URL = config("WEBHOOK_URL", default="")
+WEBHOOK_PATH = config("WEBHOOK_PATH", default="/webhook")
+# Секрет из заголовка X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = config("WEBHOOK_SECRET", default="")
+WEBHOOK_HOST = config("WEBHOOK_HOST", default="0.0.0.0")
+WEBHOOK_PORT = config("WEBHOOK_PORT", default=8080, cast=int)
+# Число процессов, принимающих апдейты на одном порту (SO_REUSEPORT)
+WEBHOOK_WORKERS = config("WEBHOOK_WORKERS", default=1, cast=int)
+
+
+async def serve_webhook(dispatcher, bot, worker=0):
+    """Принимает апдейты по HTTP до SIGTERM или отмены.
+
+    Секретный токен проверяет SimpleRequestHandler (чужие запросы получают
+    401), апдейт обрабатывается в фоне, а Telegram сразу получает ответ.
+    Вебхук регистрирует только первый процесс.
+    """
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("Для режима webhook задайте WEBHOOK_SECRET")
+
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dispatcher, bot=bot, secret_token=WEBHOOK_SECRET
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dispatcher, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(
+        runner, WEBHOOK_HOST, WEBHOOK_PORT, reuse_port=WEBHOOK_WORKERS > 1
+    )
+    await site.start()
+    logging.info(
+        "Процесс %s: приём апдейтов на %s:%s%s",
+        worker,
+        WEBHOOK_HOST,
+        WEBHOOK_PORT,
+        WEBHOOK_PATH,
+    )
+
+    stopped = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+    try:
+        if worker == 0:
+            await bot.set_webhook(
+                f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=dispatcher.resolve_used_update_types(),
+                drop_pending_updates=True,
+            )
+        await stopped.wait()
+    finally:
+        await runner.cleanup()
+
+
+def run_workers(target, count=WEBHOOK_WORKERS):
+    """Запускает ``target(номер процесса)`` в ``count`` процессах и ждёт их.
+
+    Процессы слушают один порт, и ядро распределяет соединения между ними.
+    При SIGTERM главного процесса рабочие получают SIGTERM и завершаются.
+    """
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=target, args=(worker,), name=f"webhook-{worker}")
+        for worker in range(count)
+    ]
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    for process in workers:
+        process.start()
+    try:
+        for process in workers:
+            process.join()
+    finally:
+        for process in workers:
+            if process.is_alive():
+                process.terminate()
+        for process in workers:
+            process.join()
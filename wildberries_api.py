@@ -1,168 +1,661 @@
-import requests
-import logging
+import asyncio
 import datetime
 import logging
-import requests
+import math
+import time
+from itertools import repeat
+
+import aiohttp
+from decouple import config
+
+import wb_client
+from instrumentation import STAGE_SECONDS, registry
+from json_stream import iter_batches, iter_json_array
+from logging_setup import brief
+from metrics import DailyRollups, Totals, aggregate
+from report_cache import ReportCache
+from sales_store import SalesStore
+from errors import (
+    InvalidApiKeyError,
+    InvalidDateError,
+    InvalidResponseError,
+    RateLimitError,
+    UpstreamConnectionError,
+    UpstreamError,
+    WildberriesError,
+)
+from rate_limit import BucketStore, RateLimiter, retry_after_from_headers
+from singleflight import SingleFlight
+
+# Базовые адреса API (можно переопределить, например, для локального стенда)
+COMMON_API_URL = config(
+    "WB_COMMON_API_URL", default="https://common-api.wildberries.ru"
+)
+STATISTICS_API_URL = config(
+    "WB_STATISTICS_API_URL", default="https://statistics-api.wildberries.ru"
+)
+
+# Кэш отчётов: закрытые периоды не меняются, текущий день живёт недолго
+REPORT_CACHE_MAX_BYTES = config(
+    "REPORT_CACHE_MAX_BYTES", default=256 * 1024 * 1024, cast=int
+)
+REPORT_CACHE_OPEN_TTL = config("REPORT_CACHE_OPEN_TTL", default=60, cast=float)
+REPORT_CACHE_CLOSED_TTL = config(
+    "REPORT_CACHE_CLOSED_TTL", default=24 * 60 * 60, cast=float
+)
+
+report_cache = ReportCache(REPORT_CACHE_MAX_BYTES)
+report_flight = SingleFlight()
+# Ход идущих задач report_flight: ключ задачи -> SyncProgress
+_flight_progress = {}
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[logging.StreamHandler()],
+# Локальное хранилище продаж и параметры инкрементальной синхронизации
+SALES_STORE_FILE = config("SALES_STORE_FILE", default="sales.db")
+# Фоновое обновление стандартных периодов, секунды (0 — выключено)
+PREFETCH_INTERVAL = config("PREFETCH_INTERVAL", default=300, cast=float)
+# Насколько старыми могут быть локальные данные, прежде чем запрос
+# пользователя вызовет синхронизацию. Пока идёт фоновое обновление, данные
+# освежает оно, а возраст данных показывается в отчёте.
+SALES_SYNC_MIN_INTERVAL = config(
+    "SALES_SYNC_MIN_INTERVAL",
+    default=2 * PREFETCH_INTERVAL if PREFETCH_INTERVAL else 60,
+    cast=float,
 )
+# Максимум строк, который statistics-api отдаёт за один запрос
+SALES_PAGE_LIMIT = 80000
+# Сколько строк потокового ответа сохранять за одну транзакцию
+SALES_INGEST_BATCH = 5000
+# Первичная загрузка длинного периода идёт по дням (flag=1) параллельно, если
+# лимит запросов ключа позволяет сделать столько запросов без долгого ожидания
+SALES_CHUNK_MIN_DAYS = config("SALES_CHUNK_MIN_DAYS", default=14, cast=int)
+SALES_CHUNK_CONCURRENCY = config("SALES_CHUNK_CONCURRENCY", default=4, cast=int)
+SALES_CHUNK_RETRIES = config("SALES_CHUNK_RETRIES", default=2, cast=int)
+# Запас для точки синхронизации после загрузки по дням: изменения, сделанные
+# во время загрузки, будут запрошены ещё раз
+SALES_CHUNK_CURSOR_MARGIN = 5 * 60
+
+sales_store = SalesStore(SALES_STORE_FILE)
+# Префиксные суммы дневных итогов: API ключ -> (synced_at, DailyRollups)
+_rollups = {}
 
+# Сколько магазинов загружать одновременно для сводного отчёта
+MULTI_SHOP_CONCURRENCY = config("MULTI_SHOP_CONCURRENCY", default=8, cast=int)
+
+# Лимиты запросов на один API ключ (по документации Wildberries)
+STATISTICS_RATE_PER_MINUTE = config(
+    "WB_STATISTICS_RATE_PER_MINUTE", default=1, cast=float
+)
+STATISTICS_BURST = config("WB_STATISTICS_BURST", default=1, cast=int)
+PING_RATE_PER_MINUTE = config("WB_PING_RATE_PER_MINUTE", default=6, cast=float)
+PING_BURST = config("WB_PING_BURST", default=3, cast=int)
+
+# Корзины лимитов хранятся в SQLite, чтобы процессы webhook делили один лимит
+# ключа на всех
+RATE_LIMIT_STORE_FILE = config("RATE_LIMIT_STORE_FILE", default="rate_limit.db")
+
+rate_limit_store = BucketStore(RATE_LIMIT_STORE_FILE)
+statistics_limiter = RateLimiter(
+    STATISTICS_RATE_PER_MINUTE / 60,
+    STATISTICS_BURST,
+    store=rate_limit_store,
+    name="statistics",
+)
+ping_limiter = RateLimiter(
+    PING_RATE_PER_MINUTE / 60, PING_BURST, store=rate_limit_store, name="ping"
+)
 
-def validate_api_key(api_key):
-    url = "https://common-api.wildberries.ru/ping"
-    headers = {"Authorization": f"Bearer {api_key}"}
+registry.register_stats("report_cache", report_cache.stats)
+registry.register_stats("report_flight", report_flight.stats)
+registry.register_stats("statistics_rate_limit", statistics_limiter.stats)
+registry.register_stats("ping_rate_limit", ping_limiter.stats)
+
+
+class SyncProgress:
+    """Ход загрузки продаж: для сообщения о прогрессе построения отчёта"""
+
+    __slots__ = ("rows", "days_done", "days_total", "_followers")
+
+    def __init__(self):
+        self.rows = 0
+        self.days_done = 0
+        self.days_total = 0
+        self._followers = []
+
+    def add(self, rows=0, days_done=0, days_total=0):
+        self.rows += rows
+        self.days_done += days_done
+        self.days_total += days_total
+        for progress in self._followers:
+            progress.add(rows, days_done, days_total)
+
+    def attach(self, progress):
+        """Дальнейший ход этой загрузки отражается и в ``progress``"""
+        progress.add(self.rows, self.days_done, self.days_total)
+        self._followers.append(progress)
+
+    def describe(self):
+        text = f"загружено продаж: {self.rows}"
+        if self.days_total:
+            text = f"дней {self.days_done} из {self.days_total}, {text}"
+        return text
+
+
+async def validate_api_key(api_key):
+    """Проверяет API ключ через /ping.
+
+    При исчерпании лимита запросов выбрасывает RateLimitError, чтобы не
+    выдавать рабочий ключ за неверный.
+    """
+    url = f"{COMMON_API_URL}/ping"
     try:
-        response = requests.get(url, headers=headers)
+        response = await wb_client.get(url, api_key, limiter=ping_limiter)
 
-        if response.status_code == 200:
+        if response.status == 200:
             logging.info("API ключ валиден")
             return True
-        elif response.status_code == 401:
+        elif response.status == 401:
             # Неверный API ключ
             logging.error("Неверный API ключ: Статус 401")
             return False
+        elif response.status == 429:
+            logging.error("Превышен лимит запросов к /ping: Статус 429")
+            raise RateLimitError(retry_after_from_headers(response.headers))
         else:
             # Обработка других ошибок
             logging.error(
-                f"Ошибка: Статус {response.status_code}, Тело ответа: {response.text}"
+                "Ошибка: Статус %s, Тело ответа: %s",
+                response.status,
+                brief(response.body.decode(errors="replace")),
             )
             return False
-    except requests.RequestException as e:
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
         # Ошибка подключения
-        logging.error(f"Ошибка подключения: {e}")
+        logging.error("Ошибка подключения: %s", e)
         return False
 
 
-def get_sales_report(api_key, period=None, date_start=None, date_end=None):
-    url = "https://statistics-api.wildberries.ru/api/v1/supplier/sales"
-    headers = {"Authorization": f"Bearer {api_key}"}
-    params = {}
+def resolve_period(period, date_start=None, date_end=None):
+    """Возвращает (dateFrom, dateTo) для периода отчёта или None"""
+    today = datetime.date.today()
 
-    # Обработка параметров периода
     if period == "today":
-        params["dateFrom"] = datetime.datetime.now().strftime("%Y-%m-%d")
-        params["dateTo"] = datetime.datetime.now().strftime("%Y-%m-%d")
+        return today.isoformat(), today.isoformat()
     elif period == "yesterday":
-        params["dateFrom"] = (
-            datetime.datetime.now() - datetime.timedelta(days=1)
-        ).strftime("%Y-%m-%d")
-        params["dateTo"] = (
-            datetime.datetime.now() - datetime.timedelta(days=1)
-        ).strftime("%Y-%m-%d")
+        yesterday = today - datetime.timedelta(days=1)
+        return yesterday.isoformat(), yesterday.isoformat()
     elif period == "last_7_days":
-        params["dateFrom"] = (
-            datetime.datetime.now() - datetime.timedelta(days=7)
-        ).strftime("%Y-%m-%d")
-        params["dateTo"] = datetime.datetime.now().strftime("%Y-%m-%d")
+        return (today - datetime.timedelta(days=7)).isoformat(), today.isoformat()
     elif period == "custom" and date_start and date_end:
-        params["dateFrom"] = date_start
-        params["dateTo"] = date_end
+        # Хранилище и дневные сводки сравнивают даты как строки YYYY-MM-DD
+        return parse_date(date_start), parse_date(date_end)
+    return None
+
+
+def parse_date(text):
+    """Дата, введённая пользователем, в виде YYYY-MM-DD.
+
+    Любая запись, которую принимает date.fromisoformat (например,
+    20240105), приводится к YYYY-MM-DD; не дата — InvalidDateError.
+    """
+    try:
+        return datetime.date.fromisoformat((text or "").strip()).isoformat()
+    except ValueError:
+        raise InvalidDateError(text) from None
+
+
+def report_ttl(date_to):
+    # Период, полностью лежащий в прошлом, уже не изменится
+    if date_to < datetime.date.today().isoformat():
+        return REPORT_CACHE_CLOSED_TTL
+    return REPORT_CACHE_OPEN_TTL
+
+
+async def invalidate_shop(api_key):
+    """Сбрасывает закэшированные отчёты и локальные продажи магазина.
+
+    Идущая синхронизация магазина сначала завершается, иначе она записала
+    бы продажи удалённого магазина уже после очистки.
+    """
+    async with sales_store.sync_lock(api_key):
+        await sales_store.apurge(api_key)
+        report_cache.invalidate_api_key(api_key)
+        _rollups.pop(api_key, None)
+    await statistics_limiter.forget(api_key)
+
+
+async def fetch_sales(api_key, date_from, flag=0, progress=None):
+    """Потоково загружает в хранилище продажи, изменённые начиная с date_from.
+
+    С ``flag=1`` загружаются все продажи за день date_from. Строки
+    разбираются по мере чтения ответа и сохраняются пачками, так что весь
+    ответ (до 80 тыс. строк) в памяти не собирается. Сохранённые строки
+    учитываются в ``progress`` (SyncProgress), если он передан.
+    Возвращает (число строк, max lastChangeDate); при ошибке выбрасывает
+    WildberriesError.
+    """
+    url = f"{STATISTICS_API_URL}/api/v1/supplier/sales"
+    params = {"dateFrom": date_from, "flag": flag}
+
+    try:
+        # Отправка запроса к API с параметрами
+        async with wb_client.stream(
+            url, api_key, params=params, limiter=statistics_limiter
+        ) as response:
+            if response.status == 200:
+                count, last_change = 0, None
+                rows = iter_json_array(wb_client.iter_body(response))
+                async for batch in iter_batches(rows, SALES_INGEST_BATCH):
+                    with STAGE_SECONDS.time("store_write"):
+                        changed = await sales_store.aupsert(api_key, batch)
+                    count += len(batch)
+                    if progress is not None:
+                        progress.add(rows=len(batch))
+                    if changed and (last_change is None or changed > last_change):
+                        last_change = changed
+
+                logging.info("Получено строк продаж: %s", count)
+                return count, last_change
+
+            elif response.status == 401:
+                # Неверный API ключ
+                logging.error("Неверный API ключ: Статус 401")
+                raise InvalidApiKeyError()
+            elif response.status == 429:
+                logging.error("Превышен лимит запросов: Статус 429")
+                raise RateLimitError(retry_after_from_headers(response.headers))
+            else:
+                # Ошибка получения данных
+                logging.error(
+                    "Ошибка при получении отчета: Статус %s, Тело ответа: %s",
+                    response.status,
+                    brief(await response.text()),
+                )
+                raise UpstreamError(response.status)
+
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        # Ошибка подключения
+        logging.error("Ошибка подключения: %r", e)
+        raise UpstreamConnectionError(e) from e
+
+    except ValueError as e:
+        logging.error("Некорректный ответ API: %s", e)
+        raise InvalidResponseError(e) from e
+
+
+async def sync_sales(api_key, date_from, max_age=None, progress=None):
+    """Догружает в локальное хранилище продажи, изменённые с прошлой синхронизации.
+
+    Если период уже загружен и синхронизация была не раньше ``max_age``
+    секунд назад (по умолчанию SALES_SYNC_MIN_INTERVAL), запрос к API не
+    выполняется. При ошибке API выбрасывает WildberriesError.
+    """
+    if max_age is None:
+        max_age = SALES_SYNC_MIN_INTERVAL
+
+    async with sales_store.sync_lock(api_key):
+        state = await sales_store.aget_state(api_key)
+
+        if state is not None and state.covers(date_from):
+            if time.time() - state.synced_at < max_age:
+                return
+            # Запрашиваем только изменения с последней точки синхронизации
+            synced_from = state.synced_from
+            cursor = state.cursor or state.synced_from
+        elif use_chunks(date_from, state):
+            # Недостающие дни загружаются параллельно, затем изменения
+            # уже загруженного — от прежней точки синхронизации
+            synced_from = date_from
+            cursor = await fetch_sales_chunked(api_key, date_from, state, progress)
+        else:
+            # Первая загрузка или расширение периода в прошлое
+            synced_from, cursor = date_from, date_from
+
+        since = cursor
+        with STAGE_SECONDS.time("sync"):
+            while True:
+                count, last_change = await fetch_sales(api_key, since, 0, progress)
+                if last_change and (cursor is None or last_change > cursor):
+                    cursor = last_change
+
+                # Ответ упёрся в лимит строк — продолжаем с последнего
+                # lastChangeDate
+                if count < SALES_PAGE_LIMIT or not last_change:
+                    break
+                if last_change == since:
+                    break
+                since = last_change
+
+        if state is not None and state.cursor and state.cursor > cursor:
+            cursor = state.cursor
+        await sales_store.aset_state(api_key, synced_from, cursor)
+
+
+def missing_days(date_from, state):
+    """Дни от date_from, которых ещё нет в хранилище"""
+    first = datetime.date.fromisoformat(date_from[:10])
+    if state is None:
+        last = datetime.date.today()
     else:
+        last = datetime.date.fromisoformat(state.synced_from[:10])
+        last -= datetime.timedelta(days=1)
+    return [
+        (first + datetime.timedelta(days=offset)).isoformat()
+        for offset in range((last - first).days + 1)
+    ]
+
+
+def use_chunks(date_from, state):
+    # Загрузка по дням выгодна, только если лимит ключа даёт сделать эти
+    # запросы быстро; иначе один постраничный запрос flag=0 дешевле
+    days = len(missing_days(date_from, state))
+    return days >= SALES_CHUNK_MIN_DAYS and days <= statistics_limiter.budget(
+        wb_client.RATE_LIMIT_MAX_WAIT
+    )
+
+
+async def fetch_sales_chunked(api_key, date_from, state, progress=None):
+    """Загружает недостающие дни параллельными запросами flag=1.
+
+    Неудачный день повторяется отдельно (до SALES_CHUNK_RETRIES раз), не
+    затрагивая остальные; дубликаты между днями схлопываются в хранилище по
+    srid. Возвращает точку синхронизации для следующих запросов изменений.
+    """
+    semaphore = asyncio.Semaphore(SALES_CHUNK_CONCURRENCY)
+    started = time.monotonic()
+
+    async def fetch_day(day):
+        for attempt in range(SALES_CHUNK_RETRIES + 1):
+            try:
+                async with semaphore:
+                    _, last_change = await fetch_sales(api_key, day, 1, progress)
+                if progress is not None:
+                    progress.add(days_done=1)
+                return last_change
+            except InvalidApiKeyError:
+                raise
+            except WildberriesError as e:
+                if attempt >= SALES_CHUNK_RETRIES:
+                    raise
+                logging.warning("Повтор загрузки продаж за %s: %s", day, e)
+
+    days = missing_days(date_from, state)
+    logging.info("Загрузка продаж по дням: %s — %s", days[0], days[-1])
+    if progress is not None:
+        progress.add(days_total=len(days))
+    tasks = [asyncio.ensure_future(fetch_day(day)) for day in days]
+    try:
+        with STAGE_SECONDS.time("sync"):
+            changes = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    if state is not None:
+        # Изменения в уже загруженных днях запросим от прежней точки
+        return state.cursor or state.synced_from
+    last_change = max(filter(None, changes), default=None)
+    if last_change is None:
+        return date_from
+    # Изменения, сделанные пока шла загрузка, могли попасть не во все дни
+    margin = time.monotonic() - started + SALES_CHUNK_CURSOR_MARGIN
+    cursor = datetime.datetime.fromisoformat(last_change) - datetime.timedelta(
+        seconds=margin
+    )
+    return max(cursor.isoformat(), date_from)
+
+
+async def get_sales_report(
+    api_key, period=None, date_start=None, date_end=None, progress=None
+):
+    """Продажи магазина за период: список SaleRecord или None, если данных нет.
+
+    Ошибки API выбрасываются как WildberriesError.
+    """
+    # Обработка параметров периода
+    window = resolve_period(period, date_start, date_end)
+    if window is None:
         logging.error(
             "Неверный параметр периода или отсутствуют даты для периода 'custom'"
         )
         return None
+    date_from, date_to = window
+
+    cache_key = (api_key, date_from, date_to)
+    cached = report_cache.get(cache_key)
+    if cached is not None:
+        logging.info("Отчет за %s — %s взят из кэша", date_from, date_to)
+        return cached
+
+    # Одинаковые одновременные запросы ждут одну общую загрузку
+    return await _shared_call(
+        cache_key, load_report, api_key, date_from, date_to, progress=progress
+    )
+
 
+async def _shared_call(key, func, *args, progress=None):
+    """``func(*args, progress)`` через report_flight: одинаковые одновременные
+    вызовы ждут одну общую задачу и видят её ход в своём ``progress``"""
+    shared = _flight_progress.get(key)
+    if shared is None:
+        shared = _flight_progress[key] = SyncProgress()
+    if progress is not None:
+        shared.attach(progress)
     try:
-        # Отправка запроса к API с параметрами
-        response = requests.get(url, headers=headers, params=params)
+        return await report_flight.do(key, func, *args, shared)
+    finally:
+        if key not in report_flight:
+            _flight_progress.pop(key, None)
 
-        if response.status_code == 200:
-            data = response.json()
 
-            # Проверка на пустые данные
-            if not data:
-                logging.error("Полученные данные пустые.")
-                return None
+async def get_sales_totals(
+    api_key, period=None, date_start=None, date_end=None, progress=None
+):
+    """Итоги продаж за период (Totals) или None, если продаж нет.
 
-            # Возвращаем данные в нужном формате
-            logging.info(f"Отчет успешно получен: {data}")
-            return data  # Возвращаем список, если данные корректны
+    Итоги берутся из дневных сводок хранилища: строки продаж не читаются,
+    а за уже закончившийся и загруженный период нет и запроса к API.
+    Ошибки API выбрасываются как WildberriesError.
+    """
+    window = resolve_period(period, date_start, date_end)
+    if window is None:
+        logging.error(
+            "Неверный параметр периода или отсутствуют даты для периода 'custom'"
+        )
+        return None
+    date_from, date_to = window
 
-        elif response.status_code == 401:
-            # Неверный API ключ
-            logging.error("Неверный API ключ: Статус 401")
-            return "Неверный API ключ"
-        else:
-            # Ошибка получения данных
-            logging.error(
-                f"Ошибка при получении отчета: Статус {response.status_code}, Тело ответа: {response.text}"
+    rollups = await sync_rollups(api_key, date_from, date_to, progress)
+    totals = rollups.totals(date_from, date_to)
+    return totals if totals.count else None
+
+
+async def get_sales_comparison(
+    api_key, period=None, date_start=None, date_end=None, progress=None
+):
+    """Итоги за период и за такой же по длине период перед ним.
+
+    Оба окна закрываются одной синхронизацией и считаются по дневным
+    сводкам, так что из API догружаются только дни, которых ещё нет в
+    хранилище. Возвращает ((dateFrom, dateTo), текущие Totals, прошлые
+    Totals) или None, если период не распознан.
+    """
+    window = resolve_period(period, date_start, date_end)
+    if window is None:
+        logging.error(
+            "Неверный параметр периода или отсутствуют даты для периода 'custom'"
+        )
+        return None
+    date_from, date_to = window
+    previous_from, previous_to = previous_window(date_from, date_to)
+
+    rollups = await sync_rollups(api_key, previous_from, date_to, progress)
+    return (
+        (date_from, date_to),
+        rollups.totals(date_from, date_to),
+        rollups.totals(previous_from, previous_to),
+    )
+
+
+def previous_window(date_from, date_to):
+    """Период той же длины, заканчивающийся накануне date_from"""
+    first = datetime.date.fromisoformat(date_from[:10])
+    length = datetime.date.fromisoformat(date_to[:10]) - first
+    day = datetime.timedelta(days=1)
+    return (first - length - day).isoformat(), (first - day).isoformat()
+
+
+async def sync_rollups(api_key, date_from, date_to, progress=None):
+    """Синхронизирует магазин, если нужно, и возвращает его префиксные суммы"""
+    await sync_window(api_key, date_from, date_to, progress)
+
+    with STAGE_SECONDS.time("rollup"):
+        return await load_rollups(api_key)
+
+
+async def sync_window(api_key, date_from, date_to, progress=None):
+    """Готовит в хранилище продажи за период; закончившийся и уже загруженный
+    период не синхронизируется повторно. Одинаковые одновременные вызовы
+    ждут одну синхронизацию."""
+    key = ("sync", api_key, date_from, date_to)
+    await _shared_call(
+        key, _sync_window, api_key, date_from, date_to, progress=progress
+    )
+
+
+async def _sync_window(api_key, date_from, date_to, progress=None):
+    state = await sales_store.aget_state(api_key)
+    max_age = None
+    if state is not None and state.covers(date_from) and period_closed(date_to, state):
+        max_age = math.inf
+    await sync_sales(api_key, date_from, max_age, progress)
+
+
+def period_closed(date_to, state):
+    # Синхронизация после окончания периода уже видела все его продажи
+    day_after = datetime.date.fromisoformat(date_to[:10]) + datetime.timedelta(days=1)
+    ended_at = datetime.datetime.combine(day_after, datetime.time()).timestamp()
+    return state.synced_at >= ended_at
+
+
+async def load_rollups(api_key):
+    """Префиксные суммы магазина; пересчитываются после каждой синхронизации"""
+    state = await sales_store.aget_state(api_key)
+    synced_at = state.synced_at if state is not None else None
+    cached = _rollups.get(api_key)
+    if cached is not None and cached[0] == synced_at:
+        return cached[1]
+
+    rows = await sales_store.adaily(api_key)
+    rollups = DailyRollups([row[0] for row in rows], [row[1:] for row in rows])
+    _rollups[api_key] = (synced_at, rollups)
+    return rollups
+
+
+async def load_report(api_key, date_from, date_to, progress=None):
+    await sync_sales(api_key, date_from, progress=progress)
+    return await read_report(api_key, date_from, date_to)
+
+
+async def read_report(api_key, date_from, date_to):
+    # Отчёт собирается из локального хранилища
+    with STAGE_SECONDS.time("store_read"):
+        data = await sales_store.awindow(api_key, date_from, date_to)
+
+    # Проверка на пустые данные
+    if not data:
+        logging.error("Полученные данные пустые.")
+        return None
+
+    logging.info("Отчет успешно получен: %s строк", len(data))
+    report_cache.put((api_key, date_from, date_to), data, report_ttl(date_to))
+    return data  # Возвращаем список, если данные корректны
+
+
+async def refresh_reports(api_key, periods, max_age=0):
+    """Синхронизирует магазин одним запросом и пересчитывает его дневные сводки.
+
+    Загружаются и периоды той же длины перед ``periods``, так что сравнение
+    с прошлым периодом тоже не требует запроса к API. Отчёты за периоды
+    строятся по сводкам, так что строки продаж в кэш отчётов не читаются.
+    """
+    windows = [resolve_period(period) for period in periods]
+    date_from = min(previous_window(*window)[0] for window in windows)
+    await sync_sales(api_key, date_from, max_age)
+    with STAGE_SECONDS.time("rollup"):
+        await load_rollups(api_key)
+
+
+async def last_synced(api_key):
+    """Время последней синхронизации магазина (datetime) или None"""
+    state = await sales_store.aget_state(api_key)
+    if state is None:
+        return None
+    return datetime.datetime.fromtimestamp(state.synced_at)
+
+
+async def get_shops_totals(
+    shop_keys, period, date_start=None, date_end=None, progress=None
+):
+    """Итоги продаж по нескольким магазинам, загруженные параллельно.
+
+    ``shop_keys`` — словарь имя магазина -> API ключ. Одновременно
+    загружается не больше MULTI_SHOP_CONCURRENCY магазинов, так что общее
+    время близко ко времени самого медленного магазина.
+    Возвращает (итоги по магазинам, общий итог); для магазина, отчёт которого
+    получить не удалось, вместо итогов хранится исключение.
+    """
+    semaphore = asyncio.Semaphore(MULTI_SHOP_CONCURRENCY)
+
+    async def shop_totals(api_key):
+        async with semaphore:
+            totals = await get_sales_totals(
+                api_key, period, date_start, date_end, progress
             )
-            return f"Ошибка получения данных: Статус {response.status_code}"
+        return totals or Totals()
 
-    except requests.RequestException as e:
-        # Ошибка подключения
-        logging.error(f"Ошибка подключения: {e}")
-        return f"Ошибка подключения: {e}"
+    results = await asyncio.gather(
+        *(shop_totals(api_key) for api_key in shop_keys.values()),
+        return_exceptions=True,
+    )
+
+    per_shop = dict(zip(shop_keys, results))
+    overall = Totals()
+    for name, result in per_shop.items():
+        if isinstance(result, Exception):
+            logging.error(
+                "Ошибка при получении отчета для магазина %s: %s", name, result
+            )
+        else:
+            overall.merge(result)
+    return per_shop, overall
 
 
 def calculate_key_metrics(data):
     try:
         # Проверка типа данных
         if not isinstance(data, list):
-            logging.error(f"Ожидался список, но получено: {type(data)}")
+            logging.error("Ожидался список, но получено: %s", type(data))
             return None
 
         # Проверка типа каждого элемента в списке
-        for item in data:
-            if not isinstance(item, dict):
-                logging.error(f"Ожидался словарь, но получено: {type(item)}")
-                return None
-
-            # Проверка наличия необходимых ключей в каждом элементе
-            required_keys = [
-                "totalPrice",
-                "discountPercent",
-                "spp",
-                "paymentSaleAmount",
-                "forPay",
-                "finishedPrice",
-                "priceWithDisc",
-            ]
-            missing_keys = [key for key in required_keys if key not in item]
-            if missing_keys:
-                logging.error(
-                    f"Отсутствуют обязательные ключи: {', '.join(missing_keys)}"
-                )
-                return None
-
-        total_sales = sum(item["totalPrice"] for item in data)  # Сумма всех продаж
-        total_discount = sum(
-            item["totalPrice"] * (item["discountPercent"] / 100) for item in data
-        )  # Сумма скидок
-        spp = sum(item["spp"] for item in data)  # Стоимость товара
-        payment_sale_amount = sum(
-            item["paymentSaleAmount"] for item in data
-        )  # Общая сумма по продажам
-        for_pay = sum(item["forPay"] for item in data)  # Сумма к оплате
-        finished_price = sum(
-            item["finishedPrice"] for item in data
-        )  # Финальная стоимость
-        price_with_disc = sum(
-            item["priceWithDisc"] for item in data
-        )  # Цена с учётом скидки
-
-        # Расчёт средней цены продажи, если возможно
-        avg_sale_price = total_sales / len(data) if data else 0
-
-        key_metrics = {
-            "total_sales": total_sales,
-            "total_discount": total_discount,
-            "spp": spp,
-            "payment_sale_amount": payment_sale_amount,
-            "for_pay": for_pay,
-            "finished_price": finished_price,
-            "price_with_disc": price_with_disc,
-            "avg_sale_price": avg_sale_price,
-        }
-
-        logging.info(f"Ключевые показатели: {key_metrics}")
+        if not all(map(isinstance, data, repeat(dict))):
+            bad_item = next(item for item in data if not isinstance(item, dict))
+            logging.error("Ожидался словарь, но получено: %s", type(bad_item))
+            return None
+
+        # Все показатели считаются за один проход по данным
+        with STAGE_SECONDS.time("aggregate"):
+            key_metrics = aggregate(data).key_metrics()
+
+        logging.info("Ключевые показатели: %s", key_metrics)
         return key_metrics
 
+    except KeyError as e:
+        # Проверка наличия необходимых ключей в каждом элементе
+        logging.error("Отсутствуют обязательные ключи: %s", e.args[0])
+        return None
+
     except Exception as e:
-        logging.error(f"Ошибка при расчете ключевых показателей: {e}")
+        logging.error("Ошибка при расчете ключевых показателей: %s", e)
         return None